@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Admission Control for the web bridge
+Token buckets (per client and global) plus a small bounded lane for
+key-derivation work, so login storms get fast 429s instead of queueing
+behind - and starving - everything else on the MCP session
+"""
+
+import math
+import threading
+import time
+from functools import wraps
+from typing import Dict, Optional, Tuple
+
+from flask import jsonify, request
+
+# Per client: a burst of 5 KDF requests, then one every 10 seconds
+CLIENT_BUCKET_CAPACITY = 5
+CLIENT_REFILL_PER_SECOND = 0.1
+
+# All clients together: a burst of 20, then 2 per second
+GLOBAL_BUCKET_CAPACITY = 20
+GLOBAL_REFILL_PER_SECOND = 2.0
+
+# KDF lane: operations running at once, plus how many may wait for a slot
+KDF_CONCURRENCY = 1
+KDF_QUEUE_DEPTH = 2
+
+# Forget idle per-client buckets beyond this many clients
+MAX_TRACKED_CLIENTS = 10000
+
+
+class TokenBucket:
+    """Classic token bucket; refills continuously up to capacity"""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_second)
+        self.updated = now
+
+    def wait_time(self, cost: float, now: float) -> float:
+        """Seconds until `cost` tokens are available (0 if they are now)"""
+        self._refill(now)
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.refill_per_second
+
+    def take(self, cost: float):
+        self.tokens -= cost
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class AdmissionController:
+    """
+    Per-client and global token buckets in front of a bounded KDF lane
+    - Both buckets must have room; tokens are only taken when both do
+    - The lane runs KDF_CONCURRENCY operations and lets KDF_QUEUE_DEPTH wait;
+      anything beyond that is rejected at once
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: Dict[str, TokenBucket] = {}
+        self._global = TokenBucket(GLOBAL_BUCKET_CAPACITY, GLOBAL_REFILL_PER_SECOND)
+        self._lane = threading.BoundedSemaphore(KDF_CONCURRENCY)
+        self._in_lane = 0
+        self._kdf_seconds = 1.0  # Moving average of one KDF operation
+
+        self.admitted = 0
+        self.rejected = {"client": 0, "global": 0, "lane": 0}
+
+    def admit(self, client_id: str, cost: float = 1) -> Tuple[bool, Optional[str], float]:
+        """Reserve a lane slot; returns (admitted, reason, retry_after_seconds)"""
+        now = time.monotonic()
+        with self._lock:
+            client = self._clients.get(client_id)
+            if client is None:
+                if len(self._clients) >= MAX_TRACKED_CLIENTS:
+                    self._prune(now)
+                client = self._clients[client_id] = TokenBucket(CLIENT_BUCKET_CAPACITY, CLIENT_REFILL_PER_SECOND)
+
+            for reason, bucket in (("client", client), ("global", self._global)):
+                wait = bucket.wait_time(cost, now)
+                if wait:
+                    self.rejected[reason] += 1
+                    return False, reason, wait
+
+            if self._in_lane >= KDF_CONCURRENCY + KDF_QUEUE_DEPTH:
+                self.rejected["lane"] += 1
+                return False, "lane", self._kdf_seconds * (self._in_lane - KDF_CONCURRENCY + 1)
+
+            client.take(cost)
+            self._global.take(cost)
+            self._in_lane += 1
+            self.admitted += 1
+            return True, None, 0.0
+
+    def run_in_lane(self, func, *args, **kwargs):
+        """Run admitted KDF work once a lane slot is free"""
+        try:
+            with self._lane:
+                started = time.monotonic()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    elapsed = time.monotonic() - started
+                    with self._lock:
+                        self._kdf_seconds = 0.8 * self._kdf_seconds + 0.2 * elapsed
+        finally:
+            with self._lock:
+                self._in_lane -= 1
+
+    def _prune(self, now: float):
+        # Full buckets carry no state worth keeping
+        for client_id in [cid for cid, bucket in self._clients.items() if bucket.is_full(now)]:
+            del self._clients[client_id]
+
+    def get_stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+                "in_lane": self._in_lane,
+                "tracked_clients": len(self._clients),
+                "kdf_seconds": round(self._kdf_seconds, 3)
+            }
+
+
+admission = AdmissionController()
+
+
+def kdf_endpoint(cost: float = 1):
+    """
+    Route decorator for endpoints that run the password KDF
+    Rejected requests get 429 with Retry-After and never reach the MCP server
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            client_id = request.remote_addr or "unknown"
+            admitted, reason, retry_after = admission.admit(client_id, cost)
+            if not admitted:
+                seconds = max(1, math.ceil(retry_after))
+                response = jsonify({
+                    'success': False,
+                    'error': 'Too many requests',
+                    'message': f'Too many security requests ({reason} limit) - retry in {seconds}s',
+                    'retry_after': seconds
+                })
+                response.status_code = 429
+                response.headers['Retry-After'] = str(seconds)
+                return response
+            return admission.run_in_lane(view, *args, **kwargs)
+        return wrapper
+    return decorator
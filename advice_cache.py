@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Advice Response Cache
+Remembers generated advice per normalized situation so retries and
+near-identical resubmissions skip classification and the lookup queries
+"""
+
+import hashlib
+import json
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Entries kept per vault (least recently used are dropped first)
+ADVICE_CACHE_MAX_ENTRIES = 256
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_situation(text: str) -> str:
+    """Case, punctuation and spacing differences map to the same text"""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class AdviceCache:
+    """
+    LRU cache of advice for one vault
+    - Keyed by a fingerprint of the normalized situation, context and relationship
+    - Dropped wholesale (invalidate) whenever memories or communication
+      patterns change, since either can change the advice
+    """
+
+    def __init__(self, max_entries: int = ADVICE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.generation = 0
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def fingerprint(situation: str, context: str, relationship: str) -> str:
+        parts = [normalize_situation(situation), normalize_situation(context), normalize_situation(relationship)]
+        return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached {'situation_type', 'advice'} for a fingerprint, if still current"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return {"situation_type": entry[0], "advice": json.loads(entry[1])}
+
+    def put(self, key: str, situation_type: str, advice: Dict[str, Any]):
+        # Stored serialized so callers can't mutate the cached copy
+        self.entries[key] = (situation_type, json.dumps(advice))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self):
+        """Memories or patterns changed - older entries are stale"""
+        self.generation += 1
+        self.entries.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self.entries),
+            "generation": self.generation,
+            "hits": self.hits,
+            "misses": self.misses
+        }
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Static Asset Pipeline for the web bridge
+Fingerprints allowlisted front-end files at startup and serves them
+precompressed with strong ETags and long-lived caching; pages are
+rewritten to load scripts, styles and images by fingerprinted URL
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import re
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from flask import Response, request
+
+try:
+    import brotli  # Optional: pip install brotli
+except ImportError:
+    brotli = None
+
+# Only these file types (top-level files only) are ever served -
+# data/, uploads/, keys and the SQLite database are never reachable
+ASSET_EXTENSIONS = {'.html', '.js', '.css', '.json', '.webmanifest', '.png', '.jpg', '.svg', '.ico'}
+COMPRESSIBLE_EXTENSIONS = {'.html', '.js', '.css', '.json', '.webmanifest', '.svg'}
+
+# References in pages that are rewritten to fingerprinted URLs (links to
+# other pages and the web app manifest keep their plain, stable names)
+FINGERPRINTED_REFERENCES = {'.js', '.css', '.png', '.jpg', '.svg', '.ico'}
+# src="name" / href='./name' for a top-level file
+REFERENCE_PATTERN = re.compile(rb'''(\b(?:src|href)\s*=\s*["'])(?:\./|/)?([^"'/?#:]+)(?=["'])''')
+
+# Fingerprinted URLs never change content; plain names must revalidate
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+
+class Asset:
+    """One static file with its precompressed variants"""
+
+    def __init__(self, path: Path, content: Optional[bytes] = None):
+        self.path = path
+        self.name = path.name
+        self.mtime = path.stat().st_mtime
+        self.content_type = mimetypes.guess_type(self.name)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.name.endswith('.js'):
+            self.content_type += '; charset=utf-8'
+
+        if content is None:
+            content = path.read_bytes()
+        self.digest = hashlib.sha256(content).hexdigest()
+        self.fingerprinted_name = f"{path.stem}.{self.digest[:12]}{path.suffix}"
+
+        # encoding -> body; only keep variants that are actually smaller
+        self.variants: Dict[str, bytes] = {'identity': content}
+        if path.suffix in COMPRESSIBLE_EXTENSIONS:
+            gzipped = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(gzipped) < len(content):
+                self.variants['gzip'] = gzipped
+            if brotli is not None:
+                compressed = brotli.compress(content, quality=11)
+                if len(compressed) < len(content):
+                    self.variants['br'] = compressed
+
+    def etag(self, encoding: str) -> str:
+        # Strong ETags must differ per representation
+        suffix = '' if encoding == 'identity' else f"-{encoding}"
+        return f'"{self.digest[:32]}{suffix}"'
+
+
+class AssetManifest:
+    """Allowlisted, fingerprinted assets built once at startup"""
+
+    def __init__(self, root: str = '.', watch: bool = False):
+        self.root = Path(root)
+        self.watch = watch  # Re-read changed files (development only)
+        self.assets: Dict[str, Asset] = {}
+        self.fingerprinted: Dict[str, Asset] = {}
+        self.build()
+
+    def build(self):
+        """Fingerprint and precompress every allowlisted file"""
+        self.assets = {}
+        self.fingerprinted = {}
+        paths = [
+            path for path in sorted(self.root.iterdir())
+            if path.is_file() and path.suffix in ASSET_EXTENSIONS and not path.name.startswith('.')
+        ]
+        # Pages last: their content (and so their fingerprint) depends on the others'
+        for path in paths:
+            if path.suffix != '.html':
+                self._add(Asset(path))
+        urls = self.to_dict()
+        for path in paths:
+            if path.suffix == '.html':
+                self._add(Asset(path, rewrite_references(path.read_bytes(), urls)))
+
+    def _add(self, asset: Asset):
+        self.assets[asset.name] = asset
+        self.fingerprinted[asset.fingerprinted_name] = asset
+
+    def lookup(self, filename: str) -> Tuple[Optional[Asset], bool]:
+        """Return (asset, immutable) for a requested file name"""
+        if self.watch and self._changed():
+            self.build()  # An edited script changes the pages that reference it
+
+        if filename in self.fingerprinted:
+            return self.fingerprinted[filename], True
+        return self.assets.get(filename), False
+
+    def _changed(self) -> bool:
+        for asset in self.assets.values():
+            try:
+                if asset.path.stat().st_mtime != asset.mtime:
+                    return True
+            except FileNotFoundError:
+                return True
+        return False
+
+    def to_dict(self) -> Dict[str, str]:
+        """Plain name -> fingerprinted URL, for pages and the service worker"""
+        return {name: f"/{asset.fingerprinted_name}" for name, asset in self.assets.items()}
+
+    def serve(self, filename: str) -> Response:
+        """Build the response for an asset request (404 if not allowlisted)"""
+        asset, immutable = self.lookup(filename)
+        if asset is None:
+            return Response('Not found', status=404, mimetype='text/plain')
+
+        encoding = negotiate_encoding(asset)
+        etag = asset.etag(encoding)
+
+        headers = {
+            'ETag': etag,
+            'Cache-Control': IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+            'Vary': 'Accept-Encoding',
+        }
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+
+        client_etags = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in client_etags or '*' in client_etags:
+            return Response(status=304, headers=headers)
+
+        return Response(asset.variants[encoding], status=200, headers=headers,
+                        content_type=asset.content_type)
+
+
+def rewrite_references(html: bytes, urls: Dict[str, str]) -> bytes:
+    """Point a page's script, style and image references at fingerprinted URLs"""
+    def replace(match):
+        name = match.group(2).decode('utf-8', 'replace')
+        url = urls.get(name)
+        if url is None or Path(name).suffix not in FINGERPRINTED_REFERENCES:
+            return match.group(0)
+        return match.group(1) + url.encode()
+
+    return REFERENCE_PATTERN.sub(replace, html)
+
+
+def negotiate_encoding(asset: Asset) -> str:
+    """Pick the smallest variant the client accepts"""
+    accepted = {
+        part.split(';')[0].strip().lower()
+        for part in request.headers.get('Accept-Encoding', '').split(',')
+        if not part.strip().endswith('q=0')
+    }
+    for encoding in ('br', 'gzip'):
+        if encoding in asset.variants and encoding in accepted:
+            return encoding
+    return 'identity'
+
+
+def parse_etags(header: str) -> set:
+    """Parse an If-None-Match header into a set of ETags (weak comparison)"""
+    tags = set()
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag:
+            tags.add(tag)
+    return tags
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Multi-Resolution Audio Peaks
+Min/max levels of a recording at several zoom levels, computed in one
+pass and stored encrypted next to the audio file in fixed-size records
+so any byte range can be served by decrypting only the records it covers
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+PEAKS_SUFFIX = ".peaks"
+PEAKS_MAGIC = b"PKS1"
+
+# Finest level: one min/max pair per 256 frames (~6 ms at 44.1 kHz);
+# every coarser level merges LEVEL_FACTOR bins, down to about MIN_LEVEL_BINS
+BASE_FRAMES_PER_BIN = 256
+LEVEL_FACTOR = 4
+MIN_LEVEL_BINS = 256
+
+# Plaintext bytes per encrypted record (the header record is padded to this too)
+PEAKS_BLOCK_SIZE = 4096
+
+
+def compute_peak_levels(samples, full_scale: float, zero: float = 0.0,
+                        chunk_frames: int = 1 << 20) -> Tuple[List[Dict[str, int]], bytes]:
+    """
+    One vectorized pass over (frames, channels) samples; returns the level
+    table and the payload - per level, int8 (min, max) pairs scaled to +-127
+    """
+    import numpy as np
+
+    frames, channels = samples.shape
+    per_bin = BASE_FRAMES_PER_BIN * channels
+    step = max(1, chunk_frames // BASE_FRAMES_PER_BIN) * BASE_FRAMES_PER_BIN
+
+    mins, maxs = [], []
+    for start in range(0, frames, step):
+        block = samples[start:start + step].reshape(-1)
+        edges = np.arange(0, len(block), per_bin)
+        mins.append(np.minimum.reduceat(block, edges))
+        maxs.append(np.maximum.reduceat(block, edges))
+
+    def scale(values):
+        if not values:
+            return np.zeros(0, dtype=np.int8)
+        levels = (np.concatenate(values).astype(np.float64) - zero) / full_scale * 127
+        return np.clip(np.round(levels), -127, 127).astype(np.int8)
+
+    low, high = scale(mins), scale(maxs)
+
+    levels, parts, offset = [], [], 0
+    frames_per_bin = BASE_FRAMES_PER_BIN
+    while True:
+        pairs = np.empty(len(low) * 2, dtype=np.int8)
+        pairs[0::2], pairs[1::2] = low, high
+        levels.append({"frames_per_bin": frames_per_bin, "bins": len(low), "offset": offset})
+        parts.append(pairs.tobytes())
+        offset += len(pairs)
+
+        if len(low) <= MIN_LEVEL_BINS:
+            break
+        # Coarser level from the finer one - no second pass over the audio
+        edges = np.arange(0, len(low), LEVEL_FACTOR)
+        low, high = np.minimum.reduceat(low, edges), np.maximum.reduceat(high, edges)
+        frames_per_bin *= LEVEL_FACTOR
+
+    return levels, b"".join(parts)
+
+
+def peaks_path_for(audio_path: Path) -> Path:
+    return Path(str(audio_path) + PEAKS_SUFFIX)
+
+
+def write_peaks_file(path: Path, crypto_manager, info: Dict[str, Any], payload: bytes) -> Dict[str, Any]:
+    """
+    Layout: 'PKS1 <record width>\\n', then equal-width encrypted records -
+    record 0 is the JSON header, record i + 1 holds payload block i
+    """
+    header = dict(info, length=len(payload), block_size=PEAKS_BLOCK_SIZE)
+    header_bytes = json.dumps(header).encode()
+    if len(header_bytes) > PEAKS_BLOCK_SIZE:
+        raise ValueError("Peaks header does not fit in one record")
+
+    # Equal plaintext sizes give equal ciphertext sizes, so record i sits at a fixed offset
+    blocks = [header_bytes.ljust(PEAKS_BLOCK_SIZE)]
+    for start in range(0, len(payload), PEAKS_BLOCK_SIZE):
+        blocks.append(payload[start:start + PEAKS_BLOCK_SIZE].ljust(PEAKS_BLOCK_SIZE, b"\0"))
+    records = [crypto_manager.encrypt_bytes(block).encode() for block in blocks]
+
+    width = len(records[0])
+    if any(len(record) != width for record in records):
+        raise ValueError("Encrypted peaks records differ in size")
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(PEAKS_MAGIC + b" %d\n" % width)
+        for record in records:
+            f.write(record)
+    os.chmod(tmp_path, 0o600)
+    os.replace(tmp_path, path)
+    return header
+
+
+class PeaksFile:
+    """Random access to an encrypted peaks file"""
+
+    def __init__(self, path: Path, crypto_manager):
+        self.path = Path(path)
+        self.crypto_manager = crypto_manager
+        with open(self.path, "rb") as f:
+            prefix = f.readline()
+        magic, _, width = prefix.strip().partition(b" ")
+        if magic != PEAKS_MAGIC:
+            raise ValueError(f"Not a peaks file: {self.path}")
+        self.record_width = int(width)
+        self.data_start = len(prefix)
+        self.header = json.loads(self._read_record(0))
+
+    def _read_record(self, index: int, f=None) -> bytes:
+        if f is None:
+            with open(self.path, "rb") as f:
+                return self._read_record(index, f)
+        f.seek(self.data_start + index * self.record_width)
+        return self.crypto_manager.decrypt_bytes(f.read(self.record_width).decode())
+
+    def read(self, start: int, length: int) -> bytes:
+        """Payload bytes [start, start + length) - decrypts only the covering records"""
+        total = self.header["length"]
+        start = max(0, min(start, total))
+        end = max(start, min(start + length, total))
+        if start == end:
+            return b""
+
+        block_size = self.header["block_size"]
+        first, last = start // block_size, (end - 1) // block_size
+        with open(self.path, "rb") as f:
+            data = b"".join(self._read_record(index + 1, f) for index in range(first, last + 1))
+        return data[start - first * block_size:end - first * block_size]
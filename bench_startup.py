@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Cold start benchmark for the Conversation Coach MCP server
+Measures import time (python -X importtime) and time to first response
+(initialize, list_tools) of a freshly spawned server, and fails when a
+budget is exceeded so CI catches startup regressions
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+SERVER_DIR = Path(__file__).resolve().parent
+
+# Modules that must stay out of the startup path (loaded on unlock only)
+DEFERRED_MODULES = ["cryptography"]
+
+
+def measure_import_time(module: str = "mcp_server", runs: int = 5) -> dict:
+    """Cumulative import time of the server module, via -X importtime"""
+    totals = []
+    self_times = {}
+    loaded = set()
+
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=SERVER_DIR, capture_output=True, text=True, check=True
+        )
+
+        self_times = {}
+        loaded = set()
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            name = name.strip()
+            loaded.add(name)
+            self_times[name] = int(self_us)
+            if name == module:
+                totals.append(int(cumulative_us) / 1000)
+
+    slowest = sorted(self_times.items(), key=lambda item: item[1], reverse=True)[:10]
+    return {
+        "import_ms": round(statistics.median(totals), 1),
+        "slowest_modules": [{"module": name, "self_ms": round(us / 1000, 1)} for name, us in slowest],
+        "deferred_modules_loaded": [
+            name for name in DEFERRED_MODULES
+            if any(mod == name or mod.startswith(name + ".") for mod in loaded)
+        ]
+    }
+
+
+async def _time_first_response() -> dict:
+    server_params = StdioServerParameters(
+        command=sys.executable,
+        args=["mcp_server.py"],
+        cwd=str(SERVER_DIR),
+    )
+
+    start = time.perf_counter()
+    async with stdio_client(server_params) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            initialized = time.perf_counter()
+
+            await session.list_tools()
+            listed = time.perf_counter()
+
+    return {
+        "initialize_ms": (initialized - start) * 1000,
+        "list_tools_ms": (listed - start) * 1000
+    }
+
+
+def measure_first_response(runs: int = 3) -> dict:
+    """Spawn-to-response latency for initialize and list_tools"""
+    samples = [asyncio.run(_time_first_response()) for _ in range(runs)]
+    return {
+        key: round(statistics.median(sample[key] for sample in samples), 1)
+        for key in ("initialize_ms", "list_tools_ms")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCP server cold start benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="Import-time samples")
+    parser.add_argument("--spawn-runs", type=int, default=3, help="Server spawn samples")
+    parser.add_argument("--max-import-ms", type=float, help="Fail if import time exceeds this")
+    parser.add_argument("--max-first-response-ms", type=float, help="Fail if list_tools answer exceeds this")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    results = measure_import_time(runs=args.runs)
+    results.update(measure_first_response(runs=args.spawn_runs))
+
+    failures = []
+    if results["deferred_modules_loaded"]:
+        failures.append(f"deferred modules imported at startup: {results['deferred_modules_loaded']}")
+    if args.max_import_ms and results["import_ms"] > args.max_import_ms:
+        failures.append(f"import {results['import_ms']}ms > {args.max_import_ms}ms")
+    if args.max_first_response_ms and results["list_tools_ms"] > args.max_first_response_ms:
+        failures.append(f"list_tools {results['list_tools_ms']}ms > {args.max_first_response_ms}ms")
+
+    if args.json:
+        print(json.dumps({**results, "failures": failures}, indent=2))
+    else:
+        print("🚀 MCP Server Cold Start")
+        print("=" * 30)
+        print(f"Import mcp_server:   {results['import_ms']} ms")
+        print(f"initialize answered: {results['initialize_ms']} ms after spawn")
+        print(f"list_tools answered: {results['list_tools_ms']} ms after spawn")
+        print("Slowest imports (self time):")
+        for entry in results["slowest_modules"]:
+            print(f"   {entry['self_ms']:>7} ms  {entry['module']}")
+        for failure in failures:
+            print(f"❌ {failure}")
+        if not failures:
+            print("✅ Within budget")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Per-call overhead benchmark for the bridge's MCP transports
+Times the same calls over a spawned server (JSON-RPC over stdio pipes)
+and over the embedded server (in-memory streams, no subprocess), so the
+cost that COACH_MCP_TRANSPORT=inprocess saves is measured, not guessed
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import anyio
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from mcp.shared.memory import create_client_server_memory_streams
+
+SERVER_DIR = Path(__file__).resolve().parent
+
+# Small response, and the largest fixed one (every tool schema)
+CALLS = {
+    "get_security_status": lambda session: session.call_tool("get_security_status", {"user_id": "bench"}),
+    "list_tools": lambda session: session.list_tools()
+}
+
+
+@asynccontextmanager
+async def open_session(transport: str):
+    if transport == "subprocess":
+        server_params = StdioServerParameters(
+            command=sys.executable,
+            args=[str(SERVER_DIR / "mcp_server.py")],
+            cwd=os.getcwd(),
+        )
+        async with stdio_client(server_params) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                yield session
+        return
+
+    import mcp_server
+    async with create_client_server_memory_streams() as (client_streams, server_streams):
+        async with anyio.create_task_group() as task_group:
+            task_group.start_soon(mcp_server.serve, *server_streams)
+            try:
+                async with ClientSession(*client_streams) as session:
+                    await session.initialize()
+                    yield session
+            finally:
+                task_group.cancel_scope.cancel()
+
+
+async def _measure(transport: str, calls: int, warmup: int) -> dict:
+    start = time.perf_counter()
+    async with open_session(transport) as session:
+        results = {"connect_ms": round((time.perf_counter() - start) * 1000, 1)}
+        for name, call in CALLS.items():
+            for _ in range(warmup):
+                await call(session)
+            samples = []
+            for _ in range(calls):
+                started = time.perf_counter()
+                await call(session)
+                samples.append((time.perf_counter() - started) * 1_000_000)
+            samples.sort()
+            results[name] = {
+                "median_us": round(statistics.median(samples)),
+                "p95_us": round(samples[int(len(samples) * 0.95) - 1])
+            }
+    return results
+
+
+def measure(transport: str, calls: int = 500, warmup: int = 20) -> dict:
+    """Per-call latency of each benchmark call over one transport"""
+    return asyncio.run(_measure(transport, calls, warmup))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCP transport per-call overhead benchmark")
+    parser.add_argument("--calls", type=int, default=500, help="Timed calls per benchmark call")
+    parser.add_argument("--warmup", type=int, default=20, help="Untimed calls first")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    # The servers create a vault; keep it out of the working tree
+    sys.path.insert(0, str(SERVER_DIR))
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        results = {transport: measure(transport, args.calls, args.warmup)
+                   for transport in ("subprocess", "inprocess")}
+
+    saved = {
+        name: results["subprocess"][name]["median_us"] - results["inprocess"][name]["median_us"]
+        for name in CALLS
+    }
+
+    if args.json:
+        print(json.dumps({**results, "saved_median_us": saved}, indent=2))
+        return
+
+    print("🔌 MCP Transport Overhead")
+    print("=" * 30)
+    for transport in ("subprocess", "inprocess"):
+        print(f"{transport}: connected in {results[transport]['connect_ms']} ms")
+        for name in CALLS:
+            timing = results[transport][name]
+            print(f"   {name:<20} median {timing['median_us']:>6} µs   p95 {timing['p95_us']:>6} µs")
+    for name, microseconds in saved.items():
+        print(f"✅ inprocess saves {microseconds} µs per {name} call (median)")
+
+
+if __name__ == "__main__":
+    main()
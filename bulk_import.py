@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Bulk Import
+Streams browser-mode exports (history page JSON, localStorage dumps,
+IndexedDB store dumps, NDJSON) into a vault: records are parsed one at
+a time, memories are encrypted on a worker pool, and rows go in large
+transactions that each commit a resumable checkpoint
+"""
+
+import json
+import os
+import re
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Only exports saved by the bridge are ever imported
+IMPORTS_DIR = Path("./uploads/imports")
+
+# Records per transaction (and per checkpoint)
+IMPORT_BATCH_SIZE = 2000
+# Characters read from the export at a time
+READ_CHUNK_SIZE = 64 * 1024
+
+# Top-level keys that hold record arrays, and the entity they hold:
+# history-page export, localStorage dump, IndexedDB store dump
+EXPORT_ARRAYS = {
+    "memories": "memory",
+    "conversations": "conversation",
+    "whaddyasay_memories": "memory",
+    "whaddyasay_conversations": "conversation"
+}
+
+_WHITESPACE = re.compile(r"\s*")
+
+CHECKPOINT_TABLE = '''
+    CREATE TABLE IF NOT EXISTS import_checkpoints (
+        import_id TEXT PRIMARY KEY,
+        records_done INTEGER NOT NULL DEFAULT 0,
+        memories INTEGER NOT NULL DEFAULT 0,
+        conversations INTEGER NOT NULL DEFAULT 0,
+        skipped INTEGER NOT NULL DEFAULT 0,
+        completed INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT
+    )
+'''
+
+
+class _JsonReader:
+    """
+    Incremental JSON tokenizer over a text stream
+    Only the current value is ever buffered; a value cut off by the end
+    of the buffer is retried after reading at least as much again, so
+    large values cost O(size), not O(size^2)
+    """
+
+    def __init__(self, stream, chunk_size: int = READ_CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        chunk = self.stream.read(max(self.chunk_size, len(self.buffer) - self.pos))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character ('' at the end)"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or not self._fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def take(self, expected: str):
+        found = self.peek()
+        if found != expected:
+            raise ValueError(f"Expected {expected!r} in export, found {found or 'end of file'!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the very end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def array(self) -> Iterator[Any]:
+        self.take("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.take("]")
+            return
+
+
+def _classify(value: Any, entity: Optional[str] = None) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """(entity, record) for one exported item, None if it isn't a record"""
+    if not isinstance(value, dict):
+        return None
+    if value.get("type") in ("memory", "conversation") and isinstance(value.get("data"), dict):
+        return value["type"], value["data"]  # sync_changes / NDJSON change shape
+    if entity is None:
+        entity = "conversation" if "situation" in value else "memory"
+    return entity, value
+
+
+def iter_export_records(stream, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Yield (entity, record) from an export without loading it whole
+    - [ ... ]                                  array of records
+    - {"memories": [...], "conversations": [...], ...}   history/IndexedDB export
+    - {"whaddyasay_memories": "[...]", ...}    localStorage dump (JSON strings)
+    - one record or change per line            NDJSON
+    """
+    reader = _JsonReader(stream, chunk_size)
+    first = reader.peek()
+    if first == "":
+        return
+    if first == "[":
+        for value in reader.array():
+            record = _classify(value)
+            if record:
+                yield record
+        return
+
+    # An object: either the whole export, or the first line of NDJSON
+    head = {}
+    streamed = False
+    reader.take("{")
+    if reader.peek() != "}":
+        while True:
+            key = reader.value()
+            reader.take(":")
+            entity = EXPORT_ARRAYS.get(key)
+            if entity and reader.peek() == "[":
+                streamed = True
+                for value in reader.array():
+                    record = _classify(value, entity)
+                    if record:
+                        yield record
+            elif entity and reader.peek() == '"':
+                # localStorage values are JSON strings - one item is small (browser quota)
+                streamed = True
+                for value in json.loads(reader.value()):
+                    record = _classify(value, entity)
+                    if record:
+                        yield record
+            else:
+                head[key] = reader.value()
+            if reader.peek() == ",":
+                reader.pos += 1
+                continue
+            reader.take("}")
+            break
+    else:
+        reader.pos += 1
+
+    if streamed:
+        return
+    record = _classify(head)
+    if record:
+        yield record
+    while reader.peek() != "":
+        record = _classify(reader.value())
+        if record:
+            yield record
+
+
+def resolve_import(source_path: str) -> Path:
+    """Refuse anything outside the imports directory"""
+    path = Path(source_path).resolve()
+    if IMPORTS_DIR.resolve() not in path.parents:
+        raise ValueError(f"Not an uploaded export: {source_path}")
+    if not path.is_file():
+        raise ValueError(f"Export not found: {source_path}")
+    return path
+
+
+def _open_export(path: Path):
+    return open(path, "r", encoding="utf-8-sig", newline="")
+
+
+class BulkImporter:
+    """
+    One import into one vault
+    - prepare_fn(entity, record) runs on the worker pool and returns the
+      insert payload (e.g. with the memory already encrypted), or None to skip
+    - insert_fn(cursor, entity, payload) writes one row in the batch
+      transaction and returns its ID
+    - Each batch commits with its checkpoint, so a failed or interrupted
+      import resumes after the last committed batch when run again with
+      the same import_id (e.g. a content hash of the export)
+    - At most workers + 1 batches are in flight, which bounds memory
+    """
+
+    def __init__(self, db_path: Path,
+                 prepare_fn: Callable[[str, Dict[str, Any]], Any],
+                 insert_fn: Callable[[sqlite3.Cursor, str, Any], int],
+                 batch_size: int = IMPORT_BATCH_SIZE,
+                 workers: Optional[int] = None):
+        self.db_path = Path(db_path)
+        self.prepare_fn = prepare_fn
+        self.insert_fn = insert_fn
+        self.batch_size = batch_size
+        self.workers = workers or int(os.environ.get("COACH_IMPORT_WORKERS", min(4, os.cpu_count() or 1)))
+
+    @staticmethod
+    def create_tables(cursor):
+        cursor.execute(CHECKPOINT_TABLE)
+
+    def run(self, path: Path, import_id: str,
+            on_batch: Optional[Callable[[Dict[str, Any], List[Tuple[str, int, Any]]], None]] = None) -> Dict[str, Any]:
+        """
+        Import the export at path; on_batch(progress, inserted) runs after
+        each batch commits, with the (entity, id, payload) rows it wrote
+        """
+        started = time.perf_counter()
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "SELECT records_done, memories, conversations, skipped, completed "
+                "FROM import_checkpoints WHERE import_id = ?", (import_id,)
+            )
+            row = cursor.fetchone()
+            progress = dict(zip(("records", "memories", "conversations", "skipped"), row or (0, 0, 0, 0)))
+            progress["import_id"] = import_id
+            if row and row[4]:
+                return dict(progress, completed=True, already_imported=True, batches=0, seconds=0.0)
+            resume_from = progress["records"]
+
+            batches = 0
+            with _open_export(path) as stream, ThreadPoolExecutor(max_workers=self.workers) as pool:
+                in_flight = deque()
+                records = iter_export_records(stream)
+                for _ in range(resume_from):
+                    if next(records, None) is None:
+                        break
+
+                def commit_oldest():
+                    batch_size, prepared = in_flight.popleft().result()
+                    inserted = self._commit_batch(conn, import_id, progress, batch_size, prepared)
+                    if on_batch is not None:
+                        on_batch(dict(progress), inserted)
+
+                batch = []
+                for record in records:
+                    batch.append(record)
+                    if len(batch) >= self.batch_size:
+                        in_flight.append(pool.submit(self._prepare_batch, batch))
+                        batch = []
+                        if len(in_flight) > self.workers:
+                            commit_oldest()
+                            batches += 1
+                if batch:
+                    in_flight.append(pool.submit(self._prepare_batch, batch))
+                while in_flight:
+                    commit_oldest()
+                    batches += 1
+
+            cursor.execute(
+                "UPDATE import_checkpoints SET completed = 1, updated_at = CURRENT_TIMESTAMP WHERE import_id = ?",
+                (import_id,)
+            )
+            if not cursor.rowcount:
+                cursor.execute("INSERT INTO import_checkpoints (import_id, completed, updated_at) "
+                               "VALUES (?, 1, CURRENT_TIMESTAMP)", (import_id,))
+            conn.commit()
+
+            return dict(progress, completed=True, already_imported=False, resumed_from=resume_from,
+                        batches=batches, seconds=round(time.perf_counter() - started, 2))
+        finally:
+            conn.close()
+
+    def _prepare_batch(self, batch: List[Tuple[str, Dict[str, Any]]]) -> Tuple[int, List[Tuple[str, Any]]]:
+        prepared = []
+        for entity, record in batch:
+            payload = self.prepare_fn(entity, record)
+            if payload is not None:
+                prepared.append((entity, payload))
+        return len(batch), prepared
+
+    def _commit_batch(self, conn, import_id: str, progress: Dict[str, Any],
+                      batch_size: int, prepared: List[Tuple[str, Any]]) -> List[Tuple[str, int, Any]]:
+        """Insert one batch and advance the checkpoint in the same transaction"""
+        cursor = conn.cursor()
+        try:
+            inserted = [(entity, self.insert_fn(cursor, entity, payload), payload)
+                        for entity, payload in prepared]
+            memories = sum(1 for entity, _ in prepared if entity == "memory")
+            counts = (batch_size, memories, len(prepared) - memories, batch_size - len(prepared))
+            cursor.execute('''
+                INSERT INTO import_checkpoints (import_id, records_done, memories, conversations, skipped, updated_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (import_id) DO UPDATE SET
+                    records_done = records_done + excluded.records_done,
+                    memories = memories + excluded.memories,
+                    conversations = conversations + excluded.conversations,
+                    skipped = skipped + excluded.skipped,
+                    updated_at = excluded.updated_at
+            ''', (import_id,) + counts)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        for key, count in zip(("records", "memories", "conversations", "skipped"), counts):
+            progress[key] += count
+        return inserted
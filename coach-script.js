@@ -228,10 +228,12 @@ class ConversationCoach {
             if (navigator.onLine) {
                 console.log('🌐 Attempting MCP server for enhanced advice');
                 try {
-                    const response = await fetch('/api/conversation/advice', {
+                    // Sections are rendered as they stream in
+                    const response = await fetch('/api/conversation/advice/stream', {
                         method: 'POST',
                         headers: {
                             'Content-Type': 'application/json',
+                            'X-Vault-Token': sessionStorage.getItem('whaddyasay_vault_token') || ''
                         },
                         body: JSON.stringify({
                             situation: situation,
@@ -243,7 +245,7 @@ class ConversationCoach {
                     });
 
                     if (response.ok) {
-                        const data = await response.json();
+                        const data = await this.readAdviceStream(response);
                         if (data.success) {
                             data.advice.source = 'mcp_server';
                             data.advice.privacy_level = 'encrypted';
@@ -274,6 +276,46 @@ class ConversationCoach {
         }
     }
 
+    async readAdviceStream(response) {
+        // Offline responses from the service worker are plain JSON
+        if (!(response.headers.get('Content-Type') || '').includes('text/event-stream')) {
+            return response.json();
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        const partialAdvice = {};
+        let buffer = '';
+        let result = { success: false, error: 'Advice stream ended early' };
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            // Events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                const event = rawEvent.match(/^event: (.*)$/m)?.[1];
+                const data = JSON.parse(rawEvent.match(/^data: (.*)$/m)?.[1] || '{}');
+
+                if (event === 'section') {
+                    Object.assign(partialAdvice, data.data);
+                    this.displayAdvice(partialAdvice);
+                    this.showAnalysisSection();
+                    this.hideLoading();
+                } else if (event === 'done' || event === 'error') {
+                    result = data;
+                }
+            }
+        }
+
+        return result;
+    }
+
     async initializeAIEngine() {
         try {
             if (!window.aiEngine && window.PWAAIEngine) {
@@ -395,7 +437,7 @@ class ConversationCoach {
     displayAdvice(advice) {
         // Handle both mock and real MCP server response formats
         const situationAnalysis = advice.situation_analysis || { type: advice.analysis, situation: advice.situation };
-        const strategy = advice.strategy;
+        const strategy = advice.strategy || '';
         const keyPoints = advice.key_points || advice.keyPoints || [];
         const pitfalls = advice.pitfalls || [];
         const phrases = advice.helpful_phrases || advice.phrases || [];
@@ -9,15 +9,30 @@ import os
 import json
 import base64
 import hashlib
+import hmac
+import re
 import secrets
+import threading
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional, Dict, Any, Tuple
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
-import getpass
+
+# cryptography (Fernet, PBKDF2, RSA) is imported inside the methods that
+# use it, so importing this module costs nothing until a vault is unlocked
+
+# Envelope-encrypted records look like "env1:<epoch>:<fernet token>"
+ENVELOPE_PREFIX = "env1:"
+# Data key epoch holding the pre-envelope master key (records written
+# directly with the password-derived key before envelope encryption)
+LEGACY_EPOCH = "legacy"
+# Key slot (in the data key table) used for keyed content fingerprints
+FINGERPRINT_EPOCH = "fingerprint"
+# Key backups are named backup_<stamp>.key / backup_<stamp>_data_keys.json;
+# one stamp per rotation (older backups have no microseconds)
+BACKUP_STAMP = re.compile(r"^backup_(\d{8}_\d{6}(?:_\d{6})?)")
+
+def _backup_stamp() -> str:
+    return datetime.now().strftime('%Y%m%d_%H%M%S_%f')
 
 class PersonalCryptoManager:
     """
@@ -26,6 +41,10 @@ class PersonalCryptoManager:
     - Monthly key rotation (recommended)
     - Local key storage only
     - No cloud dependencies
+    - Envelope encryption: records use monthly data keys (DEKs) that are
+      wrapped by the master key, so rotation only rewraps the DEK table
+    - One lock covers key state: data keys are never looked up or minted
+      while a rotation or (re)authentication swaps the master key
     """
     
     def __init__(self, data_dir: str = "./data"):
@@ -36,67 +55,106 @@ class PersonalCryptoManager:
         
         self.master_key_file = self.keys_dir / "master.key"
         self.auth_file = self.keys_dir / "auth.json"
+        self.data_keys_file = self.keys_dir / "data_keys.json"
         self.current_key = None
+        self.master_key_bytes = None
         self.authenticated = False
         
+        # Unwrapped data keys by epoch (only while authenticated)
+        self._data_keys: Dict[str, Any] = {}
+        self._fingerprint_key: Optional[bytes] = None
+        self._lock = threading.RLock()
+    
+    def _create_master_key(self, master_password: str) -> Tuple[Any, bytes, Dict[str, str]]:
+        """
+        Derive a new master key and RSA pair; nothing is written
+        Returns (fernet, key, master key file contents)
+        """
+        from cryptography.fernet import Fernet
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        
+        # Generate salt for password derivation
+        salt = os.urandom(32)
+            
+        # Derive key from password
+        kdf = PBKDF2HMAC(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=salt,
+            iterations=100000,
+        )
+        key = base64.urlsafe_b64encode(kdf.derive(master_password.encode()))
+        
+        # Create Fernet cipher
+        fernet = Fernet(key)
+        
+        # Generate RSA key pair for additional security
+        private_key = rsa.generate_private_key(
+            public_exponent=65537,
+            key_size=2048,
+        )
+        
+        # Serialize keys
+        private_pem = private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        )
+        
+        public_key = private_key.public_key()
+        public_pem = public_key.public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        
+        # Encrypt the private key with Fernet
+        encrypted_private_key = fernet.encrypt(private_pem)
+        
+        # Store master key info
+        master_data = {
+            "salt": base64.b64encode(salt).decode(),
+            "encrypted_private_key": base64.b64encode(encrypted_private_key).decode(),
+            "public_key": base64.b64encode(public_pem).decode(),
+            "created_at": datetime.now().isoformat(),
+            "key_rotation_due": (datetime.now() + timedelta(days=30)).isoformat()
+        }
+        return fernet, key, master_data
+    
+    def _save_master_key(self, master_data: Dict[str, str]):
+        """Atomically write the master key file"""
+        tmp_file = self.master_key_file.with_suffix(".tmp")
+        with open(tmp_file, 'w') as f:
+            json.dump(master_data, f, indent=2)
+        # Set restrictive permissions
+        os.chmod(tmp_file, 0o600)
+        os.replace(tmp_file, self.master_key_file)
+    
     def setup_first_time(self, master_password: str) -> bool:
         """
         First-time setup: create master key and authentication
+        Re-running it starts a new vault key; use rotate_keys to keep data
         """
         try:
             print("🔐 Setting up your personal encryption...")
             
-            # Generate salt for password derivation
-            salt = os.urandom(32)
-            
-            # Derive key from password
-            kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=32,
-                salt=salt,
-                iterations=100000,
-            )
-            key = base64.urlsafe_b64encode(kdf.derive(master_password.encode()))
-            
-            # Create Fernet cipher
-            fernet = Fernet(key)
-            
-            # Generate RSA key pair for additional security
-            private_key = rsa.generate_private_key(
-                public_exponent=65537,
-                key_size=2048,
-            )
-            
-            # Serialize keys
-            private_pem = private_key.private_bytes(
-                encoding=serialization.Encoding.PEM,
-                format=serialization.PrivateFormat.PKCS8,
-                encryption_algorithm=serialization.NoEncryption()
-            )
-            
-            public_key = private_key.public_key()
-            public_pem = public_key.public_bytes(
-                encoding=serialization.Encoding.PEM,
-                format=serialization.PublicFormat.SubjectPublicKeyInfo
-            )
-            
-            # Encrypt the private key with Fernet
-            encrypted_private_key = fernet.encrypt(private_pem)
-            
-            # Store master key info
-            master_data = {
-                "salt": base64.b64encode(salt).decode(),
-                "encrypted_private_key": base64.b64encode(encrypted_private_key).decode(),
-                "public_key": base64.b64encode(public_pem).decode(),
-                "created_at": datetime.now().isoformat(),
-                "key_rotation_due": (datetime.now() + timedelta(days=30)).isoformat()
-            }
+            fernet, key, master_data = self._create_master_key(master_password)
             
-            with open(self.master_key_file, 'w') as f:
-                json.dump(master_data, f, indent=2)
-            
-            # Set restrictive permissions
-            os.chmod(self.master_key_file, 0o600)
+            with self._lock:
+                # Data keys wrapped by a previous master key can't be
+                # unwrapped by the new one - set the old table aside
+                if self.data_keys_file.exists():
+                    backup_name = f"backup_{_backup_stamp()}_data_keys.json"
+                    os.replace(self.data_keys_file, self.keys_dir / backup_name)
+                
+                self._save_master_key(master_data)
+                
+                self.current_key = fernet
+                self.master_key_bytes = key
+                self._data_keys = {}
+                self._fingerprint_key = None
+                self.authenticated = True
             
             # Create auth tracking
             auth_data = {
@@ -110,9 +168,6 @@ class PersonalCryptoManager:
             
             os.chmod(self.auth_file, 0o600)
             
-            self.current_key = fernet
-            self.authenticated = True
-            
             print("✅ Personal encryption setup complete!")
             print("🔑 Your data is now encrypted and only you have the key")
             print("📅 Key rotation recommended in 30 days")
@@ -127,6 +182,10 @@ class PersonalCryptoManager:
         """
         Authenticate user and load encryption keys
         """
+        from cryptography.fernet import Fernet
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+        
         try:
             if not self.master_key_file.exists():
                 print("🔐 First time setup required")
@@ -154,8 +213,12 @@ class PersonalCryptoManager:
                 private_pem = fernet.decrypt(encrypted_private_key)
                 
                 # If we get here, password is correct
-                self.current_key = fernet
-                self.authenticated = True
+                with self._lock:
+                    self.current_key = fernet
+                    self.master_key_bytes = key
+                    self._data_keys = {}
+                    self._fingerprint_key = None
+                    self.authenticated = True
                 
                 # Update auth tracking
                 self._update_auth_tracking()
@@ -183,10 +246,7 @@ class PersonalCryptoManager:
         
         # Convert to JSON and encrypt
         json_data = json.dumps(data, default=str)
-        encrypted_data = self.current_key.encrypt(json_data.encode())
-        
-        # Return base64 encoded for storage
-        return base64.b64encode(encrypted_data).decode()
+        return self.encrypt_bytes(json_data.encode())
     
     def decrypt_data(self, encrypted_data: str) -> Dict[Any, Any]:
         """
@@ -196,51 +256,203 @@ class PersonalCryptoManager:
             raise Exception("Not authenticated - call authenticate() first")
         
         try:
-            # Decode and decrypt
-            encrypted_bytes = base64.b64decode(encrypted_data)
-            decrypted_bytes = self.current_key.decrypt(encrypted_bytes)
-            
             # Parse JSON
-            return json.loads(decrypted_bytes.decode())
+            return json.loads(self.decrypt_bytes(encrypted_data).decode())
             
         except Exception as e:
             raise Exception(f"Decryption failed: {e}")
     
+    def encrypt_bytes(self, data: bytes) -> str:
+        """
+        Encrypt raw bytes with the current month's data key
+        """
+        epoch = datetime.now().strftime("%Y-%m")
+        with self._lock:
+            if not self.authenticated:
+                raise Exception("Not authenticated - call authenticate() first")
+            data_key = self._get_data_key(epoch, create=True)
+        
+        # Data keys survive rotation unchanged, so the cipher work needs no lock
+        token = data_key.encrypt(data)
+        return f"{ENVELOPE_PREFIX}{epoch}:{token.decode()}"
+    
+    def decrypt_bytes(self, encrypted_data: str) -> bytes:
+        """
+        Decrypt bytes from encrypt_bytes (or legacy encrypt_data output)
+        """
+        if encrypted_data.startswith(ENVELOPE_PREFIX):
+            epoch, _, token = encrypted_data[len(ENVELOPE_PREFIX):].partition(":")
+            with self._lock:
+                if not self.authenticated:
+                    raise Exception("Not authenticated - call authenticate() first")
+                data_key = self._get_data_key(epoch)
+            return data_key.decrypt(token.encode())
+        
+        # Legacy record: encrypted directly with a password-derived key
+        encrypted_bytes = base64.b64decode(encrypted_data)
+        with self._lock:
+            if not self.authenticated:
+                raise Exception("Not authenticated - call authenticate() first")
+            try:
+                return self.current_key.decrypt(encrypted_bytes)
+            except Exception:
+                if LEGACY_EPOCH not in self._load_wrapped_data_keys():
+                    raise
+                return self._get_data_key(LEGACY_EPOCH).decrypt(encrypted_bytes)
+    
+    def fingerprint(self, data: bytes) -> str:
+        """
+        Keyed content hash (HMAC-SHA256) for deduplication
+        Equal plaintexts match without revealing content to anyone without the key
+        """
+        with self._lock:
+            if not self.authenticated:
+                raise Exception("Not authenticated - call authenticate() first")
+            if self._fingerprint_key is None:
+                self._fingerprint_key = self._get_raw_data_key(FINGERPRINT_EPOCH, create=True)
+            fingerprint_key = self._fingerprint_key
+        return hmac.new(fingerprint_key, data, hashlib.sha256).hexdigest()
+    
+    def lock(self):
+        """
+        Drop the in-memory key (vault eviction / logout)
+        """
+        with self._lock:
+            self.current_key = None
+            self.master_key_bytes = None
+            self._data_keys = {}
+            self._fingerprint_key = None
+            self.authenticated = False
+    
     def rotate_keys(self, master_password: str, new_password: Optional[str] = None) -> bool:
         """
         Rotate encryption keys (recommended monthly)
+        Holds the key lock throughout, so no data key is minted or looked
+        up while the table and master key are being swapped
         """
+        import shutil
+        
         try:
             print("🔄 Rotating encryption keys...")
             
-            if not self.authenticate(master_password):
-                return False
-            
             # Use new password if provided, otherwise keep current
             password_to_use = new_password if new_password else master_password
             
-            # Create backup of current keys
-            backup_file = self.keys_dir / f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.key"
-            if self.master_key_file.exists():
-                import shutil
-                shutil.copy2(self.master_key_file, backup_file)
-                os.chmod(backup_file, 0o600)
-            
-            # Generate new keys
-            success = self.setup_first_time(password_to_use)
+            with self._lock:
+                if not self.authenticate(master_password):
+                    return False
+                
+                # Unwrap every data key while the old master key is loaded
+                data_keys = {
+                    epoch: self.current_key.decrypt(base64.b64decode(entry["wrapped_key"]))
+                    for epoch, entry in self._load_wrapped_data_keys().items()
+                }
+                
+                # Keep pre-envelope records readable after the master key changes
+                if LEGACY_EPOCH not in data_keys:
+                    data_keys[LEGACY_EPOCH] = self.master_key_bytes
+                
+                # Create backup of current keys; both files share one stamp
+                # so pruning keeps or drops them as a pair
+                stamp = _backup_stamp()
+                for source, backup_name in ((self.master_key_file, f"backup_{stamp}.key"),
+                                            (self.data_keys_file, f"backup_{stamp}_data_keys.json")):
+                    if source.exists():
+                        shutil.copy2(source, self.keys_dir / backup_name)
+                        os.chmod(self.keys_dir / backup_name, 0o600)
+                
+                # Generate new keys
+                fernet, key, master_data = self._create_master_key(password_to_use)
+                
+                # Rewrap the (small) data key table - records are untouched.
+                # The table is replaced before the master key, so a crash in
+                # between leaves the old master key plus both backups
+                self._save_wrapped_data_keys({
+                    epoch: self._wrap_data_key(raw_key, fernet)
+                    for epoch, raw_key in data_keys.items()
+                })
+                self._save_master_key(master_data)
+                
+                # Unwrapped data keys (and the fingerprint key) are unchanged
+                self.current_key = fernet
+                self.master_key_bytes = key
             
-            if success:
-                print("✅ Key rotation complete")
-                print("🔒 Old keys backed up securely")
-                return True
-            else:
-                print("❌ Key rotation failed")
-                return False
+            print(f"🔁 Rewrapped {len(data_keys)} data keys")
+            print("✅ Key rotation complete")
+            print("🔒 Old keys backed up securely")
+            return True
                 
         except Exception as e:
             print(f"❌ Key rotation error: {e}")
             return False
     
+    def prune_key_backups(self, keep: int = 3) -> list:
+        """
+        Delete all but the newest `keep` rotation backups
+        (backup_*.key plus the matching data key tables)
+        Only call once the backups are archived elsewhere (vault_backup.py)
+        """
+        # Group files from one rotation by their stamp
+        backups = {}
+        for path in self.keys_dir.glob("backup_*"):
+            match = BACKUP_STAMP.match(path.name)
+            if match:
+                backups.setdefault(match.group(1), []).append(path)
+        
+        removed = []
+        for stamp in sorted(backups, reverse=True)[keep:]:
+            for path in sorted(backups[stamp]):
+                path.unlink()
+                removed.append(path.name)
+        return removed
+    
+    def _get_data_key(self, epoch: str, create: bool = False):
+        """Get the unwrapped data key (Fernet) for an epoch, optionally creating it"""
+        from cryptography.fernet import Fernet
+        
+        with self._lock:
+            if epoch not in self._data_keys:
+                self._data_keys[epoch] = Fernet(self._get_raw_data_key(epoch, create))
+            return self._data_keys[epoch]
+    
+    def _get_raw_data_key(self, epoch: str, create: bool = False) -> bytes:
+        """Unwrap the raw data key for an epoch, optionally creating it"""
+        from cryptography.fernet import Fernet
+        
+        wrapped_keys = self._load_wrapped_data_keys()
+        if epoch in wrapped_keys:
+            return self.current_key.decrypt(base64.b64decode(wrapped_keys[epoch]["wrapped_key"]))
+        if not create:
+            raise Exception(f"Unknown data key epoch: {epoch}")
+        
+        raw_key = Fernet.generate_key()
+        wrapped_keys[epoch] = self._wrap_data_key(raw_key)
+        self._save_wrapped_data_keys(wrapped_keys)
+        return raw_key
+    
+    def _wrap_data_key(self, raw_key: bytes, master_key=None) -> Dict[str, str]:
+        """Wrap a data key with the current (or the given) master key"""
+        master_key = master_key or self.current_key
+        return {
+            "wrapped_key": base64.b64encode(master_key.encrypt(raw_key)).decode(),
+            "wrapped_at": datetime.now().isoformat()
+        }
+    
+    def _load_wrapped_data_keys(self) -> Dict[str, Dict[str, str]]:
+        """Load the wrapped data key table"""
+        if not self.data_keys_file.exists():
+            return {}
+        with open(self.data_keys_file, 'r') as f:
+            return json.load(f).get("epochs", {})
+    
+    def _save_wrapped_data_keys(self, wrapped_keys: Dict[str, Dict[str, str]]):
+        """Atomically write the wrapped data key table"""
+        tmp_file = self.data_keys_file.with_suffix(".tmp")
+        with open(tmp_file, 'w') as f:
+            json.dump({"epochs": wrapped_keys}, f, indent=2)
+        os.chmod(tmp_file, 0o600)
+        os.replace(tmp_file, self.data_keys_file)
+    
     def _update_auth_tracking(self):
         """Update authentication tracking"""
         try:
@@ -280,7 +492,8 @@ class PersonalCryptoManager:
             "last_auth": None,
             "auth_count": 0,
             "key_rotation_due": None,
-            "days_until_rotation": None
+            "days_until_rotation": None,
+            "data_key_epochs": 0
         }
         
         try:
@@ -296,6 +509,8 @@ class PersonalCryptoManager:
                 rotation_due = datetime.fromisoformat(master_data["key_rotation_due"])
                 status["key_rotation_due"] = master_data["key_rotation_due"]
                 status["days_until_rotation"] = (rotation_due - datetime.now()).days
+            
+            status["data_key_epochs"] = len(self._load_wrapped_data_keys())
                 
         except Exception:
             pass
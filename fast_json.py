@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Compact JSON Serialization
+One encoding step per response: compact output, SQLite rows encoded
+straight from the cursor (no per-row dicts), and orjson when installed
+"""
+
+import json
+from json.encoder import encode_basestring
+from typing import Any, Iterable, Sequence
+
+try:
+    import orjson  # Optional: pip install orjson
+except ImportError:
+    orjson = None
+
+_encode_json = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False, default=str).encode
+
+
+def dumps(obj: Any) -> str:
+    """Compact JSON text"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            pass  # e.g. integers beyond 64 bits - the stdlib handles those
+    return _encode_json(obj)
+
+
+def _encode_value(value: Any) -> str:
+    # SQLite only returns these types (plus bytes for BLOBs)
+    if value is None:
+        return "null"
+    if isinstance(value, str):
+        return encode_basestring(value)
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return _encode_json(value)
+    if isinstance(value, bytes):
+        return encode_basestring(value.hex())
+    return _encode_json(value)
+
+
+def rows_to_json(cursor, rows: Iterable[Sequence[Any]] = None) -> str:
+    """
+    Encode a query result as a JSON array of objects, keyed by column name
+    - column keys are encoded once, values straight from each row tuple
+    - with orjson the dict pass is cheaper than string building, so use that
+    """
+    if rows is None:
+        rows = cursor.fetchall()
+    if orjson is not None:
+        columns = [desc[0] for desc in cursor.description]
+        return dumps([dict(zip(columns, row)) for row in rows])
+    keys = [encode_basestring(desc[0]) + ":" for desc in cursor.description]
+    encode = _encode_value
+
+    parts = []
+    for row in rows:
+        parts.append("{" + ",".join([key + encode(value) for key, value in zip(keys, row)]) + "}")
+    return "[" + ",".join(parts) + "]"
+
+
+def concat_arrays(*arrays: str) -> str:
+    """Join already-encoded JSON arrays without decoding them"""
+    bodies = [array[1:-1] for array in arrays if array not in ("[]", "")]
+    return "[" + ",".join(bodies) + "]"
+
+
+def wrap_raw(raw_json: str, key: str, **fields: Any) -> str:
+    """'{...fields, "key": <raw_json>}' - embeds an encoded payload as is"""
+    prefix = dumps(fields)[:-1]
+    separator = "," if fields else ""
+    return f"{prefix}{separator}{encode_basestring(key)}:{raw_json}}}"
+
+
+def is_json_document(text: str) -> bool:
+    """Cheap check that a tool returned a JSON object/array (not an error string)"""
+    return bool(text) and text[0] in "[{"
+
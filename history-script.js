@@ -93,6 +93,28 @@ class HistoryManager {
         ];
         const uniqueDates = [...new Set(allDates)];
         this.totalDays.textContent = uniqueDates.length;
+
+        // Prefer the server's rollups - they cover the whole synced history
+        this.loadServerStats();
+    }
+
+    async loadServerStats() {
+        try {
+            const response = await fetch('/api/stats?days=30', {
+                headers: { 'X-Vault-Token': sessionStorage.getItem('whaddyasay_vault_token') || '' }
+            });
+            if (!response.ok) return;
+
+            const result = await response.json();
+            if (!result.success) return;
+
+            const totals = result.stats.totals;
+            this.memoryCount.textContent = Math.max(totals.memories, this.memories.length);
+            this.conversationCount.textContent = Math.max(totals.conversations, this.conversations.length);
+            this.totalDays.textContent = Math.max(totals.active_days, Number(this.totalDays.textContent));
+        } catch (error) {
+            // Offline or browser-only mode - keep the local counts
+        }
     }
 
     setActiveFilter(filter) {
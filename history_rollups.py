@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+History Rollups
+Aggregates for the history/stats views kept up to date on every write,
+so dashboard queries read a handful of rows instead of the whole history
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+# Window of the rolling success-rating average
+ROLLING_DAYS = 30
+# Longest daily series a stats query may ask for
+MAX_STATS_DAYS = 366
+
+ROLLUP_TABLES = [
+    # Running totals ('memories', 'conversations', 'active_days') and one-off markers
+    '''CREATE TABLE IF NOT EXISTS rollup_counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS rollup_active_days (
+        day TEXT PRIMARY KEY
+    )''',
+    # memory_type is encrypted in the memories table, so it is keyed by
+    # its fingerprint here and the label is stored encrypted
+    '''CREATE TABLE IF NOT EXISTS rollup_memory_types (
+        type_key TEXT PRIMARY KEY,
+        label TEXT NOT NULL,
+        count INTEGER NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS rollup_memory_daily (
+        day TEXT NOT NULL,
+        type_key TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (day, type_key)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS rollup_conversation_types (
+        situation_type TEXT PRIMARY KEY,
+        count INTEGER NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS rollup_conversation_daily (
+        day TEXT NOT NULL,
+        situation_type TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (day, situation_type)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS rollup_outcome_contexts (
+        context TEXT PRIMARY KEY,
+        ratings INTEGER NOT NULL,
+        rating_sum INTEGER NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS rollup_outcome_daily (
+        day TEXT NOT NULL,
+        context TEXT NOT NULL,
+        ratings INTEGER NOT NULL,
+        rating_sum INTEGER NOT NULL,
+        PRIMARY KEY (day, context)
+    )'''
+]
+
+
+def day_of(timestamp: Optional[str]) -> str:
+    """'2025-07-15T10:20:00+00:00' -> '2025-07-15' (today if missing)"""
+    if not timestamp:
+        return datetime.now(timezone.utc).date().isoformat()
+    return str(timestamp)[:10]
+
+
+def _bump(cursor, table: str, keys: Dict[str, Any], **deltas: int):
+    """Upsert a counter row, adding deltas to its value columns"""
+    columns = list(keys) + list(deltas)
+    updates = ", ".join(f"{column} = {column} + excluded.{column}" for column in deltas)
+    cursor.execute(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+        f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}",
+        list(keys.values()) + list(deltas.values())
+    )
+
+
+def _mark_active(cursor, day: str):
+    cursor.execute("INSERT OR IGNORE INTO rollup_active_days (day) VALUES (?)", (day,))
+    if cursor.rowcount:
+        _bump(cursor, "rollup_counters", {"name": "active_days"}, value=1)
+
+
+class HistoryRollups:
+    """
+    Incremental rollups for one vault
+    - add_*/set_outcome run inside the caller's write transaction, so the
+      rollups commit (or roll back) with the rows they count
+    - Decrypted memory type labels are cached; there are only a few
+    """
+
+    def __init__(self, crypto_manager):
+        self.crypto_manager = crypto_manager
+        self._labels: Dict[str, str] = {}
+
+    @staticmethod
+    def create_tables(cursor):
+        for statement in ROLLUP_TABLES:
+            cursor.execute(statement)
+
+    def add_memory(self, cursor, timestamp: Optional[str], memory_type: str):
+        day = day_of(timestamp)
+        type_key = self.crypto_manager.fingerprint(f"memory_type:{memory_type}".encode())
+        cursor.execute("UPDATE rollup_memory_types SET count = count + 1 WHERE type_key = ?", (type_key,))
+        if not cursor.rowcount:
+            # First memory of this type - the label is only encrypted once
+            cursor.execute(
+                "INSERT INTO rollup_memory_types (type_key, label, count) VALUES (?, ?, 1)",
+                (type_key, self.crypto_manager.encrypt_bytes(memory_type.encode()))
+            )
+        self._labels[type_key] = memory_type
+        _bump(cursor, "rollup_memory_daily", {"day": day, "type_key": type_key}, count=1)
+        _bump(cursor, "rollup_counters", {"name": "memories"}, value=1)
+        _mark_active(cursor, day)
+
+    @staticmethod
+    def add_conversation(cursor, timestamp: Optional[str], situation_type: str):
+        day = day_of(timestamp)
+        _bump(cursor, "rollup_conversation_types", {"situation_type": situation_type}, count=1)
+        _bump(cursor, "rollup_conversation_daily", {"day": day, "situation_type": situation_type}, count=1)
+        _bump(cursor, "rollup_counters", {"name": "conversations"}, value=1)
+        _mark_active(cursor, day)
+
+    @staticmethod
+    def set_outcome(cursor, timestamp: Optional[str], context: str, rating: int,
+                    previous: Optional[tuple] = None):
+        """Count a success rating; previous=(timestamp, context, rating) it replaces"""
+        if previous is not None and previous[2] is not None:
+            old_timestamp, old_context, old_rating = previous
+            _bump(cursor, "rollup_outcome_contexts", {"context": old_context},
+                  ratings=-1, rating_sum=-old_rating)
+            _bump(cursor, "rollup_outcome_daily", {"day": day_of(old_timestamp), "context": old_context},
+                  ratings=-1, rating_sum=-old_rating)
+        _bump(cursor, "rollup_outcome_contexts", {"context": context}, ratings=1, rating_sum=rating)
+        _bump(cursor, "rollup_outcome_daily", {"day": day_of(timestamp), "context": context},
+              ratings=1, rating_sum=rating)
+
+    def backfill(self, cursor) -> Dict[str, int]:
+        """
+        One-off pass over rows written before the rollups existed
+        Conversations need no key; memories are done once the vault is unlocked
+        """
+        cursor.execute("SELECT name FROM rollup_counters WHERE name LIKE 'backfilled:%'")
+        done = {row[0] for row in cursor.fetchall()}
+        counts = {}
+
+        if "backfilled:conversations" not in done:
+            rows = cursor.execute(
+                "SELECT timestamp, situation_type, context, success_rating, outcome_at FROM conversations"
+            ).fetchall()
+            for timestamp, situation_type, context, rating, outcome_at in rows:
+                self.add_conversation(cursor, timestamp, situation_type or "general")
+                if rating is not None:
+                    self.set_outcome(cursor, outcome_at or timestamp, context or "general", rating)
+            cursor.execute("INSERT INTO rollup_counters (name, value) VALUES ('backfilled:conversations', 1)")
+            counts["conversations"] = len(rows)
+
+        if "backfilled:memories" not in done and self.crypto_manager.authenticated:
+            rows = 0
+            for (content,) in cursor.execute("SELECT content FROM memories").fetchall():
+                try:
+                    record = self.crypto_manager.decrypt_data(content)
+                except Exception:
+                    continue  # Unreadable rows are skipped, as everywhere else
+                self.add_memory(cursor, record.get("timestamp"), record.get("memory_type") or "experience")
+                rows += 1
+            cursor.execute("INSERT INTO rollup_counters (name, value) VALUES ('backfilled:memories', 1)")
+            counts["memories"] = rows
+
+        return counts
+
+    def _label(self, type_key: str, encrypted_label: str) -> str:
+        if type_key not in self._labels:
+            self._labels[type_key] = self.crypto_manager.decrypt_bytes(encrypted_label).decode()
+        return self._labels[type_key]
+
+    def query(self, cursor, days: int = 30) -> Dict[str, Any]:
+        """Dashboard stats; reads O(days x categories) rows, never the history itself"""
+        days = max(1, min(days, MAX_STATS_DAYS))
+        today = datetime.now(timezone.utc).date()
+        since = (today - timedelta(days=days - 1)).isoformat()
+        rolling_since = (today - timedelta(days=ROLLING_DAYS - 1)).isoformat()
+
+        totals = dict(cursor.execute(
+            "SELECT name, value FROM rollup_counters WHERE name IN ('memories', 'conversations', 'active_days')"
+        ).fetchall())
+
+        labels = {
+            type_key: self._label(type_key, label)
+            for type_key, label, _ in cursor.execute("SELECT type_key, label, count FROM rollup_memory_types")
+        }
+        memory_types = {
+            labels[type_key]: count
+            for type_key, count in cursor.execute(
+                "SELECT type_key, count FROM rollup_memory_types WHERE count > 0"
+            )
+        }
+        memory_daily = [
+            {"day": day, "memory_type": labels[type_key], "count": count}
+            for day, type_key, count in cursor.execute(
+                "SELECT day, type_key, count FROM rollup_memory_daily WHERE day >= ? ORDER BY day", (since,)
+            )
+        ]
+
+        conversation_types = dict(cursor.execute(
+            "SELECT situation_type, count FROM rollup_conversation_types WHERE count > 0"
+        ).fetchall())
+        conversation_daily = [
+            {"day": day, "situation_type": situation_type, "count": count}
+            for day, situation_type, count in cursor.execute(
+                "SELECT day, situation_type, count FROM rollup_conversation_daily WHERE day >= ? ORDER BY day",
+                (since,)
+            )
+        ]
+
+        rolling = {
+            context: (ratings, rating_sum)
+            for context, ratings, rating_sum in cursor.execute('''
+                SELECT context, SUM(ratings), SUM(rating_sum) FROM rollup_outcome_daily
+                WHERE day >= ? GROUP BY context
+            ''', (rolling_since,))
+        }
+        outcomes = {}
+        for context, ratings, rating_sum in cursor.execute(
+            "SELECT context, ratings, rating_sum FROM rollup_outcome_contexts WHERE ratings > 0"
+        ):
+            recent_ratings, recent_sum = rolling.get(context, (0, 0))
+            outcomes[context] = {
+                "ratings": ratings,
+                "average_rating": round(rating_sum / ratings, 2),
+                "recent_ratings": recent_ratings,
+                "rolling_average_rating": round(recent_sum / recent_ratings, 2) if recent_ratings else None
+            }
+
+        return {
+            "days": days,
+            "since": since,
+            "totals": {
+                "memories": totals.get("memories", 0),
+                "conversations": totals.get("conversations", 0),
+                "active_days": totals.get("active_days", 0)
+            },
+            "memories": {"by_type": memory_types, "daily": memory_daily},
+            "conversations": {"by_situation_type": conversation_types, "daily": conversation_daily},
+            "outcomes": {"rolling_days": ROLLING_DAYS, "by_context": outcomes}
+        }
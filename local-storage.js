@@ -6,7 +6,7 @@
 class PWALocalStorage {
   constructor() {
     this.dbName = 'WhaddyaSayDB';
-    this.dbVersion = 1;
+    this.dbVersion = 2;
     this.db = null;
     this.cryptoManager = null;
   }
@@ -64,14 +64,24 @@ class PWALocalStorage {
           syncStore.createIndex('timestamp', 'timestamp', { unique: false });
           syncStore.createIndex('retries', 'retries', { unique: false });
         }
+
+        // v2: server IDs so pulled changes are stored only once
+        const upgradeTransaction = event.target.transaction;
+        ['memories', 'conversations'].forEach(storeName => {
+          const store = upgradeTransaction.objectStore(storeName);
+          if (!store.indexNames.contains('server_id')) {
+            store.createIndex('server_id', 'server_id', { unique: false });
+          }
+        });
       };
     });
   }
 
   /**
    * Store a memory with encryption
+   * syncInfo marks records pulled from the server ({ server_id, synced })
    */
-  async storeMemory(memoryData) {
+  async storeMemory(memoryData, syncInfo = null) {
     if (!this.db) {
       throw new Error('Database not initialized');
     }
@@ -86,7 +96,8 @@ class PWALocalStorage {
         timestamp: memoryData.timestamp || new Date().toISOString(),
         created_at: new Date().toISOString(),
         synced: false,
-        offline: true
+        offline: true,
+        ...syncInfo
       };
 
       // Handle file data
@@ -255,8 +266,9 @@ class PWALocalStorage {
 
   /**
    * Store conversation advice session
+   * syncInfo marks records pulled from the server ({ server_id, synced })
    */
-  async storeConversation(conversationData) {
+  async storeConversation(conversationData, syncInfo = null) {
     if (!this.db) {
       throw new Error('Database not initialized');
     }
@@ -266,10 +278,11 @@ class PWALocalStorage {
         situation: conversationData.situation || '',
         situation_type: conversationData.situation_type || 'general',
         advice_given: JSON.stringify(conversationData.advice || {}),
-        timestamp: new Date().toISOString(),
+        timestamp: conversationData.timestamp || new Date().toISOString(),
         created_at: new Date().toISOString(),
         synced: false,
-        offline: true
+        offline: true,
+        ...syncInfo
       };
 
       // Encrypt if crypto manager is available
@@ -448,6 +461,73 @@ class PWALocalStorage {
     });
   }
 
+  /**
+   * Stable per-device ID used to tag pushed changes
+   */
+  getDeviceId() {
+    let deviceId = localStorage.getItem('whaddyasay_device_id');
+    if (!deviceId) {
+      deviceId = crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+      localStorage.setItem('whaddyasay_device_id', deviceId);
+    }
+    return deviceId;
+  }
+
+  /**
+   * Last server change sequence number this device has seen
+   */
+  getSyncCursor() {
+    return parseInt(localStorage.getItem('whaddyasay_sync_cursor') || '0', 10);
+  }
+
+  setSyncCursor(cursor) {
+    localStorage.setItem('whaddyasay_sync_cursor', String(cursor));
+  }
+
+  /**
+   * Find a local record by its server ID
+   */
+  async findByServerId(storeName, serverId) {
+    if (!this.db) {
+      throw new Error('Database not initialized');
+    }
+
+    return new Promise((resolve, reject) => {
+      const transaction = this.db.transaction([storeName], 'readonly');
+      const request = transaction.objectStore(storeName).index('server_id').get(serverId);
+
+      request.onsuccess = () => resolve(request.result || null);
+      request.onerror = () => reject(request.error);
+    });
+  }
+
+  /**
+   * Store changes pulled from the server (skipping ones we already have)
+   */
+  async applyServerChanges(changes) {
+    let applied = 0;
+
+    for (const change of changes) {
+      if (!change.data) continue;
+
+      const storeName = change.type === 'memory' ? 'memories' : 'conversations';
+      if (await this.findByServerId(storeName, change.id)) continue;
+
+      const syncInfo = { server_id: change.id, synced: true, offline: false };
+      if (change.type === 'memory') {
+        await this.storeMemory(change.data, syncInfo);
+      } else {
+        await this.storeConversation({
+          ...change.data,
+          advice: change.data.advice_given
+        }, syncInfo);
+      }
+      applied++;
+    }
+
+    return applied;
+  }
+
   /**
    * Clear all data (for testing/reset)
    */
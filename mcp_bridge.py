@@ -4,23 +4,96 @@ HTTP Bridge for MCP Server
 Provides REST API endpoints for the web interface
 """
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import asyncio
 import json
 import base64
+import hashlib
 import os
 from pathlib import Path
+import queue
 import threading
 import time
+from contextlib import asynccontextmanager
+from urllib.parse import quote, unquote
+import anyio
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from mcp.shared.memory import create_client_server_memory_streams
+import mcp.types as types
+from asset_pipeline import AssetManifest
+from admission import admission, kdf_endpoint
+from single_flight import SingleFlight
+import fast_json
+from resource_events import ResourceEventHub, VaultWatches
+from response_cache import ResponseCache
+from socket_transport import DEFAULT_SOCKET_PATH, unix_socket_client
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for web app
 
+# Fingerprint and precompress the allowlisted front-end files once
+assets = AssetManifest('.')
+
+# Resources browsers can watch over /api/events, by short name
+WATCHABLE_RESOURCES = {
+    'memories': 'memory://personal-memories',
+    'conversations': 'conversation://advice-history',
+    'patterns': 'patterns://communication-patterns'
+}
+
+# Seconds between SSE keep-alive comments on an idle push connection
+EVENTS_KEEPALIVE_SECONDS = 25
+
+# Browser-mode exports are spooled here before import (see bulk_import.py)
+IMPORTS_DIR = Path('./uploads/imports')
+IMPORT_MAX_BYTES = int(os.environ.get('COACH_IMPORT_MAX_MB', 512)) * 1024 * 1024
+IMPORT_SPOOL_CHUNK = 1024 * 1024
+
+# Encrypted export chunks fetched from the server per tool call
+EXPORT_CHUNKS_PER_CALL = 8
+
+# How the bridge reaches the MCP server (see bench_transport.py):
+# - subprocess: python3 mcp_server.py over stdio; a server crash can't take
+#   the bridge down, and it is restarted on the next retry
+# - inprocess: the server runs on the bridge's MCP loop over in-memory
+#   streams; no second interpreter, no JSON-RPC encoding or pipe copies
+# - socket: a shared daemon (mcp_server.py --socket) that other bridges and
+#   clients also use, so unlocked vaults and warm caches are shared
+MCP_TRANSPORTS = ('subprocess', 'inprocess', 'socket')
+MCP_TRANSPORT = os.environ.get('COACH_MCP_TRANSPORT', 'subprocess')
+MCP_SOCKET_PATH = os.environ.get('COACH_MCP_SOCKET', str(DEFAULT_SOCKET_PATH))
+
+# Read-only tools answered from the bridge cache: the vault data each
+# depends on, and how long an entry may live without a write or notification
+CACHED_TOOLS = {
+    'get_security_status': (('security',), 5),
+    'search_memories': (('memories', 'security'), 60),
+    'analyze_communication_patterns': (('patterns', 'conversations'), 60),
+    'get_history_stats': (('memories', 'conversations', 'security'), 60)
+}
+
+# What each write tool makes stale in the caller's vault
+WRITE_INVALIDATES = {
+    'store_memory': ('memories',),
+    'sync_changes': ('memories', 'conversations'),
+    'archive_old_records': ('memories', 'conversations'),
+    'get_conversation_advice': ('conversations',),
+    'record_conversation_outcome': ('conversations', 'patterns'),
+    'authenticate_user': ('security',),
+    'rotate_encryption_keys': ('security',),
+    'import_local_data': ('memories', 'conversations')
+}
+
+class InvalidToolArguments(ValueError):
+    """The server rejected a call's arguments against the tool's schema"""
+
 class MCPBridge:
-    def __init__(self):
+    def __init__(self, transport: str = MCP_TRANSPORT):
+        if transport not in MCP_TRANSPORTS:
+            raise ValueError(f"Unknown MCP transport {transport!r} (expected one of {MCP_TRANSPORTS})")
+        self.transport = transport
         self.mcp_session = None
         self.server_params = StdioServerParameters(
             command="python3",
@@ -28,6 +101,8 @@ class MCPBridge:
         )
         self.loop = None
         self.thread = None
+        # Drops cached results when the server reports a vault changed
+        self.watches = VaultWatches(resource_events, self._invalidate_resource)
         self.start_mcp_session()
     
     def start_mcp_session(self):
@@ -43,45 +118,214 @@ class MCPBridge:
         # Wait a moment for session to initialize
         time.sleep(2)
     
+    @asynccontextmanager
+    async def _open_transport(self):
+        """Read/write streams to a fresh server session"""
+        if self.transport == 'subprocess':
+            async with stdio_client(self.server_params) as streams:
+                yield streams
+            return
+        
+        if self.transport == 'socket':
+            # The daemon outlives us; a restart shows up as a dropped session
+            async with unix_socket_client(MCP_SOCKET_PATH) as streams:
+                yield streams
+            return
+        
+        import mcp_server  # Only loaded when embedded
+        async with create_client_server_memory_streams() as (client_streams, server_streams):
+            async with anyio.create_task_group() as task_group:
+                task_group.start_soon(mcp_server.serve, *server_streams)
+                try:
+                    yield client_streams
+                finally:
+                    task_group.cancel_scope.cancel()
+    
     async def _maintain_session(self):
         """Maintain persistent MCP session"""
         while True:
             try:
-                async with stdio_client(self.server_params) as (read, write):
-                    async with ClientSession(read, write) as session:
+                async with self._open_transport() as (read, write):
+                    async with ClientSession(read, write, message_handler=self._handle_message) as session:
                         await session.initialize()
+                        response_cache.clear()  # A new server process may be locked, or hold other data
                         self.mcp_session = session
-                        print("✅ MCP session established")
+                        print(f"✅ MCP session established ({self.transport})")
+                        
+                        # A new server process knows nothing of our subscriptions
+                        for uri in resource_events.active_uris():
+                            await self._set_subscription(uri, True)
                         
                         # Keep session alive
                         while True:
                             await asyncio.sleep(1)
+                            self.watches.release_idle()
                             
             except Exception as e:
                 print(f"❌ MCP session error: {e}")
                 self.mcp_session = None
+                self.watches.release_all()
                 await asyncio.sleep(5)  # Retry after 5 seconds
     
-    async def call_tool(self, tool_name: str, arguments: dict):
-        """Call MCP tool safely"""
+    async def call_tool(self, tool_name: str, arguments: dict, progress_callback=None,
+                        cache_checked: bool = False):
+        """Call MCP tool safely (read-only tools may be answered from the cache)"""
         if not self.mcp_session:
             raise Exception("MCP session not available")
         
-        result = await self.mcp_session.call_tool(tool_name, arguments)
-        return result.content[0].text
+        arguments = present_arguments(arguments)
+        user_id = arguments.get('user_id', '')
+        cached = CACHED_TOOLS.get(tool_name)
+        if cached is not None:
+            if not cache_checked:
+                result = self.cached_result(tool_name, arguments)
+                if result is not None:
+                    return result
+            tags, ttl = cached
+            self.watches.watch(user_id, list(resource_uris(user_id)), ttl)
+            snapshot = response_cache.begin((user_id, tag) for tag in tags)
+        
+        try:
+            result = await self.mcp_session.call_tool(tool_name, arguments, progress_callback=progress_callback)
+            text = result.content[0].text
+        finally:
+            if tool_name in WRITE_INVALIDATES:
+                response_cache.invalidate((user_id, tag) for tag in WRITE_INVALIDATES[tool_name])
+        
+        if text.startswith('{"error"'):
+            error = json.loads(text)
+            if error.get('error') == 'Invalid arguments':
+                raise InvalidToolArguments(error.get('message', ''))
+        
+        if cached is not None:
+            response_cache.put(cache_key(tool_name, arguments), text, snapshot, ttl)
+            self.watches.watch(user_id, list(resource_uris(user_id)), ttl)  # Outlive the entry just cached
+        return text
+    
+    def cached_result(self, tool_name: str, arguments: dict):
+        """Cached text for a read-only call, or None (safe from any thread)"""
+        if tool_name not in CACHED_TOOLS:
+            return None
+        return response_cache.get(cache_key(tool_name, arguments))
+    
+    def _invalidate_resource(self, uri: str):
+        base, _, query = uri.partition('?')
+        user_id = unquote(query.partition('user_id=')[2]) if query else ''
+        response_cache.invalidate([(user_id, RESOURCE_NAMES[base])])
+    
+    def set_subscription(self, uri: str, subscribed: bool):
+        """Schedule resources/subscribe (or unsubscribe) without waiting for it"""
+        if self.loop is not None:
+            asyncio.run_coroutine_threadsafe(self._set_subscription(uri, subscribed), self.loop)
+    
+    async def _set_subscription(self, uri: str, subscribed: bool):
+        if not self.mcp_session:
+            return  # Sent for every active URI once the session is back
+        try:
+            if subscribed:
+                await self.mcp_session.subscribe_resource(uri)
+            else:
+                await self.mcp_session.unsubscribe_resource(uri)
+        except Exception as e:
+            print(f"❌ Resource subscription error for {uri}: {e}")
+    
+    async def _handle_message(self, message):
+        """Server notifications: resource updates go out to push listeners"""
+        if (isinstance(message, types.ServerNotification)
+                and isinstance(message.root, types.ResourceUpdatedNotification)):
+            resource_events.dispatch(str(message.root.params.uri))
+
+def resource_uris(user_id: str) -> dict:
+    """Watchable resource URIs of a vault -> short name"""
+    suffix = f"?user_id={quote(user_id, safe='')}" if user_id else ''
+    return {uri + suffix: name for name, uri in WATCHABLE_RESOURCES.items()}
+
+def cache_key(tool_name: str, arguments: dict) -> str:
+    return f"{tool_name}:{json.dumps(present_arguments(arguments), sort_keys=True)}"
+
+def present_arguments(arguments: dict) -> dict:
+    """Drop optional arguments the client left out (None) - tool schemas don't accept null"""
+    return {key: value for key, value in arguments.items() if value is not None}
+
+def invalid_arguments(error: InvalidToolArguments):
+    return jsonify({'success': False, 'error': 'Invalid arguments', 'message': str(error)}), 400
+
+RESOURCE_NAMES = {uri: name for name, uri in WATCHABLE_RESOURCES.items()}
+
+# Read-only tool results, dropped by writes and resources/updated
+response_cache = ResponseCache(int(os.environ.get('COACH_BRIDGE_CACHE_MB', '16')) * 1024 * 1024)
+
+# Browser push connections share one MCP subscription per resource
+resource_events = ResourceEventHub(
+    subscribe=lambda uri: bridge.set_subscription(uri, True),
+    unsubscribe=lambda uri: bridge.set_subscription(uri, False)
+)
 
 # Global bridge instance
-bridge = MCPBridge()
+# Spawned helper processes (the media pool, when the server is embedded)
+# re-import this script as __mp_main__; only the real bridge connects
+if __name__ != '__mp_main__':
+    bridge = MCPBridge()
+
+# Concurrent identical reads (many tabs loading at once) share one MCP round trip
+read_flight = SingleFlight()
+
+def coalesced_call(tool_name: str, arguments: dict, timeout: float) -> str:
+    """Call a read-only tool, joining an identical call that is already in flight"""
+    # Cache hits are answered on this thread, without a hop to the MCP loop
+    result = bridge.cached_result(tool_name, arguments)
+    if result is not None:
+        return result
+    
+    def call():
+        future = asyncio.run_coroutine_threadsafe(
+            bridge.call_tool(tool_name, arguments, cache_checked=True),
+            bridge.loop
+        )
+        return future.result(timeout=timeout)
+    
+    return read_flight.do(tool_name, (tool_name, json.dumps(arguments, sort_keys=True)), call)
+
+def json_passthrough(result: str, key: str):
+    """Wrap a tool's JSON payload as {"success": true, key: ...} without decoding it"""
+    if not fast_json.is_json_document(result):
+        json.loads(result)  # Not JSON - raise the same error the decoding path would
+    return Response(fast_json.wrap_raw(result, key, success=True), mimetype='application/json')
+
+def vault_arguments(arguments: dict) -> dict:
+    """Route a tool call to the caller's vault (X-User-Id header) with its unlock token (X-Vault-Token)"""
+    user_id = request.headers.get('X-User-Id')
+    if user_id:
+        arguments['user_id'] = user_id
+    # Every browser shares the bridge's MCP session, so access is per token
+    vault_token = request.headers.get('X-Vault-Token')
+    if vault_token:
+        arguments['vault_token'] = vault_token
+    return arguments
+
+def idempotent_arguments(arguments: dict, data: dict) -> dict:
+    """Forward the client's Idempotency-Key so retried writes are not repeated"""
+    idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    if idempotency_key:
+        arguments['idempotency_key'] = idempotency_key
+    return vault_arguments(arguments)
 
 @app.route('/')
 def serve_index():
     """Serve the main coach interface"""
-    return send_from_directory('.', 'index.html')
+    return assets.serve('index.html')
+
+@app.route('/asset-manifest.json')
+def serve_asset_manifest():
+    """Map plain asset names to their fingerprinted (immutable) URLs"""
+    response = jsonify(assets.to_dict())
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/<path:filename>')
 def serve_static(filename):
-    """Serve static files"""
-    return send_from_directory('.', filename)
+    """Serve allowlisted static files (precompressed, ETag-validated)"""
+    return assets.serve(filename)
 
 @app.route('/api/conversation/advice', methods=['POST'])
 def get_conversation_advice():
@@ -98,23 +342,20 @@ def get_conversation_advice():
         
         # Call MCP server asynchronously
         future = asyncio.run_coroutine_threadsafe(
-            bridge.call_tool('get_conversation_advice', {
+            bridge.call_tool('get_conversation_advice', idempotent_arguments({
                 'situation': situation,
                 'context': context,
                 'relationship': relationship,
                 'urgency': urgency
-            }),
+            }, data)),
             bridge.loop
         )
         
         result = future.result(timeout=30)  # 30 second timeout
-        advice = json.loads(result)
-        
-        return jsonify({
-            'success': True,
-            'advice': advice
-        })
+        return json_passthrough(result, 'advice')
         
+    except InvalidToolArguments as e:
+        return invalid_arguments(e)
     except Exception as e:
         print(f"Error getting advice: {e}")
         return jsonify({
@@ -122,6 +363,67 @@ def get_conversation_advice():
             'error': str(e)
         }), 500
 
+@app.route('/api/conversation/advice/stream', methods=['POST'])
+def stream_conversation_advice():
+    """Stream advice sections as Server-Sent Events as soon as each is ready"""
+    data = request.json or {}
+    situation = data.get('situation', '')
+    
+    if not situation:
+        return jsonify({'error': 'Situation is required'}), 400
+    
+    arguments = idempotent_arguments({
+        'situation': situation,
+        'context': data.get('context', 'general'),
+        'relationship': data.get('relationship', ''),
+        'urgency': data.get('urgency', 'medium')
+    }, data)
+    
+    events = queue.Queue()
+    
+    async def on_progress(progress, total, message):
+        # MCP progress notification -> one 'section' event
+        if message:
+            events.put(('section', message))
+    
+    future = asyncio.run_coroutine_threadsafe(
+        bridge.call_tool('get_conversation_advice', arguments, progress_callback=on_progress),
+        bridge.loop
+    )
+    future.add_done_callback(lambda _: events.put(None))
+    
+    def generate():
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                event = events.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                future.cancel()
+                yield sse_event('error', json.dumps({'error': 'Timed out waiting for advice'}))
+                return
+            if event is None:
+                break
+            yield sse_event(*event)
+        
+        try:
+            result = future.result()
+            if '\n' in result or not fast_json.is_json_document(result):
+                # Results replayed from before compact encoding may span lines
+                result = fast_json.dumps(json.loads(result))
+            yield sse_event('done', fast_json.wrap_raw(result, 'advice', success=True))
+        except Exception as e:
+            print(f"Error streaming advice: {e}")
+            yield sse_event('error', json.dumps({'success': False, 'error': str(e)}))
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Don't let a reverse proxy hold sections back
+    })
+
+def sse_event(event: str, data: str) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {data}\n\n"
+
 @app.route('/api/memory/store', methods=['POST'])
 def store_memory():
     """Store a personal memory"""
@@ -149,7 +451,7 @@ def store_memory():
         
         # Call MCP server
         future = asyncio.run_coroutine_threadsafe(
-            bridge.call_tool('store_memory', memory_data),
+            bridge.call_tool('store_memory', idempotent_arguments(memory_data, data)),
             bridge.loop
         )
         
@@ -160,6 +462,8 @@ def store_memory():
             'message': result
         })
         
+    except InvalidToolArguments as e:
+        return invalid_arguments(e)
     except Exception as e:
         print(f"Error storing memory: {e}")
         return jsonify({
@@ -186,21 +490,156 @@ def search_memories():
         if memory_type:
             search_args['memory_type'] = memory_type
         
+        result = coalesced_call('search_memories', vault_arguments(search_args), timeout=10)
+        return json_passthrough(result, 'memories')
+        
+    except InvalidToolArguments as e:
+        return invalid_arguments(e)
+    except Exception as e:
+        print(f"Error searching memories: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/memory/<int:memory_id>/media', methods=['GET'])
+def get_media_artifacts(memory_id):
+    """Precomputed waveform peaks and thumbnails for a memory"""
+    try:
         future = asyncio.run_coroutine_threadsafe(
-            bridge.call_tool('search_memories', search_args),
+            bridge.call_tool('get_media_artifacts', vault_arguments({'memory_id': memory_id})),
             bridge.loop
         )
         
-        result = future.result(timeout=10)
-        memories = json.loads(result)
+        result = json.loads(future.result(timeout=10))
+        
+        if 'error' in result:
+            return jsonify({'success': False, **result}), 401
+        
+        return jsonify({'success': True, **result})
         
+    except InvalidToolArguments as e:
+        return invalid_arguments(e)
+    except Exception as e:
+        print(f"Error loading media artifacts: {e}")
         return jsonify({
-            'success': True,
-            'memories': memories
-        })
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/memory/<int:memory_id>/peaks', methods=['GET'])
+def get_audio_peaks(memory_id):
+    """Multi-resolution waveform peaks, with HTTP Range support"""
+    try:
+        # A Range we can't parse is ignored, as HTTP allows - the client gets everything
+        byte_range = parse_byte_range(request.headers.get('Range')) or None
         
+        start, end = byte_range or (0, None)
+        arguments = {'memory_id': memory_id, 'start': start}
+        if end is not None:
+            arguments['length'] = end - start + 1
+        
+        result = read_peaks(arguments)
+        if 'error' in result:
+            return peaks_error(result)
+        
+        data = base64.b64decode(result['data'])
+        total = result['total']
+        headers = {
+            'Accept-Ranges': 'bytes',
+            'Cache-Control': 'private, no-cache',
+            # Level table: {frames_per_bin, bins, offset} - each bin is an int8 (min, max) pair
+            'X-Peaks-Levels': json.dumps(result['levels'], separators=(',', ':'))
+        }
+        
+        if byte_range is None:
+            # The whole payload, read in as many tool-sized slices as it takes
+            chunks = [data]
+            offset = len(data)
+            while offset < total:
+                result = read_peaks({'memory_id': memory_id, 'start': offset})
+                if 'error' in result:
+                    return peaks_error(result)
+                chunk = base64.b64decode(result['data'])
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                offset += len(chunk)
+            return Response(b''.join(chunks), status=200, headers=headers, mimetype='application/octet-stream')
+        
+        if start >= total:
+            headers['Content-Range'] = f'bytes */{total}'
+            return Response(status=416, headers=headers)
+        
+        headers['Content-Range'] = f"bytes {result['start']}-{result['start'] + len(data) - 1}/{total}"
+        return Response(data, status=206, headers=headers, mimetype='application/octet-stream')
+        
+    except InvalidToolArguments as e:
+        return invalid_arguments(e)
     except Exception as e:
-        print(f"Error searching memories: {e}")
+        print(f"Error reading audio peaks: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def read_peaks(arguments: dict) -> dict:
+    """One read_audio_peaks call (at most MAX_PEAKS_READ_BYTES of payload)"""
+    future = asyncio.run_coroutine_threadsafe(
+        bridge.call_tool('read_audio_peaks', vault_arguments(arguments)),
+        bridge.loop
+    )
+    return json.loads(future.result(timeout=10))
+
+def peaks_error(result: dict):
+    status = {'Not found': 404, 'Access denied': 403}.get(result['error'], 401)
+    return jsonify({'success': False, **result}), status
+
+def parse_byte_range(header: str):
+    """'bytes=a-b' -> (a, b or None); None without a header, False if unsupported"""
+    if not header:
+        return None
+    unit, _, spec = header.partition('=')
+    first, _, last = spec.strip().partition('-')
+    if unit.strip() != 'bytes' or ',' in spec or not first.isdigit() or (last and not last.isdigit()):
+        return False  # Suffix and multi-part ranges aren't needed by the waveform view
+    if last and int(last) < int(first):
+        return False
+    return int(first), int(last) if last else None
+
+@app.route('/api/sync', methods=['POST'])
+def sync_changes():
+    """Exchange deltas with a device since its last sync cursor"""
+    try:
+        data = request.json
+        device_id = data.get('device_id')
+        
+        if not device_id:
+            return jsonify({'success': False, 'error': 'device_id is required'}), 400
+        
+        future = asyncio.run_coroutine_threadsafe(
+            bridge.call_tool('sync_changes', vault_arguments({
+                'device_id': device_id,
+                'cursor': data.get('cursor', 0),
+                'changes': data.get('changes', []),
+                'limit': data.get('limit', 200)
+            })),
+            bridge.loop
+        )
+        
+        result = json.loads(future.result(timeout=30))
+        
+        if 'error' in result:
+            # Clients act on the status, so it says what went wrong
+            status = {'Authentication required': 401, 'Access denied': 403}.get(result['error'], 400)
+            return jsonify({'success': False, **result}), status
+        
+        return jsonify({'success': True, **result})
+        
+    except InvalidToolArguments as e:
+        return invalid_arguments(e)
+    except Exception as e:
+        print(f"Error syncing changes: {e}")
         return jsonify({
             'success': False,
             'error': str(e)
@@ -211,24 +650,36 @@ def record_outcome():
     """Record how a conversation went"""
     try:
         data = request.json
+        arguments = {
+            'conversation_id': data.get('conversation_id'),
+            'outcome': data.get('outcome'),
+            'success_rating': data.get('success_rating'),
+            'lessons_learned': data.get('lessons_learned', '')
+        }
+        # Form fields arrive as strings; the tool takes integers
+        for field in ('conversation_id', 'success_rating'):
+            if isinstance(arguments[field], str) and arguments[field].strip().isdigit():
+                arguments[field] = int(arguments[field])
         
         future = asyncio.run_coroutine_threadsafe(
-            bridge.call_tool('record_conversation_outcome', {
-                'conversation_id': data.get('conversation_id'),
-                'outcome': data.get('outcome'),
-                'success_rating': data.get('success_rating'),
-                'lessons_learned': data.get('lessons_learned', '')
-            }),
+            bridge.call_tool('record_conversation_outcome', vault_arguments(arguments)),
             bridge.loop
         )
         
         result = future.result(timeout=10)
         
+        if result.startswith('{"error"'):
+            error = json.loads(result)
+            status = {'Authentication required': 401, 'Access denied': 403}.get(error['error'], 400)
+            return jsonify({'success': False, **error}), status
+        
         return jsonify({
             'success': True,
             'message': result
         })
         
+    except InvalidToolArguments as e:
+        return invalid_arguments(e)
     except Exception as e:
         print(f"Error recording outcome: {e}")
         return jsonify({
@@ -244,9 +695,9 @@ def analyze_patterns():
         context = data.get('context', 'all')
         
         future = asyncio.run_coroutine_threadsafe(
-            bridge.call_tool('analyze_communication_patterns', {
+            bridge.call_tool('analyze_communication_patterns', vault_arguments({
                 'context': context
-            }),
+            })),
             bridge.loop
         )
         
@@ -257,6 +708,8 @@ def analyze_patterns():
             'patterns': json.loads(result) if result else []
         })
         
+    except InvalidToolArguments as e:
+        return invalid_arguments(e)
     except Exception as e:
         print(f"Error analyzing patterns: {e}")
         return jsonify({
@@ -264,23 +717,34 @@ def analyze_patterns():
             'error': str(e)
         }), 500
 
+@app.route('/api/stats', methods=['GET'])
+def get_history_stats():
+    """Dashboard stats from the server-side rollups (?days=30)"""
+    try:
+        days = request.args.get('days', 30, type=int)
+        result = coalesced_call('get_history_stats', vault_arguments({'days': days}), timeout=10)
+        if result.startswith('{"error"'):
+            return jsonify({'success': False, **json.loads(result)}), 400
+        return json_passthrough(result, 'stats')
+        
+    except InvalidToolArguments as e:
+        return invalid_arguments(e)
+    except Exception as e:
+        print(f"Error loading history stats: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/security/status', methods=['GET'])
 def get_security_status():
     """Get security and authentication status"""
     try:
-        future = asyncio.run_coroutine_threadsafe(
-            bridge.call_tool('get_security_status', {}),
-            bridge.loop
-        )
-        
-        result = future.result(timeout=10)
-        status = json.loads(result)
-        
-        return jsonify({
-            'success': True,
-            'status': status
-        })
+        result = coalesced_call('get_security_status', vault_arguments({}), timeout=10)
+        return json_passthrough(result, 'status')
         
+    except InvalidToolArguments as e:
+        return invalid_arguments(e)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -288,6 +752,7 @@ def get_security_status():
         }), 500
 
 @app.route('/api/security/authenticate', methods=['POST'])
+@kdf_endpoint(cost=1)
 def authenticate_user():
     """Authenticate user with master password"""
     try:
@@ -301,10 +766,11 @@ def authenticate_user():
             }), 400
         
         future = asyncio.run_coroutine_threadsafe(
-            bridge.call_tool('authenticate_user', {
+            bridge.call_tool('authenticate_user', vault_arguments({
                 'master_password': master_password,
-                'setup_new': False
-            }),
+                'setup_new': False,
+                'bind_session': False
+            })),
             bridge.loop
         )
         
@@ -315,9 +781,12 @@ def authenticate_user():
             'success': True,
             'authenticated': auth_result.get('authenticated', False),
             'message': auth_result.get('message', ''),
+            'vault_token': auth_result.get('vault_token'),
             'security_status': auth_result.get('security_status', {})
         })
         
+    except InvalidToolArguments as e:
+        return invalid_arguments(e)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -325,6 +794,7 @@ def authenticate_user():
         }), 500
 
 @app.route('/api/security/setup', methods=['POST'])
+@kdf_endpoint(cost=2)  # KDF plus RSA key generation
 def setup_encryption():
     """First-time encryption setup"""
     try:
@@ -344,10 +814,11 @@ def setup_encryption():
             }), 400
         
         future = asyncio.run_coroutine_threadsafe(
-            bridge.call_tool('authenticate_user', {
+            bridge.call_tool('authenticate_user', vault_arguments({
                 'master_password': master_password,
-                'setup_new': True
-            }),
+                'setup_new': True,
+                'bind_session': False
+            })),
             bridge.loop
         )
         
@@ -357,9 +828,12 @@ def setup_encryption():
         return jsonify({
             'success': setup_result.get('authenticated', False),
             'message': setup_result.get('message', ''),
+            'vault_token': setup_result.get('vault_token'),
             'security_status': setup_result.get('security_status', {})
         })
         
+    except InvalidToolArguments as e:
+        return invalid_arguments(e)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -367,6 +841,7 @@ def setup_encryption():
         }), 500
 
 @app.route('/api/security/rotate', methods=['POST'])
+@kdf_endpoint(cost=2)  # KDF plus RSA key generation
 def rotate_keys():
     """Rotate encryption keys"""
     try:
@@ -381,10 +856,10 @@ def rotate_keys():
             }), 400
         
         future = asyncio.run_coroutine_threadsafe(
-            bridge.call_tool('rotate_encryption_keys', {
+            bridge.call_tool('rotate_encryption_keys', vault_arguments({
                 'current_password': current_password,
                 'new_password': new_password
-            }),
+            })),
             bridge.loop
         )
         
@@ -393,18 +868,206 @@ def rotate_keys():
         
         return jsonify(rotation_result)
         
+    except InvalidToolArguments as e:
+        return invalid_arguments(e)
     except Exception as e:
         return jsonify({
             'success': False,
             'message': f'Key rotation error: {str(e)}'
         }), 500
 
+@app.route('/api/maintenance/archive', methods=['POST'])
+def archive_old_records():
+    """Move old memories and advice sessions to the archive tier"""
+    try:
+        data = request.json or {}
+
+        future = asyncio.run_coroutine_threadsafe(
+            bridge.call_tool('archive_old_records', vault_arguments({
+                'older_than_days': int(data.get('older_than_days', 180))
+            })),
+            bridge.loop
+        )
+
+        # Archiving plus the first VACUUM can take a while on big vaults
+        result = json.loads(future.result(timeout=300))
+
+        if 'error' in result:
+            return jsonify({'success': False, **result}), 401
+
+        return jsonify({'success': True, **result})
+
+    except InvalidToolArguments as e:
+        return invalid_arguments(e)
+    except Exception as e:
+        print(f"Error archiving records: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/import', methods=['POST'])
+def import_local_data():
+    """
+    Import a browser-mode export (raw JSON or NDJSON request body)
+    The body is spooled to disk while hashing it; the hash is the import ID,
+    so posting the same export again resumes (or no-ops) instead of duplicating
+    """
+    spool_path = None
+    try:
+        IMPORTS_DIR.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        spool_path = IMPORTS_DIR / f"import_{os.getpid()}_{threading.get_ident()}_{time.time_ns()}.part"
+        with open(spool_path, 'wb') as f:
+            while True:
+                chunk = request.stream.read(IMPORT_SPOOL_CHUNK)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > IMPORT_MAX_BYTES:
+                    return jsonify({'success': False, 'error': 'Export is too large'}), 413
+                digest.update(chunk)
+                f.write(chunk)
+        
+        if size == 0:
+            return jsonify({'success': False, 'error': 'Export is empty'}), 400
+        
+        future = asyncio.run_coroutine_threadsafe(
+            bridge.call_tool('import_local_data', vault_arguments({
+                'path': str(spool_path),
+                'import_id': digest.hexdigest(),
+                'device_id': request.headers.get('X-Device-Id') or request.args.get('device_id', '')
+            })),
+            bridge.loop
+        )
+        
+        result = json.loads(future.result(timeout=3600))
+        
+        if 'error' in result:
+            status = 401 if result['error'] == 'Authentication required' else 400
+            return jsonify({'success': False, **result}), status
+        
+        return jsonify({'success': True, **result})
+        
+    except InvalidToolArguments as e:
+        return invalid_arguments(e)
+    except Exception as e:
+        print(f"Error importing data: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+    finally:
+        if spool_path is not None:
+            spool_path.unlink(missing_ok=True)
+
+@app.route('/api/export', methods=['POST'])
+def export_vault():
+    """
+    Download the whole vault as a passphrase-encrypted export
+    Chunks are pulled from the server as the client reads them, so neither
+    process holds more than a few chunks however big the vault is
+    """
+    data = request.json or {}
+    passphrase = data.get('passphrase', '')
+    export_format = data.get('format', 'ndjson')
+    arguments = vault_arguments({})
+    
+    def pull(extra: dict) -> dict:
+        future = asyncio.run_coroutine_threadsafe(
+            bridge.call_tool('export_vault', dict(arguments, max_chunks=EXPORT_CHUNKS_PER_CALL, **extra)),
+            bridge.loop
+        )
+        return json.loads(future.result(timeout=60))
+    
+    try:
+        # The first batch goes out before the response starts, so errors get a status code
+        first = pull({
+            'passphrase': passphrase,
+            'format': export_format,
+            'include_media': bool(data.get('include_media', True))
+        })
+    except InvalidToolArguments as e:
+        return invalid_arguments(e)
+    except Exception as e:
+        print(f"Error starting export: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
+    if 'error' in first:
+        status = 401 if first['error'] == 'Authentication required' else 400
+        return jsonify({'success': False, **first}), status
+    
+    def generate():
+        batch = first
+        try:
+            while True:
+                yield ''.join(line + '\n' for line in batch['lines'])
+                if batch['done']:
+                    return
+                batch = pull({'export_id': first['export_id']})
+                if 'error' in batch:
+                    # Too late for a status code - the client sees a truncated export
+                    print(f"Export failed midway: {batch.get('message')}")
+                    return
+        finally:
+            if not batch.get('done'):
+                # Download closed early - free the server's export slot now
+                try:
+                    pull({'export_id': first['export_id'], 'cancel': True})
+                except Exception:
+                    pass
+    
+    filename = f"whadyasay-export-{time.strftime('%Y%m%d')}.{'tar' if export_format == 'tar' else 'ndjson'}.wsx"
+    return Response(generate(), mimetype='application/octet-stream', headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/events', methods=['GET'])
+def resource_event_stream():
+    """Push resource changes as Server-Sent Events instead of making clients poll"""
+    # EventSource can't set headers, so the vault owner may come as ?user_id=
+    user_id = request.headers.get('X-User-Id') or request.args.get('user_id')
+    names = request.args.get('resources', ','.join(WATCHABLE_RESOURCES)).split(',')
+    unknown = [name for name in names if name not in WATCHABLE_RESOURCES]
+    if unknown:
+        return jsonify({'success': False, 'error': f'Unknown resources: {", ".join(unknown)}'}), 400
+    
+    names_by_uri = {uri: name for uri, name in resource_uris(user_id).items() if name in names}
+    listener = resource_events.listen(list(names_by_uri))
+    
+    def generate():
+        try:
+            yield f"retry: 5000\n{sse_event('ready', json.dumps({'resources': names}))}"
+            while True:
+                try:
+                    uri = listener.get(timeout=EVENTS_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"  # Lets proxies and the browser see the connection is alive
+                    continue
+                yield sse_event('resource-updated', json.dumps({'resource': names_by_uri[uri], 'uri': uri}))
+        finally:
+            resource_events.unlisten(listener)
+    
+    # No request context needed inside - connections can stay open a long time
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
         'mcp_connected': bridge.mcp_session is not None,
+        'mcp_transport': bridge.transport,
+        'admission': admission.get_stats(),
+        'single_flight': read_flight.stats.get_stats(),
+        'resource_events': resource_events.get_stats(),
+        'response_cache': response_cache.get_stats(),
         'timestamp': time.time()
     })
 
@@ -436,4 +1099,5 @@ if __name__ == '__main__':
     print("Web interface: http://localhost:5000")
     print("API endpoints: http://localhost:5000/api/")
     
+    assets.watch = True  # Debug server: pick up edited front-end files
     app.run(host='0.0.0.0', port=5000, debug=True, threaded=True)
\ No newline at end of file
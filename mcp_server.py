@@ -5,33 +5,96 @@ Stores personal memories and provides conversation advice
 """
 
 import asyncio
+import base64
 import json
+import secrets
 import sqlite3
 import os
+import time
+import weakref
 from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
 from pathlib import Path
 
 from mcp.server.models import InitializationOptions
 from mcp.server import NotificationOptions, Server
-from mcp.server.stdio import stdio_server
-from mcp.types import (
-    Resource,
-    Tool,
-    TextContent,
-    ImageContent,
-    EmbeddedResource,
-    LoggingLevel
-)
+from mcp.types import Resource, Tool
 import mcp.types as types
 from crypto_manager import PersonalCryptoManager
+from vault_registry import VaultRegistry, DEFAULT_USER_ID
+from search_index import EncryptedSearchIndex
+from vault_archive import ArchiveTier
+from advice_cache import AdviceCache
+from write_behind import WriteBehindLog
+from media_jobs import MediaJobQueue, shutdown_media_pool
+from single_flight import AsyncSingleFlight
+import fast_json
+from tool_registry import ToolRegistry
+from resource_subscriptions import ResourceSubscriptions
+from history_rollups import HistoryRollups, MAX_STATS_DAYS
+from bulk_import import BulkImporter, resolve_import
+from vault_export import ExportSessions, export_lines
+
+# Approximate per-vault resident cost (objects, paths, connection bookkeeping) -
+# a fixed estimate for the registry's budget, not a measurement
+VAULT_BASE_FOOTPRINT = 16 * 1024
+# Approximate extra cost of an unlocked vault (key material, cipher state)
+VAULT_UNLOCKED_FOOTPRINT = 8 * 1024
+
+# Unlock tokens kept per vault (oldest dropped first)
+MAX_ACCESS_TOKENS = 64
+
+# How long retried writes are answered from the stored result
+IDEMPOTENCY_TTL_SECONDS = 24 * 60 * 60
+# Expired idempotency keys are purged at most this often
+IDEMPOTENCY_PURGE_INTERVAL = 60
+
+# Largest slice of a peaks file returned by one read_audio_peaks call
+MAX_PEAKS_READ_BYTES = 1024 * 1024
+
+# Conversation fields sent to syncing devices
+CONVERSATION_SYNC_FIELDS = ("situation", "situation_type", "context", "advice_given",
+                            "outcome", "success_rating", "lessons_learned", "timestamp")
+
+# Resource that lists each synced entity type (for resources/updated)
+RESOURCE_FOR_ENTITY = {
+    "memory": "memory://personal-memories",
+    "conversation": "conversation://advice-history"
+}
 
 class ConversationCoachServer:
+    """
+    One user's vault: database, encryption keys and search index
+    Created on first use by the vault registry, so starting the server
+    (initialize / list_tools) never touches the database or crypto
+    """
+    
     def __init__(self, data_dir: str = "./data"):
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
         self.db_path = self.data_dir / "conversation_coach.db"
         self.crypto_manager = PersonalCryptoManager(data_dir)
+        self.search_index = EncryptedSearchIndex(self.data_dir / "search_index.enc", self.crypto_manager)
+        self.archive = ArchiveTier(self.data_dir, self.crypto_manager)
+        self.advice_cache = AdviceCache()
+        self.rollups = HistoryRollups(self.crypto_manager)
+        self.exports = ExportSessions()
+        self.conversation_log = WriteBehindLog(
+            self.db_path, "conversations", write_logged_conversation,
+            on_commit=lambda: self.notify_changed("conversation://advice-history")
+        )
+        self.media_jobs = MediaJobQueue(self.db_path, self.crypto_manager)
+        self.kdf_lock = asyncio.Lock()  # One password operation at a time per vault
+        # Cleared while a key rotation runs; vault tools wait on it instead of
+        # blocking the loop on the crypto manager's key lock
+        self.keys_ready = asyncio.Event()
+        self.keys_ready.set()
+        # Unlocking is per caller: the MCP sessions that authenticated, and
+        # tokens issued to callers sharing one session (the web bridge)
+        self.access_sessions = weakref.WeakSet()
+        self.access_tokens: Dict[str, None] = {}
+        self.active_calls = 0  # Tool calls running; busy vaults are not evicted
+        self.last_idempotency_purge = 0.0
         self.init_database()
         
     def init_database(self):
@@ -39,6 +102,9 @@ class ConversationCoachServer:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
+        # New databases reclaim space incrementally (see archive_old_records)
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        
         # Memories table - stores personal experiences and communication patterns
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS memories (
@@ -66,10 +132,19 @@ class ConversationCoachServer:
                 success_rating INTEGER, -- 1-5 rating
                 lessons_learned TEXT,
                 timestamp TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                context TEXT,       -- work, family, friends, etc.
+                outcome_at TEXT     -- when the outcome was recorded
             )
         ''')
         
+        # Columns added after the first release
+        cursor.execute("PRAGMA table_info(conversations)")
+        conversation_columns = {row[1] for row in cursor.fetchall()}
+        for column in ("context", "outcome_at"):
+            if column not in conversation_columns:
+                cursor.execute(f"ALTER TABLE conversations ADD COLUMN {column} TEXT")
+        
         # Communication patterns table - learned patterns about user's style
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS communication_patterns (
@@ -84,12 +159,180 @@ class ConversationCoachServer:
             )
         ''')
         
+        # Change log - monotonic sequence numbers for delta sync
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS change_log (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                entity TEXT NOT NULL,      -- 'memory', 'conversation'
+                entity_id INTEGER NOT NULL,
+                op TEXT NOT NULL,          -- 'insert', 'update'
+                device_id TEXT,            -- device that pushed the change (if synced)
+                idempotency_key TEXT UNIQUE,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Idempotency keys - stored results of retried writes (with TTL)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                key TEXT PRIMARY KEY,      -- '<tool>:<client key>' or '<tool>:content:<hmac>'
+                result TEXT NOT NULL,      -- response text returned to the first caller
+                expires_at REAL NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_idempotency_expires ON idempotency_keys(expires_at)
+        ''')
+        
+        # Media jobs - background post-processing of uploaded audio/photos
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS media_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                memory_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,        -- 'waveform', 'thumbnail'
+                source_path TEXT NOT NULL,
+                status TEXT DEFAULT 'pending', -- 'pending', 'done', 'failed', 'unsupported'
+                attempts INTEGER DEFAULT 0,
+                error TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_media_jobs_status ON media_jobs(status)
+        ''')
+        
+        # Media artifacts - small derived assets (waveform peaks, thumbnails)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS media_artifacts (
+                memory_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,     -- encrypted JSON
+                size INTEGER,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (memory_id, kind)
+            )
+        ''')
+        
+        # Dashboard rollups, maintained on every write
+        HistoryRollups.create_tables(cursor)
+        self.rollups.backfill(cursor)
+        BulkImporter.create_tables(cursor)
+        
         conn.commit()
         conn.close()
+    
+    def grant_access(self, session, bind_session: bool = True) -> str:
+        """Let the caller that just unlocked the vault use it; returns its token"""
+        if bind_session and session is not None:
+            self.access_sessions.add(session)
+        token = secrets.token_urlsafe(32)
+        self.access_tokens[token] = None
+        while len(self.access_tokens) > MAX_ACCESS_TOKENS:
+            del self.access_tokens[next(iter(self.access_tokens))]
+        return token
+    
+    def has_access(self, session, token: Optional[str] = None) -> bool:
+        """Whether this session (or token holder) unlocked the vault"""
+        if session is not None and session in self.access_sessions:
+            return True
+        return token is not None and token in self.access_tokens
+    
+    def busy(self) -> bool:
+        """Work that closing the vault would break (see VaultRegistry.enforce_budget)"""
+        return self.active_calls > 0 or self.exports.active() > 0
+    
+    def memory_footprint(self) -> int:
+        """Estimated bytes this vault keeps resident"""
+        footprint = VAULT_BASE_FOOTPRINT
+        if self.crypto_manager.authenticated:
+            footprint += VAULT_UNLOCKED_FOOTPRINT
+        return footprint + self.search_index.memory_footprint()
+    
+    def open_search_index(self):
+        """Build or load the full-text index once the vault is unlocked"""
+        if not self.search_index.is_open:
+            self.search_index.open(self.db_path)
+    
+    def backfill_rollups(self):
+        """Count memories written before the rollups existed (needs the key)"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            self.rollups.backfill(conn.cursor())
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def notify_changed(self, *uris: str):
+        """Tell subscribers these resources changed (call after the commit)"""
+        subscriptions.publish(str(self.data_dir), *uris)
+    
+    def close(self):
+        """Lock the vault before it is evicted from the registry"""
+        self.conversation_log.close()
+        self.search_index.close()
+        self.advice_cache.invalidate()
+        self.crypto_manager.lock()
+        self.access_sessions.clear()
+        self.access_tokens.clear()
 
 # Initialize the server
 server = Server("conversation-coach")
-coach_server = ConversationCoachServer()
+vault_registry = VaultRegistry(
+    data_dir="./data",
+    vault_factory=ConversationCoachServer,
+    memory_budget_bytes=int(os.environ.get("COACH_VAULT_MEMORY_BUDGET_MB", "64")) * 1024 * 1024
+)
+
+# Concurrent identical resource reads share one query
+resource_flight = AsyncSingleFlight()
+
+# Sessions waiting for resources/updated instead of polling
+subscriptions = ResourceSubscriptions()
+
+# Set when running as a shared daemon (mcp_server.py --socket)
+daemon = None
+
+# Tool handlers register themselves below; dispatch and list_tools read from here
+tools = ToolRegistry()
+
+# Every tool accepts an optional vault owner
+USER_ID_PROPERTY = {"type": "string", "description": "Vault owner ID (defaults to the local user)"}
+
+# Tools that touch vault data take the token authenticate_user returned
+# (not needed from the MCP session that authenticated)
+VAULT_TOKEN_PROPERTY = {"type": "string", "description": "Access token from authenticate_user"}
+
+def get_vault(user_id: Optional[str] = None) -> ConversationCoachServer:
+    """Get the vault for a user, opening it if it is not resident"""
+    return vault_registry.get(user_id or DEFAULT_USER_ID)
+
+def current_session():
+    """The MCP session of the request being handled (None outside a request)"""
+    try:
+        return server.request_context.session
+    except LookupError:
+        return None
+
+def conversation_log_pending() -> list[types.TextContent]:
+    """Error for a write-behind flush that timed out - answering would miss recent sessions"""
+    return [types.TextContent(
+        type="text",
+        text=json.dumps({
+            "error": "Busy",
+            "message": "Recent advice sessions are still being written - try again shortly"
+        })
+    )]
+
+def split_resource_uri(uri: str) -> tuple:
+    """Split 'scheme://name?user_id=alice' into ('scheme://name', {'user_id': 'alice'})"""
+    base, _, query = uri.partition("?")
+    params = {}
+    for param in query.split("&"):
+        key, _, value = param.partition("=")
+        if key and value:
+            params[key] = value
+    return base, params
 
 @server.list_resources()
 async def handle_list_resources() -> list[Resource]:
@@ -112,36 +355,85 @@ async def handle_list_resources() -> list[Resource]:
             name="Communication Patterns",
             description="Learned communication patterns and preferences",
             mimeType="application/json",
+        ),
+        Resource(
+            uri="metrics://server",
+            name="Server Metrics",
+            description="Resident vaults and read coalescing counters",
+            mimeType="application/json",
         )
     ]
 
+@server.subscribe_resource()
+async def handle_subscribe_resource(uri) -> None:
+    """Send resources/updated for this resource until unsubscribed"""
+    uri = str(uri)
+    base, params = split_resource_uri(uri)
+    vault = get_vault(params.get("user_id"))
+    subscriptions.subscribe(str(vault.data_dir), base, uri, server.request_context.session)
+
+@server.unsubscribe_resource()
+async def handle_unsubscribe_resource(uri) -> None:
+    """Stop resources/updated for this resource"""
+    uri = str(uri)
+    base, params = split_resource_uri(uri)
+    vault = get_vault(params.get("user_id"))
+    subscriptions.unsubscribe(str(vault.data_dir), base, uri, server.request_context.session)
+
 @server.read_resource()
 async def handle_read_resource(uri: str) -> str:
     """Read resource content"""
-    conn = sqlite3.connect(coach_server.db_path)
+    uri, params = split_resource_uri(str(uri))
+    if uri == "metrics://server":
+        return json.dumps({
+            "vaults": vault_registry.get_stats(),
+            "resource_single_flight": resource_flight.stats.get_stats(),
+            "subscriptions": subscriptions.get_stats(),
+            "daemon": daemon.get_stats() if daemon is not None else None
+        }, indent=2)
+    
+    vault = get_vault(params.get("user_id"))
+    # ?include_archived=true pages into the cold tier (needs the vault key,
+    # so only for callers the vault granted access to)
+    include_archived = (params.get("include_archived") in ("1", "true")
+                        and vault.crypto_manager.authenticated
+                        and vault.has_access(current_session(), params.get("vault_token")))
+    
+    # The query runs in a thread so identical reads arriving meanwhile can join it
+    return await resource_flight.do(
+        uri, (str(vault.data_dir), uri, include_archived),
+        lambda: asyncio.to_thread(read_resource_json, vault, uri, include_archived)
+    )
+
+def read_resource_json(vault: ConversationCoachServer, uri: str, include_archived: bool) -> str:
+    """Query a vault resource and encode it"""
+    conn = sqlite3.connect(vault.db_path)
     cursor = conn.cursor()
     
     try:
         if uri == "memory://personal-memories":
             cursor.execute("SELECT * FROM memories ORDER BY created_at DESC LIMIT 50")
             memories = cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description]
-            result = [dict(zip(columns, row)) for row in memories]
-            return json.dumps(result, indent=2)
+            result = fast_json.rows_to_json(cursor, memories)
+            if include_archived and len(memories) < 50:
+                archived = vault.archive.recent(vault.db_path, "memory", 50 - len(memories))
+                result = fast_json.concat_arrays(result, fast_json.dumps(archived))
+            return result
             
         elif uri == "conversation://advice-history":
+            if not vault.conversation_log.flush():
+                raise TimeoutError("Recent advice sessions are still being written - try again shortly")
             cursor.execute("SELECT * FROM conversations ORDER BY created_at DESC LIMIT 50")
             conversations = cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description]
-            result = [dict(zip(columns, row)) for row in conversations]
-            return json.dumps(result, indent=2)
+            result = fast_json.rows_to_json(cursor, conversations)
+            if include_archived and len(conversations) < 50:
+                archived = vault.archive.recent(vault.db_path, "conversation", 50 - len(conversations))
+                result = fast_json.concat_arrays(result, fast_json.dumps(archived))
+            return result
             
         elif uri == "patterns://communication-patterns":
             cursor.execute("SELECT * FROM communication_patterns ORDER BY confidence_score DESC")
-            patterns = cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description]
-            result = [dict(zip(columns, row)) for row in patterns]
-            return json.dumps(result, indent=2)
+            return fast_json.rows_to_json(cursor)
             
         else:
             raise ValueError(f"Unknown resource: {uri}")
@@ -152,186 +444,189 @@ async def handle_read_resource(uri: str) -> str:
 @server.list_tools()
 async def handle_list_tools() -> list[Tool]:
     """List available tools"""
-    return [
-        Tool(
-            name="store_memory",
-            description="Store a personal memory or experience",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "title": {"type": "string", "description": "Title for the memory"},
-                    "content": {"type": "string", "description": "Text content of the memory"},
-                    "tags": {"type": "array", "items": {"type": "string"}, "description": "Tags for categorization"},
-                    "memory_type": {"type": "string", "description": "Type of memory (experience, conversation, reflection)"},
-                    "audio_data": {"type": "string", "description": "Base64 encoded audio data (optional)"},
-                    "photo_data": {"type": "string", "description": "Base64 encoded photo data (optional)"},
-                    "files": {"type": "array", "description": "Array of file objects (optional)"}
-                },
-                "required": ["content"]
-            }
-        ),
-        Tool(
-            name="get_conversation_advice",
-            description="Get personalized conversation advice based on situation and personal patterns",
-            inputSchema={
-                "type": "object", 
-                "properties": {
-                    "situation": {"type": "string", "description": "Description of the conversation situation"},
-                    "context": {"type": "string", "description": "Context (work, family, friends, etc.)"},
-                    "relationship": {"type": "string", "description": "Relationship to the other person"},
-                    "urgency": {"type": "string", "enum": ["low", "medium", "high"], "description": "How urgent this conversation is"}
-                },
-                "required": ["situation"]
-            }
-        ),
-        Tool(
-            name="record_conversation_outcome",
-            description="Record how a conversation went after following advice",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "conversation_id": {"type": "integer", "description": "ID of the original conversation advice"},
-                    "outcome": {"type": "string", "description": "How the conversation went"},
-                    "success_rating": {"type": "integer", "minimum": 1, "maximum": 5, "description": "Success rating 1-5"},
-                    "lessons_learned": {"type": "string", "description": "What was learned from this experience"}
-                },
-                "required": ["conversation_id", "outcome", "success_rating"]
-            }
-        ),
-        Tool(
-            name="analyze_communication_patterns",
-            description="Analyze stored data to identify communication patterns",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "context": {"type": "string", "description": "Context to analyze (work, family, all, etc.)"}
-                }
-            }
-        ),
-        Tool(
-            name="search_memories",
-            description="Search through personal memories",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "query": {"type": "string", "description": "Search query"},
-                    "tags": {"type": "array", "items": {"type": "string"}, "description": "Filter by tags"},
-                    "memory_type": {"type": "string", "description": "Filter by memory type"},
-                    "limit": {"type": "integer", "default": 10, "description": "Maximum results to return"}
-                },
-                "required": ["query"]
-            }
-        ),
-        Tool(
-            name="authenticate_user",
-            description="Authenticate user with master password to access encrypted data",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "master_password": {"type": "string", "description": "User's master password"},
-                    "setup_new": {"type": "boolean", "default": False, "description": "Set up new encryption (first time)"}
-                },
-                "required": ["master_password"]
-            }
-        ),
-        Tool(
-            name="get_security_status",
-            description="Get current security and authentication status",
-            inputSchema={
-                "type": "object",
-                "properties": {}
-            }
-        ),
-        Tool(
-            name="rotate_encryption_keys",
-            description="Rotate encryption keys (recommended monthly)",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "current_password": {"type": "string", "description": "Current master password"},
-                    "new_password": {"type": "string", "description": "New master password (optional)"}
-                },
-                "required": ["current_password"]
-            }
-        )
-    ]
+    return tools.list_tools()
 
-@server.call_tool()
+@server.call_tool(validate_input=False)  # Validated below with the registry's compiled validators
 async def handle_call_tool(name: str, arguments: dict) -> list[types.TextContent]:
     """Handle tool calls"""
-    conn = sqlite3.connect(coach_server.db_path)
+    spec = tools.get(name)
+    if spec is None:
+        return [types.TextContent(
+            type="text",
+            text=f"Unknown tool: {name}"
+        )]
+    
+    # Rejected before any vault is opened, connection made or key touched
+    arguments = arguments or {}
+    problem = spec.validate(arguments)
+    if problem is not None:
+        return [types.TextContent(
+            type="text",
+            text=json.dumps({"error": "Invalid arguments", "message": problem})
+        )]
+    
+    if spec.handler is None:
+        return [types.TextContent(
+            type="text",
+            text=json.dumps({"error": "Not implemented", "message": f"{name} is not available yet"})
+        )]
+    
+    try:
+        vault = get_vault(arguments.get("user_id"))
+    except ValueError as e:
+        return [types.TextContent(
+            type="text",
+            text=json.dumps({"error": "Invalid vault", "message": str(e)})
+        )]
+    
+    # Writes must not race a rotation's key swap (threads block on the key lock)
+    if spec.requires_auth:
+        await vault.keys_ready.wait()
+    
+    if spec.requires_auth and not vault.crypto_manager.authenticated:
+        # An idle unlocked vault may have been evicted to stay within the memory budget
+        if vault_registry.was_unloaded(arguments.get("user_id")):
+            return [types.TextContent(
+                type="text",
+                text=json.dumps({
+                    "error": "Authentication required",
+                    "reason": "vault_unloaded",
+                    "message": "Your vault was unloaded after being idle - authenticate again to continue"
+                })
+            )]
+        return [types.TextContent(
+            type="text",
+            text=json.dumps({
+                "error": "Authentication required",
+                "message": "Please authenticate with your master password first"
+            })
+        )]
+    
+    # Someone else unlocking a vault doesn't let this caller read it
+    if (spec.vault_data and vault.crypto_manager.authenticated
+            and not vault.has_access(current_session(), arguments.get("vault_token"))):
+        return [types.TextContent(
+            type="text",
+            text=json.dumps({
+                "error": "Access denied",
+                "message": "This vault was unlocked by another session - authenticate to use it"
+            })
+        )]
+    
+    conn = sqlite3.connect(vault.db_path)
     cursor = conn.cursor()
     
+    vault.active_calls += 1
     try:
-        if name == "store_memory":
-            # Check if user is authenticated
-            if not coach_server.crypto_manager.authenticated:
-                return [types.TextContent(
-                    type="text",
-                    text=json.dumps({
-                        "error": "Authentication required",
-                        "message": "Please authenticate with your master password first"
-                    })
-                )]
-            
-            # Store a personal memory with encryption
-            title = arguments.get("title", "")
-            content = arguments.get("content", "")
-            tags = arguments.get("tags", [])
-            memory_type = arguments.get("memory_type", "experience")
-            timestamp = datetime.now(timezone.utc).isoformat()
-            
-            # Prepare sensitive data for encryption
-            sensitive_data = {
-                "title": title,
-                "content": content,
-                "tags": tags,
-                "memory_type": memory_type,
-                "timestamp": timestamp,
-                "audio_path": arguments.get("audio_path"),
-                "photo_path": arguments.get("photo_path"),
-                "files_data": arguments.get("files")
-            }
-            
-            # Encrypt the sensitive data
-            try:
-                encrypted_data = coach_server.crypto_manager.encrypt_data(sensitive_data)
-                
-                # Store only encrypted data and non-sensitive metadata
-                cursor.execute('''
-                    INSERT INTO memories (title, content, tags, memory_type, timestamp)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', ("ENCRYPTED", encrypted_data, "ENCRYPTED", "encrypted", timestamp))
-                
-                memory_id = cursor.lastrowid
-                conn.commit()
-                
-                return [types.TextContent(
-                    type="text",
-                    text=f"Memory stored securely with ID: {memory_id}"
-                )]
-                
-            except Exception as e:
-                return [types.TextContent(
-                    type="text",
-                    text=json.dumps({
-                        "error": "Encryption failed",
-                        "message": str(e)
-                    })
-                )]
-            
-        elif name == "get_conversation_advice":
-            # Get personalized conversation advice
-            situation = arguments.get("situation", "")
-            context = arguments.get("context", "general")
-            relationship = arguments.get("relationship", "")
-            
-            # Analyze situation type
-            situation_type = analyze_situation_type(situation)
-            
+        return await spec.handler(vault, arguments, conn, cursor)
+    finally:
+        conn.close()
+        vault.active_calls -= 1
+        vault_registry.refresh(arguments.get("user_id"))
+
+@tools.tool(
+    name="store_memory",
+    description="Store a personal memory or experience",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "user_id": USER_ID_PROPERTY,
+            "vault_token": VAULT_TOKEN_PROPERTY,
+            "title": {"type": "string", "description": "Title for the memory"},
+            "content": {"type": "string", "description": "Text content of the memory"},
+            "tags": {"type": "array", "items": {"type": "string"}, "description": "Tags for categorization"},
+            "memory_type": {"type": "string", "description": "Type of memory (experience, conversation, reflection)"},
+            "audio_data": {"type": "string", "description": "Base64 encoded audio data (optional)"},
+            "photo_data": {"type": "string", "description": "Base64 encoded photo data (optional)"},
+            "files": {"type": "array", "description": "Array of file objects (optional)"},
+            "idempotency_key": {"type": "string", "description": "Client key making retries safe (optional)"}
+        },
+        "required": ["content"]
+    },
+    requires_auth=True
+)
+async def store_memory_tool(vault, arguments, conn, cursor):
+    # Store a personal memory with encryption
+    try:
+        # Retries (client key) and duplicate submissions (content hash)
+        # are answered with the original result
+        keys = idempotency_keys_for(vault, "store_memory", arguments)
+        stored_result = lookup_idempotent_result(vault, cursor, keys)
+        if stored_result is not None:
+            return [types.TextContent(type="text", text=stored_result)]
+        
+        memory_id, sensitive_data = insert_memory(vault, cursor, arguments)
+        log_change(cursor, "memory", memory_id)
+        vault.media_jobs.enqueue(cursor, memory_id, arguments.get("audio_path"), arguments.get("photo_path"))
+        result_text = f"Memory stored securely with ID: {memory_id}"
+        remember_idempotent_result(cursor, keys, result_text)
+        conn.commit()
+        
+        vault.search_index.add(memory_id, sensitive_data)
+        vault.media_jobs.schedule_pending()
+        vault.notify_changed("memory://personal-memories")
+        
+        return [types.TextContent(
+            type="text",
+            text=result_text
+        )]
+    
+    except Exception as e:
+        return [types.TextContent(
+            type="text",
+            text=json.dumps({
+                "error": "Encryption failed",
+                "message": str(e)
+            })
+        )]
+
+@tools.tool(
+    name="get_conversation_advice",
+    description="Get personalized conversation advice based on situation and personal patterns",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "user_id": USER_ID_PROPERTY,
+            "vault_token": VAULT_TOKEN_PROPERTY,
+            "situation": {"type": "string", "description": "Description of the conversation situation"},
+            "context": {"type": "string", "description": "Context (work, family, friends, etc.)"},
+            "relationship": {"type": "string", "description": "Relationship to the other person"},
+            "urgency": {"type": "string", "enum": ["low", "medium", "high"], "description": "How urgent this conversation is"},
+            "idempotency_key": {"type": "string", "description": "Client key making retries safe (optional)"}
+        },
+        "required": ["situation"]
+    }
+)
+async def get_conversation_advice_tool(vault, arguments, conn, cursor):
+    # Get personalized conversation advice
+    keys = idempotency_keys_for(vault, "get_conversation_advice", arguments)
+    stored_result = lookup_idempotent_result(vault, cursor, keys)
+    if stored_result is not None:
+        return [types.TextContent(type="text", text=stored_result)]
+    
+    situation = arguments.get("situation", "")
+    context = arguments.get("context", "general")
+    relationship = arguments.get("relationship", "")
+    
+    # Resubmitted (or near-identical) situations reuse the advice
+    cache_key = vault.advice_cache.fingerprint(situation, context, relationship)
+    cached = vault.advice_cache.get(cache_key)
+    
+    if cached is not None:
+        situation_type = cached["situation_type"]
+        advice = cached["advice"]
+        # The entry echoes whoever generated it - answer with this request's wording
+        advice["situation_analysis"] = dict(advice["situation_analysis"], context=context, situation=situation)
+        for index, (section, fields) in enumerate(ADVICE_SECTIONS):
+            await report_advice_section(index, section, {field: advice[field] for field in fields})
+    else:
+        # Analyze situation type
+        situation_type = analyze_situation_type(situation)
+        
+        def load_history():
             # Get relevant past experiences
             cursor.execute('''
-                SELECT * FROM memories 
+                SELECT * FROM memories
                 WHERE content LIKE ? OR tags LIKE ?
                 ORDER BY created_at DESC LIMIT 5
             ''', (f"%{context}%", f"%{context}%"))
@@ -340,127 +635,826 @@ async def handle_call_tool(name: str, arguments: dict) -> list[types.TextContent
             
             # Get communication patterns for this context
             cursor.execute('''
-                SELECT * FROM communication_patterns 
+                SELECT * FROM communication_patterns
                 WHERE context = ? OR context = 'general'
                 ORDER BY confidence_score DESC LIMIT 10
             ''', (context,))
             
-            patterns = cursor.fetchall()
-            
-            # Generate personalized advice
-            advice = generate_personalized_advice(
-                situation, situation_type, context, relationship, 
-                relevant_memories, patterns
-            )
-            
-            # Store this conversation for learning
-            cursor.execute('''
-                INSERT INTO conversations (situation, situation_type, advice_given, timestamp)
-                VALUES (?, ?, ?, ?)
-            ''', (situation, situation_type, json.dumps(advice), 
-                  datetime.now(timezone.utc).isoformat()))
-            
-            conversation_id = cursor.lastrowid
-            conn.commit()
-            
-            advice["conversation_id"] = conversation_id
-            
-            return [types.TextContent(
-                type="text", 
-                text=json.dumps(advice, indent=2)
-            )]
-            
-        elif name == "search_memories":
-            # Search through memories
-            query = arguments.get("query", "")
-            tags_filter = arguments.get("tags", [])
-            memory_type = arguments.get("memory_type")
-            limit = arguments.get("limit", 10)
-            
-            sql = "SELECT * FROM memories WHERE content LIKE ?"
-            params = [f"%{query}%"]
-            
-            if tags_filter:
-                for tag in tags_filter:
-                    sql += " AND tags LIKE ?"
-                    params.append(f"%{tag}%")
-                    
-            if memory_type:
-                sql += " AND memory_type = ?"
-                params.append(memory_type)
-                
-            sql += " ORDER BY created_at DESC LIMIT ?"
-            params.append(limit)
-            
-            cursor.execute(sql, params)
-            results = cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description]
-            memories = [dict(zip(columns, row)) for row in results]
-            
-            return [types.TextContent(
-                type="text",
-                text=json.dumps(memories, indent=2)
-            )]
-            
-        elif name == "authenticate_user":
-            # Authenticate user with master password
-            master_password = arguments.get("master_password", "")
-            setup_new = arguments.get("setup_new", False)
-            
-            if setup_new:
-                success = coach_server.crypto_manager.setup_first_time(master_password)
-            else:
-                success = coach_server.crypto_manager.authenticate(master_password)
-            
-            if success:
-                return [types.TextContent(
-                    type="text",
-                    text=json.dumps({
-                        "authenticated": True,
-                        "message": "Authentication successful",
-                        "security_status": coach_server.crypto_manager.get_security_status()
-                    })
-                )]
-            else:
-                return [types.TextContent(
-                    type="text",
-                    text=json.dumps({
-                        "authenticated": False,
-                        "message": "Authentication failed - invalid password"
-                    })
-                )]
+            return relevant_memories, cursor.fetchall()
         
-        elif name == "get_security_status":
-            # Get current security status
-            status = coach_server.crypto_manager.get_security_status()
-            return [types.TextContent(
-                type="text",
-                text=json.dumps(status, indent=2)
-            )]
+        # Generate personalized advice, streaming each section as it is ready
+        advice = {}
+        sections = generate_advice_sections(situation, situation_type, context, relationship, load_history)
+        for index, (section, fields) in enumerate(sections):
+            advice.update(fields)
+            await report_advice_section(index, section, fields)
+        vault.advice_cache.put(cache_key, situation_type, advice)
+    
+    # Store this conversation for learning (cache hits too) - the ID
+    # is reserved now, the row is group-committed in the background.
+    # Commit the idempotency purge first: ID blocks are claimed on another connection
+    if conn.in_transaction:
+        conn.commit()
+    conversation_id = await asyncio.to_thread(vault.conversation_log.reserve_id)
+    entry = {
+        "id": conversation_id,
+        "situation": situation,
+        "situation_type": situation_type,
+        "context": context,
+        "advice_given": json.dumps(advice),
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+    
+    advice["conversation_id"] = conversation_id
+    result_text = fast_json.dumps(advice)
+    vault.conversation_log.submit(entry, keys, result_text)
+    
+    return [types.TextContent(
+        type="text",
+        text=result_text
+    )]
+
+@tools.tool(
+    name="record_conversation_outcome",
+    description="Record how a conversation went after following advice",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "user_id": USER_ID_PROPERTY,
+            "vault_token": VAULT_TOKEN_PROPERTY,
+            "conversation_id": {"type": "integer", "description": "ID of the original conversation advice"},
+            "outcome": {"type": "string", "description": "How the conversation went"},
+            "success_rating": {"type": "integer", "minimum": 1, "maximum": 5, "description": "Success rating 1-5"},
+            "lessons_learned": {"type": "string", "description": "What was learned from this experience"}
+        },
+        "required": ["conversation_id", "outcome", "success_rating"]
+    },
+    requires_auth=True
+)
+async def record_conversation_outcome_tool(vault, arguments, conn, cursor):
+    conversation_id = arguments["conversation_id"]
+    rating = arguments["success_rating"]
+    
+    # The advice session may still be queued in the write-behind log
+    if not await asyncio.to_thread(vault.conversation_log.flush):
+        return conversation_log_pending()
+    cursor.execute(
+        "SELECT timestamp, context, success_rating, outcome_at FROM conversations WHERE id = ?",
+        (conversation_id,)
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return [types.TextContent(
+            type="text",
+            text=json.dumps({"error": "Not found", "message": f"No conversation with ID {conversation_id}"})
+        )]
+    
+    timestamp, context, previous_rating, previous_at = row
+    context = context or "general"
+    now = datetime.now(timezone.utc).isoformat()
+    cursor.execute('''
+        UPDATE conversations SET outcome = ?, success_rating = ?, lessons_learned = ?, outcome_at = ?
+        WHERE id = ?
+    ''', (arguments["outcome"], rating, arguments.get("lessons_learned"), now, conversation_id))
+    HistoryRollups.set_outcome(cursor, now, context, rating,
+                               previous=(previous_at or timestamp, context, previous_rating))
+    log_change(cursor, "conversation", conversation_id, op="update")
+    conn.commit()
+    vault.notify_changed("conversation://advice-history")
+    
+    return [types.TextContent(
+        type="text",
+        text=json.dumps({
+            "conversation_id": conversation_id,
+            "success_rating": rating,
+            "context": context,
+            "message": "Outcome recorded"
+        })
+    )]
+
+tools.declare(
+    name="analyze_communication_patterns",
+    description="Analyze stored data to identify communication patterns",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "user_id": USER_ID_PROPERTY,
+            "context": {"type": "string", "description": "Context to analyze (work, family, all, etc.)"}
+        }
+    }
+)
+
+@tools.tool(
+    name="get_history_stats",
+    description="Dashboard stats from the history rollups: totals, daily counts and rating averages",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "user_id": USER_ID_PROPERTY,
+            "vault_token": VAULT_TOKEN_PROPERTY,
+            "days": {"type": "integer", "minimum": 1, "maximum": MAX_STATS_DAYS, "default": 30,
+                     "description": "Days of daily counts to return"}
+        }
+    },
+    requires_auth=True
+)
+async def get_history_stats_tool(vault, arguments, conn, cursor):
+    # Count advice sessions still in the write-behind queue
+    if not await asyncio.to_thread(vault.conversation_log.flush):
+        return conversation_log_pending()
+    return [types.TextContent(
+        type="text",
+        text=fast_json.dumps(vault.rollups.query(cursor, arguments.get("days", 30)))
+    )]
+
+@tools.tool(
+    name="get_media_artifacts",
+    description="Get precomputed waveform peaks and thumbnails for a memory's media",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "user_id": USER_ID_PROPERTY,
+            "vault_token": VAULT_TOKEN_PROPERTY,
+            "memory_id": {"type": "integer", "description": "Memory the media belongs to"}
+        },
+        "required": ["memory_id"]
+    },
+    requires_auth=True
+)
+async def get_media_artifacts_tool(vault, arguments, conn, cursor):
+    return [types.TextContent(
+        type="text",
+        text=json.dumps(vault.media_jobs.get_artifacts(arguments["memory_id"]))
+    )]
+
+@tools.tool(
+    name="read_audio_peaks",
+    description="Read a byte range of a recording's multi-resolution waveform peaks",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "user_id": USER_ID_PROPERTY,
+            "vault_token": VAULT_TOKEN_PROPERTY,
+            "memory_id": {"type": "integer", "description": "Memory the recording belongs to"},
+            "start": {"type": "integer", "minimum": 0, "default": 0, "description": "First payload byte"},
+            "length": {"type": "integer", "minimum": 0, "description": "Bytes to read (default: to the end)"}
+        },
+        "required": ["memory_id"]
+    },
+    requires_auth=True
+)
+async def read_audio_peaks_tool(vault, arguments, conn, cursor):
+    peaks = vault.media_jobs.open_peaks(arguments["memory_id"])
+    if peaks is None:
+        return [types.TextContent(
+            type="text",
+            text=json.dumps({
+                "error": "Not found",
+                "message": "No waveform peaks for this memory"
+            })
+        )]
+    
+    start = arguments.get("start", 0)
+    length = min(arguments.get("length", MAX_PEAKS_READ_BYTES), MAX_PEAKS_READ_BYTES)
+    data = peaks.read(start, length)
+    return [types.TextContent(
+        type="text",
+        text=json.dumps({
+            "start": min(start, peaks.header["length"]),
+            "total": peaks.header["length"],
+            "levels": peaks.header["levels"],
+            "data": base64.b64encode(data).decode()
+        })
+    )]
+
+@tools.tool(
+    name="search_memories",
+    description="Search through personal memories",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "user_id": USER_ID_PROPERTY,
+            "vault_token": VAULT_TOKEN_PROPERTY,
+            "query": {"type": "string", "description": "Search query"},
+            "tags": {"type": "array", "items": {"type": "string"}, "description": "Filter by tags"},
+            "memory_type": {"type": "string", "description": "Filter by memory type"},
+            "limit": {"type": "integer", "default": 10, "description": "Maximum results to return"}
+        },
+        "required": ["query"]
+    }
+)
+async def search_memories_tool(vault, arguments, conn, cursor):
+    # Search through memories
+    query = arguments.get("query", "")
+    tags_filter = arguments.get("tags", [])
+    memory_type = arguments.get("memory_type")
+    limit = arguments.get("limit", 10)
+    
+    # Ranked full-text search over decrypted content when unlocked
+    if vault.crypto_manager.authenticated and vault.search_index.is_open:
+        memories = vault.search_index.search(query, tags_filter, memory_type, limit)
+        return [types.TextContent(
+            type="text",
+            text=fast_json.dumps(memories)
+        )]
+    
+    sql = "SELECT * FROM memories WHERE content LIKE ?"
+    params = [f"%{query}%"]
+    
+    if tags_filter:
+        for tag in tags_filter:
+            sql += " AND tags LIKE ?"
+            params.append(f"%{tag}%")
+    
+    if memory_type:
+        sql += " AND memory_type = ?"
+        params.append(memory_type)
+    
+    sql += " ORDER BY created_at DESC LIMIT ?"
+    params.append(limit)
+    
+    cursor.execute(sql, params)
+    
+    return [types.TextContent(
+        type="text",
+        text=fast_json.rows_to_json(cursor)
+    )]
+
+@tools.tool(
+    name="sync_changes",
+    description="Exchange changes with a device since its last sync cursor",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "user_id": USER_ID_PROPERTY,
+            "vault_token": VAULT_TOKEN_PROPERTY,
+            "device_id": {"type": "string", "description": "Stable ID of the syncing device"},
+            "cursor": {"type": "integer", "default": 0, "description": "Last change sequence number the device has seen"},
+            "changes": {
+                "type": "array",
+                "description": "Local changes to apply ({idempotency_key, type, data})",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "idempotency_key": {"type": "string"},
+                        "type": {"type": "string", "enum": ["memory", "conversation"]},
+                        "data": {"type": "object"}
+                    },
+                    "required": ["idempotency_key", "type", "data"]
+                }
+            },
+            "limit": {"type": "integer", "default": 200, "description": "Maximum changes to return"}
+        },
+        "required": ["device_id"]
+    },
+    requires_auth=True
+)
+async def sync_changes_tool(vault, arguments, conn, cursor):
+    device_id = arguments.get("device_id", "")
+    sync_cursor = arguments.get("cursor", 0)
+    limit = arguments.get("limit", 200)
+    
+    # The pull must see advice sessions still in the write-behind queue - wait
+    # before pushing so a timeout leaves nothing half done
+    if not await asyncio.to_thread(vault.conversation_log.flush):
+        return conversation_log_pending()
+    
+    # Conversation IDs are claimed before the push transaction opens (on
+    # another connection, which would wait on it) - duplicates leave gaps
+    changes = arguments.get("changes", [])
+    conversation_ids = iter(await asyncio.to_thread(
+        vault.conversation_log.reserve_ids, sum(1 for change in changes if change["type"] == "conversation")
+    ))
+    
+    # Push: apply each change once, keyed by its idempotency key
+    applied = []
+    new_memories = []
+    changed_resources = set()
+    for change in changes:
+        key = change["idempotency_key"]
+        cursor.execute(
+            "SELECT entity_id FROM change_log WHERE idempotency_key = ?", (key,)
+        )
+        existing = cursor.fetchone()
+        if existing:
+            applied.append({"idempotency_key": key, "id": existing[0], "duplicate": True})
+            continue
         
-        elif name == "rotate_encryption_keys":
-            # Rotate encryption keys
-            current_password = arguments.get("current_password", "")
-            new_password = arguments.get("new_password")
-            
-            success = coach_server.crypto_manager.rotate_keys(current_password, new_password)
-            
-            return [types.TextContent(
-                type="text",
-                text=json.dumps({
-                    "success": success,
-                    "message": "Key rotation completed" if success else "Key rotation failed"
-                })
-            )]
-            
+        data = change["data"]
+        if change["type"] == "memory":
+            data = dict(data, content=data.get("content") or data.get("text", ""))
+            entity_id, record = insert_memory(vault, cursor, data)
+            new_memories.append((entity_id, record))
         else:
-            return [types.TextContent(
-                type="text",
-                text=f"Unknown tool: {name}"
-            )]
-            
-    finally:
-        conn.close()
+            entity_id = insert_conversation(cursor, data, next(conversation_ids))
+        
+        log_change(cursor, change["type"], entity_id,
+                   idempotency_key=key, device_id=device_id)
+        applied.append({"idempotency_key": key, "id": entity_id, "duplicate": False})
+        changed_resources.add(RESOURCE_FOR_ENTITY[change["type"]])
+    
+    conn.commit()
+    for memory_id, record in new_memories:
+        vault.search_index.add(memory_id, record)
+    vault.notify_changed(*changed_resources)
+    
+    # Pull: everything after the device's cursor it didn't push itself
+    cursor.execute('''
+        SELECT seq, entity, entity_id, op, device_id FROM change_log
+        WHERE seq > ? ORDER BY seq LIMIT ?
+    ''', (sync_cursor, limit))
+    log_rows = cursor.fetchall()
+    
+    changes = []
+    for seq, entity, entity_id, op, origin in log_rows:
+        if origin == device_id:
+            continue
+        changes.append({
+            "seq": seq,
+            "type": entity,
+            "id": entity_id,
+            "op": op,
+            "data": read_change(vault, cursor, entity, entity_id)
+        })
+    
+    return [types.TextContent(
+        type="text",
+        text=fast_json.dumps({
+            "cursor": log_rows[-1][0] if log_rows else sync_cursor,
+            "has_more": len(log_rows) == limit,
+            "applied": applied,
+            "changes": changes
+        })
+    )]
+
+@tools.tool(
+    name="archive_old_records",
+    description="Move old memories and advice sessions to the encrypted archive and reclaim space",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "user_id": USER_ID_PROPERTY,
+            "vault_token": VAULT_TOKEN_PROPERTY,
+            "older_than_days": {"type": "integer", "minimum": 1, "default": 180, "description": "Archive records older than this many days"}
+        }
+    },
+    requires_auth=True
+)
+async def archive_old_records_tool(vault, arguments, conn, cursor):
+    conn.close()  # The archive job uses its own connection
+    if not await asyncio.to_thread(vault.conversation_log.flush):
+        return conversation_log_pending()
+    # Sealing rows and reclaiming pages take a while - keep the loop serving other calls
+    stats = await asyncio.to_thread(
+        vault.archive.archive_older_than, vault.db_path, arguments.get("older_than_days", 180)
+    )
+    vault.advice_cache.invalidate()
+    vault.notify_changed("memory://personal-memories", "conversation://advice-history")
+    return [types.TextContent(
+        type="text",
+        text=json.dumps(stats)
+    )]
+
+@tools.tool(
+    name="import_local_data",
+    description="Import a browser-mode export (JSON or NDJSON) saved by the bridge, resuming if interrupted",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "user_id": USER_ID_PROPERTY,
+            "vault_token": VAULT_TOKEN_PROPERTY,
+            "path": {"type": "string", "description": "Export saved under uploads/imports"},
+            "import_id": {"type": "string", "minLength": 1, "description": "Stable ID of this export (e.g. its SHA-256) for resuming"},
+            "device_id": {"type": "string", "description": "Importing device, so it doesn't pull the records back"}
+        },
+        "required": ["path", "import_id"]
+    },
+    requires_auth=True
+)
+async def import_local_data_tool(vault, arguments, conn, cursor):
+    conn.close()  # The importer uses its own connection
+    try:
+        path = resolve_import(arguments["path"])
+    except ValueError as e:
+        return [types.TextContent(
+            type="text",
+            text=json.dumps({"error": "Invalid export", "message": str(e)})
+        )]
+    
+    device_id = arguments.get("device_id")
+    loop = asyncio.get_running_loop()
+    report = import_progress_reporter()
+    
+    def prepare(entity, record):
+        # Runs on the import worker pool
+        record = imported_record(entity, record)
+        if record is None:
+            return None
+        if entity == "conversation":
+            # Reserved here, outside the batch transaction the insert runs in
+            return record, vault.conversation_log.reserve_id()
+        sensitive_data = memory_record(record)
+        return sensitive_data, vault.crypto_manager.encrypt_data(sensitive_data)
+    
+    def insert(cursor, entity, payload):
+        if entity == "memory":
+            entity_id = insert_encrypted_memory(vault, cursor, *payload)
+        else:
+            entity_id = insert_conversation(cursor, *payload)
+        log_change(cursor, entity, entity_id, device_id=device_id)
+        return entity_id
+    
+    def on_batch(progress, inserted):
+        # Import thread: the search index lives on the loop thread
+        memories = [(memory_id, payload[0]) for entity, memory_id, payload in inserted if entity == "memory"]
+        loop.call_soon_threadsafe(index_imported_memories, vault, memories)
+        vault.notify_changed(*{RESOURCE_FOR_ENTITY[entity] for entity, _, _ in inserted})
+        report(progress)
+    
+    # Create any missing data key here, not concurrently on the pool
+    vault.crypto_manager.encrypt_bytes(b"")
+    vault.crypto_manager.fingerprint(b"")
+    importer = BulkImporter(vault.db_path, prepare, insert)
+    try:
+        summary = await asyncio.to_thread(importer.run, path, arguments["import_id"], on_batch)
+    except ValueError as e:
+        return [types.TextContent(
+            type="text",
+            text=json.dumps({"error": "Invalid export", "message": str(e)})
+        )]
+    
+    if vault.search_index.is_open:
+        vault.search_index.save()
+    return [types.TextContent(
+        type="text",
+        text=json.dumps(summary)
+    )]
+
+@tools.tool(
+    name="export_vault",
+    description="Export every memory and conversation as a passphrase-encrypted archive, a few chunks per call",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "user_id": USER_ID_PROPERTY,
+            "vault_token": VAULT_TOKEN_PROPERTY,
+            "export_id": {"type": "string", "description": "Export to continue (omit to start one)"},
+            "passphrase": {"type": "string", "minLength": 8, "description": "Protects the export (needed to start)"},
+            "format": {"type": "string", "enum": ["ndjson", "tar"], "default": "ndjson", "description": "NDJSON records, or a tar of NDJSON parts plus media"},
+            "include_media": {"type": "boolean", "default": True, "description": "Add uploaded audio/photos to tar exports"},
+            "max_chunks": {"type": "integer", "minimum": 1, "maximum": 64, "default": 8, "description": "Lines to return from this call"},
+            "cancel": {"type": "boolean", "default": False, "description": "Abandon the export (e.g. the download was closed)"}
+        }
+    },
+    requires_auth=True
+)
+async def export_vault_tool(vault, arguments, conn, cursor):
+    export_id = arguments.get("export_id")
+    if export_id is not None and arguments.get("cancel"):
+        vault.exports.cancel(export_id)
+        return [types.TextContent(
+            type="text",
+            text=json.dumps({"export_id": export_id, "cancelled": True})
+        )]
+    
+    try:
+        if export_id is None:
+            if "passphrase" not in arguments:
+                raise ValueError("passphrase is required to start an export")
+            # Include advice sessions still being written
+            if not await asyncio.to_thread(vault.conversation_log.flush):
+                return conversation_log_pending()
+            export_id = vault.exports.start(export_lines(
+                vault.db_path, vault.crypto_manager, vault.archive, arguments["passphrase"],
+                arguments.get("format", "ndjson"), arguments.get("include_media", True)
+            ))
+        # Decrypting and re-encrypting a batch of chunks runs off the event loop
+        lines, done = await asyncio.to_thread(vault.exports.pull, export_id, arguments.get("max_chunks", 8))
+    except ValueError as e:
+        return [types.TextContent(
+            type="text",
+            text=json.dumps({"error": "Export failed", "message": str(e)})
+        )]
+    
+    return [types.TextContent(
+        type="text",
+        text=fast_json.dumps({"export_id": export_id, "lines": lines, "done": done})
+    )]
+
+@tools.tool(
+    name="authenticate_user",
+    description="Authenticate user with master password to access encrypted data",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "user_id": USER_ID_PROPERTY,
+            "master_password": {"type": "string", "description": "User's master password"},
+            "setup_new": {"type": "boolean", "default": False, "description": "Set up new encryption (first time)"},
+            "bind_session": {"type": "boolean", "default": True,
+                             "description": "Grant this MCP session access (false when it is shared, e.g. by the web bridge - pass the returned vault_token instead)"},
+            "vault_token": VAULT_TOKEN_PROPERTY
+        },
+        "required": ["master_password"]
+    },
+    vault_data=False
+)
+async def authenticate_user_tool(vault, arguments, conn, cursor):
+    # Authenticate user with master password
+    master_password = arguments.get("master_password", "")
+    setup_new = arguments.get("setup_new", False)
+    session = current_session()
+    
+    # Re-keying an existing vault would make its data unreadable - only its owner may
+    if (setup_new and vault.crypto_manager.master_key_file.exists()
+            and not vault.has_access(session, arguments.get("vault_token"))):
+        return [types.TextContent(
+            type="text",
+            text=json.dumps({
+                "authenticated": False,
+                "error": "Access denied",
+                "message": "Encryption is already set up - authenticate with the current password first"
+            })
+        )]
+    
+    # PBKDF2 (and RSA generation) run in a thread so other requests keep flowing
+    async with vault.kdf_lock:
+        if setup_new:
+            success = await asyncio.to_thread(vault.crypto_manager.setup_first_time, master_password)
+        else:
+            success = await asyncio.to_thread(vault.crypto_manager.authenticate, master_password)
+    
+    if success:
+        vault.open_search_index()
+        vault.backfill_rollups()
+        vault.media_jobs.schedule_pending()  # Resume jobs left from a previous run
+        vault_token = vault.grant_access(session, arguments.get("bind_session", True))
+        return [types.TextContent(
+            type="text",
+            text=json.dumps({
+                "authenticated": True,
+                "message": "Authentication successful",
+                "vault_token": vault_token,
+                "security_status": vault.crypto_manager.get_security_status()
+            })
+        )]
+    else:
+        return [types.TextContent(
+            type="text",
+            text=json.dumps({
+                "authenticated": False,
+                "message": "Authentication failed - invalid password"
+            })
+        )]
+
+@tools.tool(
+    name="get_security_status",
+    description="Get current security and authentication status",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "user_id": USER_ID_PROPERTY
+        }
+    },
+    vault_data=False
+)
+async def get_security_status_tool(vault, arguments, conn, cursor):
+    # Get current security status
+    status = vault.crypto_manager.get_security_status()
+    return [types.TextContent(
+        type="text",
+        text=fast_json.dumps(status)
+    )]
+
+@tools.tool(
+    name="rotate_encryption_keys",
+    description="Rotate encryption keys (recommended monthly)",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "user_id": USER_ID_PROPERTY,
+            "current_password": {"type": "string", "description": "Current master password"},
+            "new_password": {"type": "string", "description": "New master password (optional)"}
+        },
+        "required": ["current_password"]
+    },
+    vault_data=False  # Checks the current password itself
+)
+async def rotate_encryption_keys_tool(vault, arguments, conn, cursor):
+    # Rotate encryption keys
+    current_password = arguments.get("current_password", "")
+    new_password = arguments.get("new_password")
+    
+    async with vault.kdf_lock:
+        vault.keys_ready.clear()
+        try:
+            success = await asyncio.to_thread(vault.crypto_manager.rotate_keys, current_password, new_password)
+        finally:
+            vault.keys_ready.set()
+    
+    return [types.TextContent(
+        type="text",
+        text=json.dumps({
+            "success": success,
+            "message": "Key rotation completed" if success else "Key rotation failed"
+        })
+    )]
+
+def idempotency_keys_for(vault: ConversationCoachServer, tool: str, arguments: dict) -> list:
+    """Keys under which a write's result is remembered"""
+    keys = []
+    if arguments.get("idempotency_key"):
+        keys.append(f"{tool}:{arguments['idempotency_key']}")
+    
+    if tool == "store_memory":
+        # Same memory submitted twice (e.g. by two retry paths) - keyed hash
+        # so equal content is detectable without storing it in plaintext
+        content = json.dumps([
+            arguments.get(field) for field in
+            ("title", "content", "tags", "memory_type", "audio_path", "photo_path", "files")
+        ], sort_keys=True, default=str)
+        keys.append(f"{tool}:content:{vault.crypto_manager.fingerprint(content.encode())}")
+    
+    return keys
+
+def lookup_idempotent_result(vault: ConversationCoachServer, cursor, keys: list) -> Optional[str]:
+    """Return the stored result for any unexpired key (purging old keys)"""
+    pending = vault.conversation_log.pending_result(keys)
+    if pending is not None:
+        return pending
+    
+    now = time.time()
+    if now - vault.last_idempotency_purge > IDEMPOTENCY_PURGE_INTERVAL:
+        cursor.execute("DELETE FROM idempotency_keys WHERE expires_at < ?", (now,))
+        vault.last_idempotency_purge = now
+    
+    for key in keys:
+        cursor.execute(
+            "SELECT result FROM idempotency_keys WHERE key = ? AND expires_at >= ?", (key, now)
+        )
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+    return None
+
+def remember_idempotent_result(cursor, keys: list, result: str):
+    """Store a write's result in the caller's transaction"""
+    expires_at = time.time() + IDEMPOTENCY_TTL_SECONDS
+    cursor.executemany(
+        "INSERT OR REPLACE INTO idempotency_keys (key, result, expires_at) VALUES (?, ?, ?)",
+        [(key, result, expires_at) for key in keys]
+    )
+
+def insert_memory(vault: ConversationCoachServer, cursor, arguments: dict) -> tuple:
+    """Encrypt a memory and insert it; returns (memory_id, plaintext record)"""
+    sensitive_data = memory_record(arguments)
+    memory_id = insert_encrypted_memory(vault, cursor, sensitive_data,
+                                        vault.crypto_manager.encrypt_data(sensitive_data))
+    
+    # New memories can change advice for any situation
+    vault.advice_cache.invalidate()
+    return memory_id, sensitive_data
+
+def memory_record(arguments: dict) -> dict:
+    """The sensitive fields of a memory, as they are encrypted"""
+    return {
+        "title": arguments.get("title", ""),
+        "content": arguments.get("content", ""),
+        "tags": arguments.get("tags", []),
+        "memory_type": arguments.get("memory_type", "experience"),
+        "timestamp": arguments.get("timestamp") or datetime.now(timezone.utc).isoformat(),
+        "audio_path": arguments.get("audio_path"),
+        "photo_path": arguments.get("photo_path"),
+        "files_data": arguments.get("files")
+    }
+
+def insert_encrypted_memory(vault: ConversationCoachServer, cursor, sensitive_data: dict,
+                            encrypted_data: str) -> int:
+    """Insert an already encrypted memory and count it in the rollups"""
+    timestamp = sensitive_data["timestamp"]
+    
+    # Store only encrypted data and non-sensitive metadata
+    cursor.execute('''
+        INSERT INTO memories (title, content, tags, memory_type, timestamp)
+        VALUES (?, ?, ?, ?, ?)
+    ''', ("ENCRYPTED", encrypted_data, "ENCRYPTED", "encrypted", timestamp))
+    memory_id = cursor.lastrowid
+    vault.rollups.add_memory(cursor, timestamp, sensitive_data["memory_type"])
+    return memory_id
+
+def insert_conversation(cursor, data: dict, conversation_id: int) -> int:
+    """Insert a conversation advice session under a reserved ID"""
+    situation = data.get("situation", "")
+    situation_type = data.get("situation_type") or analyze_situation_type(situation)
+    advice = data.get("advice_given", data.get("advice", {}))
+    timestamp = data.get("timestamp") or datetime.now(timezone.utc).isoformat()
+    cursor.execute('''
+        INSERT INTO conversations (id, situation, situation_type, advice_given, timestamp, context)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (conversation_id, situation, situation_type,
+          advice if isinstance(advice, str) else json.dumps(advice),
+          timestamp, data.get("context")))
+    HistoryRollups.add_conversation(cursor, timestamp, situation_type)
+    return conversation_id
+
+def write_logged_conversation(cursor, entry: dict):
+    """Write one queued advice session (runs on the write-behind thread)"""
+    insert_conversation(cursor, entry, entry["id"])
+    log_change(cursor, "conversation", entry["id"])
+    remember_idempotent_result(cursor, entry["idempotency_keys"], entry["result"])
+
+def log_change(cursor, entity: str, entity_id: int, op: str = "insert",
+               idempotency_key: Optional[str] = None, device_id: Optional[str] = None) -> int:
+    """Append to the change log in the caller's transaction"""
+    cursor.execute('''
+        INSERT INTO change_log (entity, entity_id, op, device_id, idempotency_key)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (entity, entity_id, op, device_id, idempotency_key))
+    return cursor.lastrowid
+
+def read_change(vault: ConversationCoachServer, cursor, entity: str, entity_id: int) -> Optional[dict]:
+    """Load the current (decrypted) state of a changed entity"""
+    if entity == "memory":
+        cursor.execute("SELECT title, content, tags, memory_type, timestamp FROM memories WHERE id = ?", (entity_id,))
+        row = cursor.fetchone()
+        if row is None:
+            archived = vault.archive.fetch(vault.db_path, entity, entity_id)
+            row = archived and tuple(archived[key] for key in ("title", "content", "tags", "memory_type", "timestamp"))
+        if row is None:
+            return None
+        if row[0] == "ENCRYPTED":
+            try:
+                return vault.crypto_manager.decrypt_data(row[1])
+            except Exception:
+                return None
+        return dict(zip(["title", "content", "tags", "memory_type", "timestamp"], row))
+    
+    cursor.execute(f"SELECT {', '.join(CONVERSATION_SYNC_FIELDS)} FROM conversations WHERE id = ?", (entity_id,))
+    row = cursor.fetchone()
+    if row is None:
+        archived = vault.archive.fetch(vault.db_path, entity, entity_id)
+        row = archived and tuple(archived.get(key) for key in CONVERSATION_SYNC_FIELDS)
+    if row is None:
+        return None
+    result = dict(zip(CONVERSATION_SYNC_FIELDS, row))
+    try:
+        result["advice_given"] = json.loads(result["advice_given"])
+    except (TypeError, ValueError):
+        pass
+    return result
+
+# Advice sections in streaming order, with the fields each one fills
+ADVICE_SECTIONS = [
+    ("situation_analysis", ["situation_analysis"]),
+    ("strategy", ["strategy"]),
+    ("key_points", ["key_points", "pitfalls", "helpful_phrases"]),
+    ("personal_insights", ["personal_insights", "confidence_boosters"])
+]
+
+# Base advice templates by situation type
+ADVICE_TEMPLATES = {
+    'professional': {
+        'strategy': "Approach this professionally with clear objectives and supporting evidence.",
+        'key_points': [
+            "Prepare specific examples of your contributions",
+            "Research market rates or company policies",
+            "Choose the right time and setting",
+            "Be confident but respectful"
+        ],
+        'pitfalls': [
+            "Don't make it personal or emotional",
+            "Avoid ultimatums unless you're prepared to follow through",
+            "Don't compare yourself negatively to others"
+        ]
+    },
+    'romantic': {
+        'strategy': "Focus on understanding each other's perspectives and finding common ground.",
+        'key_points': [
+            "Use 'I' statements to express your feelings",
+            "Listen actively to their concerns",
+            "Find a calm, private moment to talk",
+            "Focus on solutions, not blame"
+        ],
+        'pitfalls': [
+            "Don't bring up past grievances",
+            "Avoid accusatory language",
+            "Don't have this conversation when emotions are high"
+        ]
+    },
+    'apology': {
+        'strategy': "Take full responsibility and focus on making things right.",
+        'key_points': [
+            "Acknowledge what you did wrong specifically",
+            "Express genuine remorse",
+            "Explain how you'll prevent it in the future",
+            "Ask what you can do to make it right"
+        ],
+        'pitfalls': [
+            "Don't make excuses or justify your actions",
+            "Don't say 'I'm sorry you feel that way'",
+            "Don't expect immediate forgiveness"
+        ]
+    }
+}
 
 def analyze_situation_type(situation: str) -> str:
     """Analyze the type of conversation situation"""
@@ -484,72 +1478,98 @@ def analyze_situation_type(situation: str) -> str:
 def generate_personalized_advice(situation: str, situation_type: str, context: str, 
                                relationship: str, memories: list, patterns: list) -> dict:
     """Generate personalized conversation advice"""
+    personalized_advice = {}
+    for _, fields in generate_advice_sections(situation, situation_type, context, relationship,
+                                              lambda: (memories, patterns)):
+        personalized_advice.update(fields)
     
-    # Base advice templates by situation type
-    advice_templates = {
-        'professional': {
-            'strategy': "Approach this professionally with clear objectives and supporting evidence.",
-            'key_points': [
-                "Prepare specific examples of your contributions",
-                "Research market rates or company policies",
-                "Choose the right time and setting",
-                "Be confident but respectful"
-            ],
-            'pitfalls': [
-                "Don't make it personal or emotional",
-                "Avoid ultimatums unless you're prepared to follow through",
-                "Don't compare yourself negatively to others"
-            ]
-        },
-        'romantic': {
-            'strategy': "Focus on understanding each other's perspectives and finding common ground.",
-            'key_points': [
-                "Use 'I' statements to express your feelings",
-                "Listen actively to their concerns",
-                "Find a calm, private moment to talk",
-                "Focus on solutions, not blame"
-            ],
-            'pitfalls': [
-                "Don't bring up past grievances",
-                "Avoid accusatory language",
-                "Don't have this conversation when emotions are high"
-            ]
-        },
-        'apology': {
-            'strategy': "Take full responsibility and focus on making things right.",
-            'key_points': [
-                "Acknowledge what you did wrong specifically",
-                "Express genuine remorse",
-                "Explain how you'll prevent it in the future",
-                "Ask what you can do to make it right"
-            ],
-            'pitfalls': [
-                "Don't make excuses or justify your actions",
-                "Don't say 'I'm sorry you feel that way'",
-                "Don't expect immediate forgiveness"
-            ]
-        }
-    }
-    
+    return personalized_advice
+
+def generate_advice_sections(situation: str, situation_type: str, context: str,
+                             relationship: str, load_history):
+    """
+    Yield (section, fields) in ADVICE_SECTIONS order - the template
+    sections come first, load_history() (the memory and pattern queries)
+    only runs for the personal section
+    """
     # Get base template
-    base_advice = advice_templates.get(situation_type, advice_templates['professional'])
+    base_advice = ADVICE_TEMPLATES.get(situation_type, ADVICE_TEMPLATES['professional'])
     
-    # Personalize based on patterns and memories
-    personalized_advice = {
+    yield "situation_analysis", {
         'situation_analysis': {
             'type': situation_type,
             'context': context,
             'situation': situation
-        },
-        'strategy': base_advice['strategy'],
+        }
+    }
+    yield "strategy", {'strategy': base_advice['strategy']}
+    yield "key_points", {
         'key_points': base_advice['key_points'],
         'pitfalls': base_advice['pitfalls'],
-        'helpful_phrases': generate_helpful_phrases(situation_type),
+        'helpful_phrases': generate_helpful_phrases(situation_type)
+    }
+    
+    # Personalize based on patterns and memories
+    memories, patterns = load_history()
+    yield "personal_insights", {
         'personal_insights': generate_personal_insights(memories, patterns, situation_type),
         'confidence_boosters': generate_confidence_boosters(patterns)
     }
+
+async def report_advice_section(index: int, section: str, fields: dict):
+    """Send a finished advice section as an MCP progress notification (if requested)"""
+    try:
+        ctx = server.request_context
+    except LookupError:
+        return  # Called directly, not through an MCP request
     
-    return personalized_advice
+    progress_token = ctx.meta.progressToken if ctx.meta else None
+    if progress_token is None:
+        return
+    
+    await ctx.session.send_progress_notification(
+        progress_token, index + 1, len(ADVICE_SECTIONS),
+        message=json.dumps({"section": section, "data": fields})
+    )
+
+def imported_record(entity: str, record: dict) -> Optional[dict]:
+    """Map a browser-mode record onto the fields the server stores (None to skip it)"""
+    if record.get("encrypted") and "encrypted_data" in record:
+        return None  # Encrypted with the browser's own key - export it decrypted
+    timestamp = record.get("timestamp") or record.get("created_at")
+    if entity == "memory":
+        content = record.get("content") or record.get("text")
+        if not content:
+            return None
+        return dict(record, content=content, timestamp=timestamp,
+                    files=record.get("files") or record.get("files_data"))
+    if not record.get("situation"):
+        return None
+    return dict(record, timestamp=timestamp)
+
+def index_imported_memories(vault: ConversationCoachServer, memories: list):
+    """Add an imported batch to the search index (runs on the loop thread)"""
+    vault.search_index.add_many(memories)
+    vault.advice_cache.invalidate()
+
+def import_progress_reporter():
+    """report(progress) for an import thread: MCP progress notifications, if requested"""
+    try:
+        ctx = server.request_context
+    except LookupError:
+        return lambda progress: None  # Called directly, not through an MCP request
+    
+    progress_token = ctx.meta.progressToken if ctx.meta else None
+    if progress_token is None:
+        return lambda progress: None
+    
+    loop = asyncio.get_running_loop()
+    
+    def report(progress):
+        asyncio.run_coroutine_threadsafe(ctx.session.send_progress_notification(
+            progress_token, progress["records"], message=json.dumps(progress)
+        ), loop)
+    return report
 
 def generate_helpful_phrases(situation_type: str) -> list:
     """Generate helpful phrases based on situation type"""
@@ -617,21 +1637,84 @@ def generate_confidence_boosters(patterns: list) -> list:
     
     return boosters[:3]  # Return top 3
 
+def initialization_options() -> InitializationOptions:
+    """What the server announces in initialize, whatever the transport"""
+    capabilities = server.get_capabilities(
+        notification_options=NotificationOptions(),
+        experimental_capabilities={},
+    )
+    # The SDK always reports subscribe=False; we handle resources/subscribe
+    capabilities.resources.subscribe = True
+    
+    return InitializationOptions(
+        server_name="conversation-coach",
+        server_version="0.1.0",
+        capabilities=capabilities,
+    )
+
+async def run_session(read_stream, write_stream):
+    """One client session; vaults and caches outlive it"""
+    await server.run(read_stream, write_stream, initialization_options())
+
+def shutdown_server():
+    """Persist search snapshots and drop keys from memory"""
+    vault_registry.close_all()
+    shutdown_media_pool()
+
+async def serve(read_stream, write_stream):
+    """
+    Run the only session over a pair of message streams: stdin/stdout in
+    main(), or in-memory streams when the bridge embeds the server
+    """
+    try:
+        await run_session(read_stream, write_stream)
+    finally:
+        shutdown_server()
+
+async def serve_socket(path, drain_seconds: float):
+    """Daemon mode: concurrent sessions share this process's vaults and caches"""
+    global daemon
+    import signal
+    import anyio
+    from socket_transport import SocketDaemon
+    
+    daemon = SocketDaemon(path, run_session, drain_seconds)
+    
+    async def drain_on_signal():
+        with anyio.open_signal_receiver(signal.SIGTERM, signal.SIGINT) as signals:
+            async for _ in signals:
+                daemon.stop()
+                return
+    
+    try:
+        async with anyio.create_task_group() as task_group:
+            task_group.start_soon(drain_on_signal)
+            await daemon.serve_forever()
+            task_group.cancel_scope.cancel()
+    finally:
+        shutdown_server()
+
 async def main():
+    import argparse
+    from socket_transport import DEFAULT_SOCKET_PATH, DRAIN_SECONDS
+    
+    parser = argparse.ArgumentParser(description="Conversation Coach MCP server")
+    parser.add_argument("--socket", nargs="?", const=str(DEFAULT_SOCKET_PATH), metavar="PATH",
+                        help=f"Run as a shared daemon on a Unix socket (default {DEFAULT_SOCKET_PATH})")
+    parser.add_argument("--drain-seconds", type=float, default=DRAIN_SECONDS,
+                        help="On SIGTERM/SIGINT, how long in-flight requests get to finish")
+    args = parser.parse_args()
+    
+    if args.socket:
+        await serve_socket(args.socket, args.drain_seconds)
+        return
+    
+    # Transport is only needed when running as a server, not on import
+    from mcp.server.stdio import stdio_server
+    
     # Run the server using stdin/stdout streams
     async with stdio_server() as (read_stream, write_stream):
-        await server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="conversation-coach",
-                server_version="0.1.0",
-                capabilities=server.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={},
-                ),
-            ),
-        )
+        await serve(read_stream, write_stream)
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Media Processing Jobs
+Post-processes uploaded audio and photos off the request path: waveform
+peaks and duration (NumPy over memory-mapped WAV data) and thumbnails
+(Pillow) run in a process pool; results are stored encrypted per memory
+"""
+
+import asyncio
+import base64
+import io
+import json
+import multiprocessing
+import os
+import sqlite3
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from audio_peaks import PeaksFile, compute_peak_levels, peaks_path_for, write_peaks_file
+
+# Only files saved by the bridge are ever processed
+UPLOADS_DIR = Path("./uploads")
+
+WAVEFORM_BINS = 800
+THUMBNAIL_MAX_SIZE = 256
+THUMBNAIL_QUALITY = 80
+
+# Frames per chunk while scanning a recording (bounds worker memory)
+SCAN_CHUNK_FRAMES = 1 << 20
+
+MAX_JOB_ATTEMPTS = 3
+
+# WAVE format tags
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+_media_pool: Optional[ProcessPoolExecutor] = None
+
+
+class UnsupportedMedia(Exception):
+    """The file can't be processed (wrong format) - retrying won't help"""
+
+
+def get_media_pool() -> ProcessPoolExecutor:
+    """Process pool shared by all vaults, started on first use"""
+    global _media_pool
+    if _media_pool is None:
+        workers = int(os.environ.get("COACH_MEDIA_WORKERS", min(2, os.cpu_count() or 1)))
+        # spawn: the server process has threads (write-behind), fork isn't safe
+        _media_pool = ProcessPoolExecutor(max_workers=workers,
+                                          mp_context=multiprocessing.get_context("spawn"),
+                                          initializer=_init_worker)
+    return _media_pool
+
+
+def _init_worker():
+    # Workers share the server's stdout, which carries the MCP protocol
+    sys.stdout = sys.stderr
+
+
+def shutdown_media_pool():
+    """Stop the workers; unfinished jobs stay pending and resume on next unlock"""
+    global _media_pool
+    if _media_pool is not None:
+        _media_pool.shutdown(wait=False, cancel_futures=True)
+        _media_pool = None
+
+
+class MediaJobQueue:
+    """
+    Media jobs for one vault
+    - Jobs are rows in media_jobs (enqueued in the memory's transaction), so
+      they survive restarts
+    - Workers only see file paths; results are encrypted here, in the
+      server process, before they are written to media_artifacts
+    """
+
+    def __init__(self, db_path: Path, crypto_manager):
+        self.db_path = Path(db_path)
+        self.crypto_manager = crypto_manager
+        self._running: Dict[int, asyncio.Task] = {}
+
+    def enqueue(self, cursor, memory_id: int, audio_path: Optional[str] = None,
+                photo_path: Optional[str] = None):
+        """Queue jobs for a memory's media in the caller's transaction"""
+        for kind, path in (("waveform", audio_path), ("thumbnail", photo_path)):
+            if path:
+                cursor.execute('''
+                    INSERT INTO media_jobs (memory_id, kind, source_path) VALUES (?, ?, ?)
+                ''', (memory_id, kind, path))
+
+    def schedule_pending(self):
+        """Hand pending jobs to the process pool (call after commit, vault unlocked)"""
+        if not self.crypto_manager.authenticated:
+            return
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            jobs = conn.execute('''
+                SELECT id, memory_id, kind, source_path FROM media_jobs
+                WHERE status = 'pending' ORDER BY id
+            ''').fetchall()
+        finally:
+            conn.close()
+
+        loop = asyncio.get_running_loop()
+        for job_id, memory_id, kind, source_path in jobs:
+            if job_id not in self._running:
+                self._running[job_id] = loop.create_task(self._run(job_id, memory_id, kind, source_path))
+
+    async def _run(self, job_id: int, memory_id: int, kind: str, source_path: str):
+        loop = asyncio.get_running_loop()
+        try:
+            path = resolve_upload(source_path)
+            result = await loop.run_in_executor(get_media_pool(), MEDIA_TASKS[kind], str(path))
+        except UnsupportedMedia as e:
+            self._finish(job_id, "unsupported", str(e))
+        except Exception as e:
+            self._finish(job_id, None, str(e) or type(e).__name__)
+        else:
+            if not self.crypto_manager.authenticated:
+                return  # Locked meanwhile - stays pending until the next unlock
+            if "peaks_payload" in result:
+                # Encrypting a long recording's peaks takes a moment - keep the loop free
+                result["peaks"] = await loop.run_in_executor(None, self._write_peaks, path, result)
+            # Off the loop: encrypting waits out a key rotation in progress
+            await loop.run_in_executor(None, self._store, job_id, memory_id, kind, result)
+        finally:
+            self._running.pop(job_id, None)
+
+    def _write_peaks(self, audio_path: Path, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Write the multi-resolution peaks next to the recording"""
+        peaks_path = peaks_path_for(audio_path)
+        header = write_peaks_file(peaks_path, self.crypto_manager, {
+            "sample_rate": result["sample_rate"],
+            "channels": result["channels"],
+            "duration": result["duration"],
+            "levels": result.pop("peak_levels")
+        }, result.pop("peaks_payload"))
+        return dict(header, file=str(peaks_path))
+
+    def open_peaks(self, memory_id: int) -> Optional[PeaksFile]:
+        """Peaks file of a memory's recording, if one was computed"""
+        waveform = self.get_artifacts(memory_id)["artifacts"].get("waveform") or {}
+        peaks = waveform.get("peaks")
+        if not peaks or not Path(peaks["file"]).exists():
+            return None
+        return PeaksFile(Path(peaks["file"]), self.crypto_manager)
+
+    def _store(self, job_id: int, memory_id: int, kind: str, result: Dict[str, Any]):
+        payload = self.crypto_manager.encrypt_bytes(json.dumps(result).encode())
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('''
+                INSERT OR REPLACE INTO media_artifacts (memory_id, kind, payload, size)
+                VALUES (?, ?, ?, ?)
+            ''', (memory_id, kind, payload, len(payload)))
+            conn.execute('''
+                UPDATE media_jobs SET status = 'done', error = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (job_id,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _finish(self, job_id: int, status: Optional[str], error: str):
+        """Record a failure; transient errors are retried up to MAX_JOB_ATTEMPTS"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('''
+                UPDATE media_jobs
+                SET attempts = attempts + 1,
+                    status = COALESCE(?, CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END),
+                    error = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (status, MAX_JOB_ATTEMPTS, error, job_id))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_artifacts(self, memory_id: int) -> Dict[str, Any]:
+        """Decrypted artifacts plus job status for one memory"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            artifacts = {
+                kind: json.loads(self.crypto_manager.decrypt_bytes(payload))
+                for kind, payload in conn.execute(
+                    "SELECT kind, payload FROM media_artifacts WHERE memory_id = ?", (memory_id,)
+                )
+            }
+            jobs = [
+                {"kind": kind, "status": status, "error": error}
+                for kind, status, error in conn.execute(
+                    "SELECT kind, status, error FROM media_jobs WHERE memory_id = ? ORDER BY id", (memory_id,)
+                )
+            ]
+        finally:
+            conn.close()
+
+        return {"memory_id": memory_id, "artifacts": artifacts, "jobs": jobs}
+
+    def get_stats(self) -> Dict[str, Any]:
+        conn = sqlite3.connect(self.db_path)
+        try:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM media_jobs GROUP BY status"))
+        finally:
+            conn.close()
+        return {"running": len(self._running), "jobs": counts}
+
+
+def resolve_upload(source_path: str) -> Path:
+    """Refuse anything outside the uploads directory"""
+    path = Path(source_path).resolve()
+    if UPLOADS_DIR.resolve() not in path.parents:
+        raise UnsupportedMedia(f"Not an uploaded file: {source_path}")
+    if not path.is_file():
+        raise UnsupportedMedia(f"File not found: {source_path}")
+    return path
+
+
+# --- Worker-side tasks (run in the process pool; no keys, plain results) ---
+
+def read_wav_layout(path: str) -> Dict[str, int]:
+    """Find the PCM format and the data chunk of a RIFF/WAVE file"""
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            raise UnsupportedMedia("Not a RIFF/WAVE file (browser recordings are often WebM)")
+
+        layout = {}
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                break
+            chunk_id, chunk_size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+
+            if chunk_id == b"fmt ":
+                fmt = f.read(chunk_size)
+                audio_format, channels, sample_rate, _, block_align, bits = struct.unpack("<HHIIHH", fmt[:16])
+                if audio_format == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+                    audio_format = struct.unpack("<H", fmt[24:26])[0]
+                layout.update(format=audio_format, channels=channels, sample_rate=sample_rate,
+                              block_align=block_align, bits=bits)
+                if chunk_size % 2:
+                    f.seek(1, os.SEEK_CUR)
+            elif chunk_id == b"data":
+                offset = f.tell()
+                # Streaming writers leave the size at 0 or 0xFFFFFFFF
+                size = chunk_size if 0 < chunk_size <= file_size - offset else file_size - offset
+                layout.update(data_offset=offset, data_size=size)
+                break
+            else:
+                f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+    if "format" not in layout or "data_offset" not in layout:
+        raise UnsupportedMedia("WAVE file without fmt/data chunk")
+    return layout
+
+
+def map_wav_samples(path: str):
+    """Memory-map the PCM data as a (frames, channels) array plus its full scale"""
+    import numpy as np
+
+    layout = read_wav_layout(path)
+    dtypes = {
+        (WAVE_FORMAT_PCM, 8): (np.uint8, 128.0),
+        (WAVE_FORMAT_PCM, 16): (np.dtype("<i2"), 32768.0),
+        (WAVE_FORMAT_PCM, 32): (np.dtype("<i4"), 2147483648.0),
+        (WAVE_FORMAT_IEEE_FLOAT, 32): (np.dtype("<f4"), 1.0),
+    }
+    key = (layout["format"], layout["bits"])
+    if key not in dtypes or layout["channels"] < 1:
+        raise UnsupportedMedia(f"Unsupported WAVE encoding (format {key[0]}, {key[1]}-bit)")
+
+    dtype, full_scale = dtypes[key]
+    frames = layout["data_size"] // layout["block_align"]
+    if frames == 0:
+        return np.zeros((0, layout["channels"]), dtype=dtype), full_scale, layout
+
+    samples = np.memmap(path, dtype=dtype, mode="r", offset=layout["data_offset"],
+                        shape=(frames, layout["channels"]))
+    return samples, full_scale, layout
+
+
+def compute_waveform(path: str, bins: int = WAVEFORM_BINS) -> Dict[str, Any]:
+    """
+    Duration, an overview of about `bins` min/max levels (-1..1) across all
+    channels, and the multi-resolution peaks (one pass over the audio)
+    """
+    import numpy as np
+
+    samples, full_scale, layout = map_wav_samples(path)
+    zero = 128.0 if samples.dtype == np.uint8 else 0.0
+    levels, payload = compute_peak_levels(samples, full_scale, zero, SCAN_CHUNK_FRAMES)
+
+    # Overview: merge the coarsest level that still has at least `bins` bins
+    level = next((level for level in reversed(levels) if level["bins"] >= bins), levels[0])
+    pairs = np.frombuffer(payload, dtype=np.int8, count=level["bins"] * 2,
+                          offset=level["offset"]).reshape(-1, 2)
+    group = max(1, -(-level["bins"] // bins))
+    edges = np.arange(0, len(pairs), group)
+    low = np.minimum.reduceat(pairs[:, 0], edges) if len(pairs) else pairs[:, 0]
+    high = np.maximum.reduceat(pairs[:, 1], edges) if len(pairs) else pairs[:, 1]
+
+    return {
+        "duration": round(len(samples) / layout["sample_rate"], 3) if layout["sample_rate"] else 0,
+        "sample_rate": layout["sample_rate"],
+        "channels": layout["channels"],
+        "frames_per_bin": level["frames_per_bin"] * group,
+        "min": np.round(low / 127, 4).tolist(),
+        "max": np.round(high / 127, 4).tolist(),
+        "peak_levels": levels,
+        "peaks_payload": payload
+    }
+
+
+def make_thumbnail(path: str, max_size: int = THUMBNAIL_MAX_SIZE) -> Dict[str, Any]:
+    """JPEG thumbnail (as a data URL) that fits in max_size x max_size"""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        with Image.open(path) as image:
+            image = ImageOps.exif_transpose(image)
+            width, height = image.size
+            image.thumbnail((max_size, max_size))
+            buffer = io.BytesIO()
+            image.convert("RGB").save(buffer, format="JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+    except UnidentifiedImageError as e:
+        raise UnsupportedMedia(f"Not a readable image: {e}")
+
+    return {
+        "width": width,
+        "height": height,
+        "thumbnail": "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()
+    }
+
+
+MEDIA_TASKS = {
+    "waveform": compute_waveform,
+    "thumbnail": make_thumbnail,
+}
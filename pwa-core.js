@@ -12,6 +12,8 @@ class PWACore {
     this.localStorage = null;
     this.aiEngine = null;
     this.updateAvailable = false;
+    this.serverEvents = null;
+    this.serverSyncTimer = null;
     
     this.init();
   }
@@ -40,6 +42,9 @@ class PWACore {
     // Handle offline/online status
     this.handleConnectionStatus();
     
+    // Pull server-side changes when they happen instead of polling
+    this.watchServerChanges();
+    
     console.log('✅ PWA Core initialized');
   }
 
@@ -354,6 +359,26 @@ class PWACore {
     }
   }
 
+  /**
+   * Listen for server-side changes on /api/events
+   * A burst of updates triggers a single delta sync
+   */
+  watchServerChanges() {
+    if (!('EventSource' in window) || this.serverEvents) return;
+
+    this.serverEvents = new EventSource('/api/events?resources=memories,conversations');
+    this.serverEvents.addEventListener('resource-updated', () => {
+      clearTimeout(this.serverSyncTimer);
+      this.serverSyncTimer = setTimeout(() => this.syncOfflineData(), 250);
+    });
+    this.serverEvents.onerror = () => {
+      // No bridge behind this origin - stop instead of reconnecting forever
+      if (this.serverEvents.readyState === EventSource.CLOSED) {
+        this.serverEvents = null;
+      }
+    };
+  }
+
   /**
    * Sync offline data
    */
@@ -362,6 +387,9 @@ class PWACore {
 
     try {
       const unsyncedItems = await this.localStorage.getUnsyncedItems();
+
+      // Delta sync: push queued items and pull changes since our cursor
+      if (await this.syncDeltas(unsyncedItems)) return;
       
       if (unsyncedItems.length > 0) {
         console.log(`🔄 Syncing ${unsyncedItems.length} offline items...`);
@@ -383,6 +411,59 @@ class PWACore {
     }
   }
 
+  /**
+   * Exchange deltas with /api/sync
+   * Returns false if the server has no sync endpoint (falls back to per-item sync);
+   * other failures throw an Error carrying the HTTP status as error.status
+   */
+  async syncDeltas(unsyncedItems) {
+    const deviceId = this.localStorage.getDeviceId();
+    const itemsByKey = new Map(unsyncedItems.map(item => [`${deviceId}:${item.id}`, item]));
+    let changes = [...itemsByKey].map(([key, item]) => ({
+      idempotency_key: key,
+      type: item.type,
+      data: JSON.parse(item.data)
+    }));
+    let cursor = this.localStorage.getSyncCursor();
+    let hasMore = true;
+    let firstPage = true;
+
+    while (hasMore) {
+      const response = await fetch('/api/sync', {
+        method: 'POST',
+        headers: this.vaultHeaders({ 'Content-Type': 'application/json' }),
+        body: JSON.stringify({ device_id: deviceId, cursor, changes })
+      });
+
+      // Decided on the status alone: only a 404 for the first request means
+      // the endpoint is missing (a bridge from before delta sync)
+      if (response.status === 404 && firstPage) return false;
+      if (!response.ok) {
+        const error = new Error(`HTTP error! status: ${response.status}`);
+        error.status = response.status;
+        throw error;
+      }
+      firstPage = false;
+
+      const result = await response.json();
+
+      // Retried keys come back as duplicates - both mean the server has it
+      for (const applied of result.applied) {
+        await this.localStorage.markSynced(itemsByKey.get(applied.idempotency_key).id);
+      }
+
+      const pulled = await this.localStorage.applyServerChanges(result.changes);
+      cursor = result.cursor;
+      this.localStorage.setSyncCursor(cursor);
+      hasMore = result.has_more;
+      changes = [];
+
+      console.log(`🔄 Synced: ${result.applied.length} pushed, ${pulled} pulled`);
+    }
+
+    return true;
+  }
+
   /**
    * Sync a single item
    */
@@ -391,7 +472,7 @@ class PWACore {
     
     switch (item.type) {
       case 'memory':
-        await this.syncMemory(data);
+        await this.syncMemory(data, `${this.localStorage.getDeviceId()}:${item.id}`);
         break;
       case 'conversation':
         await this.syncConversation(data);
@@ -401,13 +482,30 @@ class PWACore {
     }
   }
 
+  /**
+   * Add the server vault token (issued by auth.html's unlock) to request headers
+   */
+  vaultHeaders(headers = {}) {
+    const vaultToken = sessionStorage.getItem('whaddyasay_vault_token');
+    if (vaultToken) {
+      headers['X-Vault-Token'] = vaultToken;
+    }
+    return headers;
+  }
+
   /**
    * Sync memory to server
    */
-  async syncMemory(memoryData) {
+  async syncMemory(memoryData, idempotencyKey = null) {
+    const headers = this.vaultHeaders({ 'Content-Type': 'application/json' });
+    if (idempotencyKey) {
+      // Lets the server answer a retried upload without storing it twice
+      headers['Idempotency-Key'] = idempotencyKey;
+    }
+
     const response = await fetch('/api/memory/store', {
       method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
+      headers,
       body: JSON.stringify(memoryData)
     });
     
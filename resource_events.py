@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Resource Event Hub for the web bridge
+Fans MCP resources/updated notifications out to browser push
+connections; the bridge holds one MCP subscription per resource URI
+no matter how many browsers are listening
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+# A listener that falls this far behind just misses hints - each one
+# only says "re-fetch", so dropping duplicates loses nothing
+LISTENER_QUEUE_SIZE = 32
+
+
+class Listener:
+    """
+    One push connection: the URIs it watches and its pending updates
+    (or, with on_event, a callback run on the MCP loop instead of a queue)
+    """
+
+    def __init__(self, uris: List[str], on_event: Optional[Callable[[str], None]] = None):
+        self.uris = list(uris)
+        self.on_event = on_event
+        self.events: queue.Queue = queue.Queue(maxsize=LISTENER_QUEUE_SIZE)
+
+    def get(self, timeout: float) -> str:
+        """Next updated URI; raises queue.Empty after timeout"""
+        return self.events.get(timeout=timeout)
+
+
+class ResourceEventHub:
+    """
+    Listener queues per resource URI
+    - subscribe(uri) runs when the first listener for a URI arrives,
+      unsubscribe(uri) when the last one leaves
+    - dispatch() is called from the MCP event loop and never blocks
+    """
+
+    def __init__(self, subscribe: Callable[[str], None], unsubscribe: Callable[[str], None]):
+        self._subscribe = subscribe
+        self._unsubscribe = unsubscribe
+        self._lock = threading.Lock()
+        self._listeners: Dict[str, Set[Listener]] = {}
+
+        self.dispatched = 0
+        self.dropped = 0
+
+    def listen(self, uris: List[str], on_event: Optional[Callable[[str], None]] = None) -> Listener:
+        """New listener for these URIs; pass it to unlisten() when done"""
+        listener = Listener(uris, on_event)
+        first_for = []
+        with self._lock:
+            for uri in listener.uris:
+                listeners = self._listeners.setdefault(uri, set())
+                if not listeners:
+                    first_for.append(uri)
+                listeners.add(listener)
+        for uri in first_for:
+            self._subscribe(uri)
+        return listener
+
+    def unlisten(self, listener: Listener):
+        last_for = []
+        with self._lock:
+            for uri in listener.uris:
+                listeners = self._listeners.get(uri)
+                if listeners is None:
+                    continue
+                listeners.discard(listener)
+                if not listeners:
+                    del self._listeners[uri]
+                    last_for.append(uri)
+        for uri in last_for:
+            self._unsubscribe(uri)
+
+    def dispatch(self, uri: str):
+        with self._lock:
+            listeners = list(self._listeners.get(uri, ()))
+        for listener in listeners:
+            if listener.on_event is not None:
+                listener.on_event(uri)
+                self.dispatched += 1
+                continue
+            try:
+                listener.events.put_nowait(uri)
+                self.dispatched += 1
+            except queue.Full:
+                self.dropped += 1
+
+    def active_uris(self) -> List[str]:
+        """URIs with listeners - resubscribed after the MCP session reconnects"""
+        with self._lock:
+            return list(self._listeners)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "subscribed_uris": len(self._listeners),
+                "listeners": len(set().union(*self._listeners.values())),
+                "dispatched": self.dispatched,
+                "dropped": self.dropped
+            }
+
+
+class VaultWatches:
+    """
+    The bridge cache's own listeners, one per vault it holds results for
+    - watch() keeps a vault's listener until its newest cached result has
+      expired; release_idle() then drops it, so vaults nobody reads (or
+      the server has evicted) stop holding a listener and subscriptions
+    - release_all() when the MCP session is lost, as the cache is cleared
+    """
+
+    def __init__(self, hub: ResourceEventHub, on_event: Callable[[str], None]):
+        self.hub = hub
+        self.on_event = on_event
+        self._listeners: Dict[str, Listener] = {}
+        self._expires: Dict[str, float] = {}
+
+    def watch(self, vault: str, uris: List[str], ttl: float):
+        """Listen for this vault's changes for at least ttl more seconds"""
+        if vault not in self._listeners:
+            self._listeners[vault] = self.hub.listen(uris, on_event=self.on_event)
+        self._expires[vault] = max(self._expires.get(vault, 0.0), time.monotonic() + ttl)
+
+    def release_idle(self) -> int:
+        """Unlisten vaults whose cached results have all expired"""
+        now = time.monotonic()
+        idle = [vault for vault, expires in self._expires.items() if expires <= now]
+        for vault in idle:
+            self._release(vault)
+        return len(idle)
+
+    def release_all(self):
+        for vault in list(self._listeners):
+            self._release(vault)
+
+    def _release(self, vault: str):
+        del self._expires[vault]
+        self.hub.unlisten(self._listeners.pop(vault))
+
+    def __len__(self) -> int:
+        return len(self._listeners)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Resource Change Subscriptions
+Sessions subscribe to resource URIs and get resources/updated when a
+write touching that resource commits, instead of polling for changes
+"""
+
+import asyncio
+import threading
+import weakref
+from typing import Any, Dict, Optional, Set, Tuple
+
+# (vault key, base resource URI) - the query string (?user_id=...) is per subscriber
+Topic = Tuple[str, str]
+
+
+class ResourceSubscriptions:
+    """
+    Subscribers per (vault, resource)
+    - publish() can be called from any thread (e.g. a write-behind flush);
+      notifications are sent on the server's event loop
+    - Updates to the same resource within one loop tick go out once
+    - Sessions are held weakly, so a closed client drops its subscriptions
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._topics: Dict[Topic, "weakref.WeakKeyDictionary[Any, Set[str]]"] = {}
+        self._pending: Set[Topic] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.published = 0
+        self.notifications_sent = 0
+        self.send_failures = 0
+
+    def subscribe(self, vault_key: str, base_uri: str, uri: str, session):
+        """Register a session for a resource; must run on the server's loop"""
+        self._loop = asyncio.get_running_loop()
+        with self._lock:
+            subscribers = self._topics.setdefault((vault_key, base_uri), weakref.WeakKeyDictionary())
+            subscribers.setdefault(session, set()).add(uri)
+
+    def unsubscribe(self, vault_key: str, base_uri: str, uri: str, session):
+        with self._lock:
+            subscribers = self._topics.get((vault_key, base_uri))
+            if subscribers is None or session not in subscribers:
+                return
+            subscribers[session].discard(uri)
+            if not subscribers[session]:
+                del subscribers[session]
+            if not subscribers:
+                del self._topics[(vault_key, base_uri)]
+
+    def publish(self, vault_key: str, *base_uris: str):
+        """A write to these resources committed"""
+        with self._lock:
+            # Nobody listening (the common case) costs one dict lookup per resource
+            topics = [(vault_key, uri) for uri in base_uris if self._topics.get((vault_key, uri))]
+            if not topics or self._loop is None:
+                return
+            schedule = not self._pending
+            self._pending.update(topics)
+            self.published += 1
+
+        if schedule:
+            try:
+                self._loop.call_soon_threadsafe(self._flush)
+            except RuntimeError:
+                pass  # Loop already closed - the server is shutting down
+
+    def _flush(self):
+        with self._lock:
+            topics, self._pending = self._pending, set()
+            deliveries = [
+                (session, uri)
+                for topic in topics
+                for session, uris in list(self._topics.get(topic, {}).items())
+                for uri in uris
+            ]
+        for session, uri in deliveries:
+            asyncio.ensure_future(self._send(session, uri))
+
+    async def _send(self, session, uri: str):
+        try:
+            await session.send_resource_updated(uri)
+            self.notifications_sent += 1
+        except Exception:
+            # Broken session - forget it rather than failing every later write
+            self.send_failures += 1
+            with self._lock:
+                for topic in list(self._topics):
+                    self._topics[topic].pop(session, None)
+                    if not self._topics[topic]:
+                        del self._topics[topic]
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            subscriptions = sum(
+                len(uris) for subscribers in self._topics.values() for uris in subscribers.values()
+            )
+        return {
+            "subscriptions": subscriptions,
+            "published": self.published,
+            "notifications_sent": self.notifications_sent,
+            "send_failures": self.send_failures
+        }
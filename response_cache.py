@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Bridge Response Cache
+Byte-bounded LRU of read-only tool results, tagged by the vault data
+they depend on so writes (ours or the server's notifications) drop
+exactly the entries they make stale
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+# Tags are (vault owner, data area), e.g. ("alice", "memories")
+Tag = Tuple[str, str]
+
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+# Results bigger than this share of the budget are not worth evicting everything else for
+MAX_ENTRY_SHARE = 8
+
+
+class _Entry:
+    __slots__ = ("value", "size", "tags", "expires_at")
+
+    def __init__(self, value: str, size: int, tags: Tuple[Tag, ...], expires_at: float):
+        self.value = value
+        self.size = size
+        self.tags = tags
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """
+    LRU bounded by the bytes of the cached text
+    - begin() snapshots tag generations before the call; put() refuses the
+      result if a write to any of its tags landed meanwhile, so a slow read
+      can't re-cache data a concurrent write just replaced
+    - Every entry also has a TTL for state the bridge can't observe
+      (vault eviction on the server, writes by other server processes)
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._by_tag: Dict[Tag, set] = {}
+        self._generations: Dict[Tag, int] = {}
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def begin(self, tags: Iterable[Tag]) -> Dict[Tag, int]:
+        """Generation snapshot to hand back to put()"""
+        with self._lock:
+            return {tag: self._generations.get(tag, 0) for tag in tags}
+
+    def put(self, key: str, value: str, snapshot: Dict[Tag, int], ttl: float):
+        size = len(key) + len(value)
+        if size > self.max_bytes // MAX_ENTRY_SHARE:
+            return
+        with self._lock:
+            if any(self._generations.get(tag, 0) != generation for tag, generation in snapshot.items()):
+                self.stale_puts += 1
+                return
+            if key in self._entries:
+                self._remove(key)
+            tags = tuple(snapshot)
+            self._entries[key] = _Entry(value, size, tags, time.monotonic() + ttl)
+            self.bytes += size
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, tags: Iterable[Tag]):
+        """Drop every entry depending on these tags"""
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+                for key in self._by_tag.pop(tag, ()):
+                    if key in self._entries:
+                        self._remove(key)
+                        self.invalidations += 1
+
+    def clear(self):
+        """Forget everything (e.g. the server process was restarted)"""
+        with self._lock:
+            for tag in self._generations:
+                self._generations[tag] += 1
+            self._entries.clear()
+            self._by_tag.clear()
+            self.bytes = 0
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def get_stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "stale_puts": self.stale_puts
+            }
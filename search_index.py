@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Encrypted Full-Text Search Index
+SQLite FTS5 index over decrypted memory text, kept in memory while the
+vault is unlocked and persisted as an encrypted snapshot at rest
+"""
+
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Persist a snapshot after this many incremental updates
+SNAPSHOT_EVERY_WRITES = 50
+
+# Column weights for bm25(): title, content, tags
+BM25_WEIGHTS = (10.0, 1.0, 5.0)
+
+
+class EncryptedSearchIndex:
+    """
+    FTS5 sidecar for one vault
+    - Built once at unlock (or loaded from the encrypted snapshot)
+    - Updated incrementally as memories are stored
+    - Never written to disk unencrypted
+    """
+
+    def __init__(self, index_path: Path, crypto_manager):
+        self.index_path = Path(index_path)
+        self.crypto_manager = crypto_manager
+        self.conn: Optional[sqlite3.Connection] = None
+        self.pending_writes = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.conn is not None
+
+    def open(self, db_path: Path):
+        """Load the snapshot (or start empty) and index any newer memories"""
+        self.conn = sqlite3.connect(":memory:")
+
+        if self.index_path.exists():
+            try:
+                with open(self.index_path, 'r') as f:
+                    snapshot = self.crypto_manager.decrypt_bytes(f.read())
+                self.conn.deserialize(snapshot)
+            except Exception as e:
+                print(f"Warning: Could not load search snapshot, rebuilding: {e}")
+                self.conn.close()
+                self.conn = sqlite3.connect(":memory:")
+
+        self.conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS memory_fts USING fts5(
+                title, content, tags,
+                memory_type UNINDEXED,
+                timestamp UNINDEXED,
+                tokenize = 'porter unicode61'
+            )
+        ''')
+
+        indexed = self._catch_up(db_path)
+        if indexed:
+            self.save()
+
+    def _catch_up(self, db_path: Path) -> int:
+        """Index memories stored since the snapshot was taken"""
+        last_id = self.conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM memory_fts").fetchone()[0]
+
+        source = sqlite3.connect(db_path)
+        try:
+            rows = source.execute('''
+                SELECT id, title, content, tags, memory_type, timestamp
+                FROM memories WHERE id > ? ORDER BY id
+            ''', (last_id,))
+
+            indexed = 0
+            for memory_id, title, content, tags, memory_type, timestamp in rows:
+                if title == "ENCRYPTED":
+                    try:
+                        record = self.crypto_manager.decrypt_data(content)
+                    except Exception:
+                        continue  # Unreadable with this key - skip
+                else:
+                    record = {
+                        "title": title,
+                        "content": content,
+                        "tags": tags,
+                        "memory_type": memory_type,
+                        "timestamp": timestamp
+                    }
+                self._insert(memory_id, record)
+                indexed += 1
+
+            self.conn.commit()
+            return indexed
+        finally:
+            source.close()
+
+    def add(self, memory_id: int, record: Dict[str, Any]):
+        """Index a newly stored memory"""
+        if not self.is_open:
+            return
+
+        self._insert(memory_id, record)
+        self.conn.commit()
+
+        self.pending_writes += 1
+        if self.pending_writes >= SNAPSHOT_EVERY_WRITES:
+            self.save()
+
+    def add_many(self, items: List[Tuple[int, Dict[str, Any]]]):
+        """Index a batch of stored memories (bulk import); the caller saves the snapshot"""
+        if not self.is_open:
+            return
+
+        for memory_id, record in items:
+            self._insert(memory_id, record)
+        self.conn.commit()
+        self.pending_writes += len(items)
+
+    def _insert(self, memory_id: int, record: Dict[str, Any]):
+        tags = record.get("tags") or []
+        if isinstance(tags, str):
+            try:
+                tags = json.loads(tags)
+            except ValueError:
+                tags = [tags]
+
+        self.conn.execute('''
+            INSERT OR REPLACE INTO memory_fts (rowid, title, content, tags, memory_type, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (
+            memory_id,
+            record.get("title") or "",
+            record.get("content") or "",
+            " ".join(str(tag) for tag in tags),
+            record.get("memory_type"),
+            record.get("timestamp")
+        ))
+
+    def search(self, query: str, tags: Optional[List[str]] = None,
+               memory_type: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """BM25-ranked phrase/prefix search with snippets"""
+        terms = []
+        if query.strip():
+            terms.append(f"({query})")
+        for tag in tags or []:
+            terms.append(f'tags : {_quote(tag)}')
+
+        if not terms:
+            sql = '''
+                SELECT rowid, title, content, tags, memory_type, timestamp,
+                       substr(content, 1, 120), 0.0
+                FROM memory_fts WHERE (? IS NULL OR memory_type = ?)
+                ORDER BY rowid DESC LIMIT ?
+            '''
+            rows = self.conn.execute(sql, (memory_type, memory_type, limit)).fetchall()
+            return [_row_to_result(row) for row in rows]
+
+        sql = f'''
+            SELECT rowid, title, content, tags, memory_type, timestamp,
+                   snippet(memory_fts, 1, '[', ']', '…', 12),
+                   bm25(memory_fts, {", ".join(str(w) for w in BM25_WEIGHTS)}) AS score
+            FROM memory_fts
+            WHERE memory_fts MATCH ? AND (? IS NULL OR memory_type = ?)
+            ORDER BY score LIMIT ?
+        '''
+        try:
+            rows = self.conn.execute(sql, (" AND ".join(terms), memory_type, memory_type, limit)).fetchall()
+        except sqlite3.OperationalError:
+            # Not valid FTS syntax - treat every word as a prefix term
+            words = [_quote(word) + "*" for word in query.split()]
+            terms[0:1] = [" ".join(words)] if words else []
+            rows = self.conn.execute(sql, (" AND ".join(terms), memory_type, memory_type, limit)).fetchall()
+
+        return [_row_to_result(row) for row in rows]
+
+    def save(self):
+        """Write the encrypted snapshot atomically"""
+        if not self.is_open:
+            return
+
+        encrypted = self.crypto_manager.encrypt_bytes(self.conn.serialize())
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, 'w') as f:
+            f.write(encrypted)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, self.index_path)
+        self.pending_writes = 0
+
+    def close(self):
+        """Persist pending updates and drop the plaintext index from memory"""
+        if not self.is_open:
+            return
+
+        try:
+            if self.pending_writes:
+                self.save()
+        finally:
+            self.conn.close()
+            self.conn = None
+
+    def memory_footprint(self) -> int:
+        """Bytes held by the in-memory index"""
+        if not self.is_open:
+            return 0
+        page_count = self.conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        return page_count * page_size
+
+
+def _quote(term: str) -> str:
+    """Quote a term as an FTS5 string"""
+    return '"' + str(term).replace('"', '""') + '"'
+
+
+def _row_to_result(row) -> Dict[str, Any]:
+    memory_id, title, content, tags, memory_type, timestamp, snippet, score = row
+    return {
+        "id": memory_id,
+        "title": title,
+        "content": content,
+        "tags": tags.split() if tags else [],
+        "memory_type": memory_type,
+        "timestamp": timestamp,
+        "snippet": snippet,
+        "score": round(-score, 4)
+    }
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Unix Socket Transport
+MCP over a Unix domain socket with the stdio framing (one JSON-RPC
+message per line), so one long-running server process can serve many
+client sessions with shared vaults and caches
+"""
+
+import os
+import socket
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import anyio
+import anyio.lowlevel
+from anyio.streams.buffered import BufferedByteReceiveStream
+
+import mcp.types as types
+from mcp.shared.message import SessionMessage
+
+DEFAULT_SOCKET_PATH = Path("./data/mcp_server.sock")
+
+# Longest message accepted (uploads travel as file paths, not inline)
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+# Seconds in-flight requests get to finish when the daemon stops
+DRAIN_SECONDS = float(os.environ.get("COACH_DRAIN_SECONDS", 30))
+
+# JSON-RPC error code for requests refused while draining
+SERVER_DRAINING = -32001
+
+
+@asynccontextmanager
+async def socket_streams(stream,
+                         on_receive: Optional[Callable[[types.JSONRPCMessage], Optional[types.JSONRPCMessage]]] = None,
+                         on_sent: Optional[Callable[[types.JSONRPCMessage], None]] = None):
+    """
+    MCP read/write streams over one connected socket (either end)
+    - on_receive(message) may return a reply, which is sent back instead
+      of passing the message on
+    - on_sent(message) runs once each outgoing message is written
+    """
+    read_writer, read_stream = anyio.create_memory_object_stream(0)
+    write_stream, write_reader = anyio.create_memory_object_stream(0)
+    reply_stream = write_stream.clone()
+    buffered = BufferedByteReceiveStream(stream)
+
+    async def reader():
+        try:
+            async with read_writer, reply_stream:
+                while True:
+                    try:
+                        line = await buffered.receive_until(b"\n", MAX_MESSAGE_BYTES)
+                    except (anyio.EndOfStream, anyio.IncompleteRead, anyio.BrokenResourceError):
+                        return
+                    except anyio.DelimiterNotFound:
+                        print(f"❌ Message over {MAX_MESSAGE_BYTES} bytes, closing connection", file=sys.stderr)
+                        return
+                    try:
+                        message = types.JSONRPCMessage.model_validate_json(line)
+                    except Exception as exc:
+                        await read_writer.send(exc)
+                        continue
+
+                    reply = on_receive(message) if on_receive else None
+                    if reply is not None:
+                        await reply_stream.send(SessionMessage(reply))
+                    else:
+                        await read_writer.send(SessionMessage(message))
+        except anyio.ClosedResourceError:
+            await anyio.lowlevel.checkpoint()
+
+    async def writer():
+        try:
+            async with write_reader:
+                async for session_message in write_reader:
+                    payload = session_message.message.model_dump_json(by_alias=True, exclude_none=True)
+                    await stream.send(payload.encode() + b"\n")
+                    if on_sent:
+                        on_sent(session_message.message)
+        except (anyio.ClosedResourceError, anyio.BrokenResourceError):
+            await anyio.lowlevel.checkpoint()
+
+    async with anyio.create_task_group() as task_group:
+        task_group.start_soon(reader)
+        task_group.start_soon(writer)
+        try:
+            yield read_stream, write_stream
+        finally:
+            task_group.cancel_scope.cancel()
+
+
+@asynccontextmanager
+async def unix_socket_client(path=DEFAULT_SOCKET_PATH):
+    """Read/write streams to a running daemon (mcp_server.py --socket)"""
+    stream = await anyio.connect_unix(path)
+    async with stream, socket_streams(stream) as streams:
+        yield streams
+
+
+class SocketDaemon:
+    """
+    Serves MCP sessions on a Unix domain socket
+    - Each connection is its own session; vaults, caches and worker pools
+      belong to the process, so every client shares one warm server
+    - stop() drains: no new connections or requests are taken, requests
+      already in flight get drain_seconds to finish, then the remaining
+      sessions are closed and clients reconnect to the next daemon
+    """
+
+    def __init__(self, path, run_session: Callable[[Any, Any], Awaitable[None]],
+                 drain_seconds: float = DRAIN_SECONDS):
+        self.path = Path(path)
+        self.run_session = run_session
+        self.drain_seconds = drain_seconds
+        self.draining = False
+        self._stop = anyio.Event()
+
+        self.active_sessions = 0
+        self.sessions_served = 0
+        self.in_flight = 0
+        self.refused_requests = 0
+        self.abandoned_requests = 0
+
+    def stop(self):
+        """Begin a graceful drain (call on the daemon's event loop)"""
+        self._stop.set()
+
+    def _claim_path(self):
+        """Remove a socket left by a crashed daemon, never a live one"""
+        if not self.path.exists():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(self.path))
+        except (ConnectionRefusedError, FileNotFoundError):
+            self.path.unlink(missing_ok=True)
+        else:
+            raise RuntimeError(f"Another server is already listening on {self.path}")
+        finally:
+            probe.close()
+
+    async def serve_forever(self):
+        """Accept sessions until stop(), then drain"""
+        self._claim_path()
+        # Owner-only: sessions can use any vault this process has unlocked
+        listener = await anyio.create_unix_listener(self.path, mode=0o600)
+        print(f"🔌 Listening on {self.path}", file=sys.stderr)
+
+        try:
+            async with anyio.create_task_group() as sessions:
+                # Accepting stops before the listener closes under it
+                async with anyio.create_task_group() as accepting:
+                    accepting.start_soon(self._accept, listener, sessions)
+                    await self._stop.wait()
+                    accepting.cancel_scope.cancel()
+                await self._drain(listener)
+                sessions.cancel_scope.cancel()
+        finally:
+            await listener.aclose()
+            self.path.unlink(missing_ok=True)
+
+    async def _accept(self, listener, sessions):
+        while True:
+            try:
+                stream = await listener.accept()
+            except (anyio.ClosedResourceError, anyio.BrokenResourceError):
+                return
+            sessions.start_soon(self._serve_connection, stream)
+
+    async def _drain(self, listener):
+        self.draining = True
+        await listener.aclose()
+        self.path.unlink(missing_ok=True)  # New clients fail fast instead of queueing
+        print(f"⏳ Draining {self.in_flight} in-flight request(s) "
+              f"across {self.active_sessions} session(s)", file=sys.stderr)
+
+        with anyio.move_on_after(self.drain_seconds):
+            while self.in_flight:
+                await anyio.sleep(0.05)
+        if self.in_flight:
+            self.abandoned_requests += self.in_flight
+            print(f"⚠️ {self.in_flight} request(s) still running after {self.drain_seconds}s, closing anyway",
+                  file=sys.stderr)
+
+    async def _serve_connection(self, stream):
+        pending = set()
+
+        def on_receive(message):
+            request = message.root
+            if not isinstance(request, types.JSONRPCRequest):
+                return None
+            if self.draining:
+                self.refused_requests += 1
+                return types.JSONRPCMessage(types.JSONRPCError(
+                    jsonrpc="2.0",
+                    id=request.id,
+                    error=types.ErrorData(code=SERVER_DRAINING, message="Server is shutting down, reconnect")
+                ))
+            pending.add(request.id)
+            self.in_flight += 1
+            return None
+
+        def on_sent(message):
+            response = message.root
+            if isinstance(response, (types.JSONRPCResponse, types.JSONRPCError)) and response.id in pending:
+                pending.discard(response.id)
+                self.in_flight -= 1
+
+        self.active_sessions += 1
+        self.sessions_served += 1
+        try:
+            async with stream, socket_streams(stream, on_receive, on_sent) as (read, write):
+                await self.run_session(read, write)
+        except Exception as e:
+            print(f"❌ Session error: {e}", file=sys.stderr)
+        finally:
+            self.in_flight -= len(pending)
+            self.active_sessions -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "socket": str(self.path),
+            "draining": self.draining,
+            "active_sessions": self.active_sessions,
+            "sessions_served": self.sessions_served,
+            "in_flight": self.in_flight,
+            "refused_requests": self.refused_requests,
+            "abandoned_requests": self.abandoned_requests
+        }
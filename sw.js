@@ -1,5 +1,5 @@
 // Service Worker for What Do You Say? PWA
-const CACHE_NAME = 'whaddyasay-v1.0.1';
+const CACHE_NAME = 'whaddyasay-v1.0.2';
 const OFFLINE_URL = './offline.html';
 
 // Files to cache for offline functionality
@@ -23,14 +23,30 @@ const urlsToCache = [
   './icons/icon-512x512.png'
 ];
 
+// Pages served by the bridge load scripts and styles by fingerprinted URL
+// (see /asset-manifest.json) - cache those too, so they work offline
+async function precacheUrls() {
+  try {
+    const response = await fetch('./asset-manifest.json', { cache: 'no-cache' });
+    const manifest = await response.json();
+    const fingerprinted = urlsToCache
+      .filter((url) => !url.endsWith('.html'))
+      .map((url) => manifest[url.replace('./', '')])
+      .filter(Boolean);
+    return urlsToCache.concat(fingerprinted);
+  } catch (error) {
+    return urlsToCache; // Static hosting: pages use the plain names
+  }
+}
+
 // Install event - cache resources
 self.addEventListener('install', (event) => {
   console.log('Service Worker installing...');
   event.waitUntil(
-    caches.open(CACHE_NAME)
-      .then((cache) => {
+    Promise.all([caches.open(CACHE_NAME), precacheUrls()])
+      .then(([cache, urls]) => {
         console.log('Caching app resources');
-        return cache.addAll(urlsToCache);
+        return cache.addAll(urls);
       })
       .then(() => {
         console.log('Service Worker installed successfully');
@@ -74,6 +90,12 @@ self.addEventListener('fetch', (event) => {
     return;
   }
 
+  // Push connections (/api/events) go straight to the network -
+  // nothing to cache, and no offline stand-in makes sense
+  if (event.request.headers.get('Accept') === 'text/event-stream') {
+    return;
+  }
+
   // Handle API requests differently
   if (event.request.url.includes('/api/')) {
     event.respondWith(handleApiRequest(event.request));
@@ -5,24 +5,33 @@ Simple MCP Client for testing the Conversation Coach server
 
 import asyncio
 import json
+import os
 import sys
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from socket_transport import unix_socket_client
 
-async def test_mcp_server():
-    """Test the MCP server with real MCP protocol"""
-    
-    print("🔌 Testing MCP Server with Real Protocol")
-    print("=" * 45)
+def server_streams():
+    """A fresh server over stdio, or the shared daemon when COACH_MCP_SOCKET is set"""
+    socket_path = os.environ.get("COACH_MCP_SOCKET")
+    if socket_path:
+        return unix_socket_client(socket_path)
     
     # Server parameters
     server_params = StdioServerParameters(
         command="python",
         args=["mcp_server.py"],
     )
+    return stdio_client(server_params)
+
+async def test_mcp_server():
+    """Test the MCP server with real MCP protocol"""
+    
+    print("🔌 Testing MCP Server with Real Protocol")
+    print("=" * 45)
     
     try:
-        async with stdio_client(server_params) as (read, write):
+        async with server_streams() as (read, write):
             async with ClientSession(read, write) as session:
                 
                 # Initialize the session
@@ -96,13 +105,8 @@ async def interactive_test():
     print("  4 - List resources")
     print("  q - Quit")
     
-    server_params = StdioServerParameters(
-        command="python",
-        args=["mcp_server.py"],
-    )
-    
     try:
-        async with stdio_client(server_params) as (read, write):
+        async with server_streams() as (read, write):
             async with ClientSession(read, write) as session:
                 await session.initialize()
                 print("✅ Connected to MCP server")
@@ -103,6 +103,672 @@ def test_database_setup():
         print(f"❌ Database setup failed: {e}")
         return False
 
+def test_vault_registry():
+    """Test per-user vaults and LRU eviction"""
+    print("🗂️  Testing Vault Registry")
+    print("=" * 30)
+    
+    try:
+        import shutil
+        from mcp_server import ConversationCoachServer
+        from vault_registry import VaultRegistry
+        
+        shutil.rmtree("./test_data/vaults/grace", ignore_errors=True)
+        registry = VaultRegistry("./test_data", ConversationCoachServer, memory_budget_bytes=0)
+        alice = registry.get("alice")
+        assert alice.db_path.parent.name == "alice"
+        assert registry.get("alice") is alice
+        
+        # Budget of zero keeps only the most recently used vault resident
+        bob = registry.get("bob")
+        assert registry.get_stats()["resident_vaults"] == 1
+        assert registry.evictions == 1
+        
+        # A vault with work in flight stays until it is idle
+        bob.active_calls += 1
+        registry.get("carol")
+        assert registry.get_stats()["resident_vaults"] == 2
+        bob.active_calls -= 1
+        registry.refresh("carol")
+        assert registry.get_stats()["resident_vaults"] == 1
+        assert registry.resident_bytes() == registry.get("carol").memory_footprint()
+        
+        # Evicting an unlocked vault is remembered until its owner unlocks it again
+        assert registry.get("grace").crypto_manager.setup_first_time("grace-password")
+        registry.get("heidi")
+        assert registry.was_unloaded("grace") and not registry.was_unloaded("carol")
+        assert registry.get("grace").crypto_manager.authenticate("grace-password")
+        registry.refresh("grace")
+        assert not registry.was_unloaded("grace")
+        registry.close_all()
+        
+        try:
+            registry.get("../escape")
+            raise AssertionError("path traversal user ID accepted")
+        except ValueError:
+            pass
+        
+        print("✅ Vault registry isolates users and evicts LRU")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Vault registry test failed: {e}")
+        return False
+
+def test_envelope_key_rotation():
+    """Test that key rotation keeps existing records readable"""
+    print("🔑 Testing Envelope Encryption")
+    print("=" * 30)
+    
+    try:
+        from crypto_manager import PersonalCryptoManager
+        
+        Path("./test_data/envelope").mkdir(parents=True, exist_ok=True)
+        crypto = PersonalCryptoManager("./test_data/envelope")
+        crypto.setup_first_time("test-password")
+        encrypted = crypto.encrypt_data({"content": "before rotation"})
+        
+        assert crypto.rotate_keys("test-password", "new-test-password")
+        crypto.lock()
+        assert crypto.authenticate("new-test-password")
+        assert crypto.decrypt_data(encrypted)["content"] == "before rotation"
+        
+        # A record encrypted while a rotation runs waits for it, then stays readable
+        import shutil
+        import threading
+        shutil.rmtree("./test_data/envelope")
+        Path("./test_data/envelope").mkdir(parents=True)
+        crypto = PersonalCryptoManager("./test_data/envelope")
+        crypto.setup_first_time("test-password")
+        during = []
+        writer = threading.Thread(target=lambda: during.append(crypto.encrypt_data({"content": "during rotation"})))
+        create_master_key = crypto._create_master_key
+        
+        def create_master_key_mid_rotation(password):
+            writer.start()
+            writer.join(0.2)
+            assert writer.is_alive(), "data key minted mid-rotation"
+            return create_master_key(password)
+        
+        crypto._create_master_key = create_master_key_mid_rotation
+        assert crypto.rotate_keys("test-password", "new-test-password")
+        writer.join()
+        del crypto._create_master_key
+        crypto.lock()
+        assert crypto.authenticate("new-test-password")
+        assert crypto.decrypt_data(during[0])["content"] == "during rotation"
+        
+        # Pruning keeps each rotation's master key and data key backups together
+        assert crypto.rotate_keys("new-test-password", "test-password")
+        crypto.prune_key_backups(keep=1)
+        kept = sorted(path.name for path in crypto.keys_dir.glob("backup_*"))
+        assert len(kept) == 2 and kept[0][:-len(".key")] + "_data_keys.json" == kept[1], kept
+        
+        print("✅ Records survive key rotation without re-encryption, even mid-rotation")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Envelope encryption test failed: {e}")
+        return False
+
+def test_backup_roundtrip():
+    """Test snapshot, dedup, verify and restore of a vault"""
+    print("💾 Testing Vault Backup")
+    print("=" * 30)
+    
+    try:
+        import sqlite3
+        from mcp_server import ConversationCoachServer
+        from vault_backup import VaultBackup
+        
+        Path("./test_data").mkdir(exist_ok=True)
+        server = ConversationCoachServer("./test_data/backup_vault")
+        repo = VaultBackup("./test_data/backup_repo", "backup-passphrase")
+        
+        first = repo.backup(server.data_dir)
+        second = repo.backup(server.data_dir)
+        assert second["stats"]["new_chunks"] == 0, "unchanged vault re-stored chunks"
+        assert repo.verify() == []
+        
+        repo.restore("./test_data/backup_restored", force=True)
+        conn = sqlite3.connect("./test_data/backup_restored/conversation_coach.db")
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        conn.close()
+        assert "memories" in tables
+        
+        print(f"✅ Backup verified and restored ({first['stats']['chunks']} chunks)")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Backup test failed: {e}")
+        return False
+
+def test_archive_reclaims_space():
+    """Test that archiving old rows shrinks the hot database"""
+    print("🧊 Testing Archive Space Reclaim")
+    print("=" * 30)
+    
+    try:
+        import shutil
+        import sqlite3
+        from mcp_server import ConversationCoachServer
+        
+        shutil.rmtree("./test_data/archive_vault", ignore_errors=True)
+        vault = ConversationCoachServer("./test_data/archive_vault")
+        assert vault.crypto_manager.setup_first_time("archive-password")
+        
+        conn = sqlite3.connect(vault.db_path)
+        conn.executemany(
+            "INSERT INTO memories (title, content, created_at) VALUES (?, ?, '2000-01-01 00:00:00')",
+            [(f"Old memory {i}", "x" * 2000) for i in range(3000)]
+        )
+        conn.commit()
+        pages_before = conn.execute("PRAGMA page_count").fetchone()[0]
+        conn.close()
+        
+        stats = vault.archive.archive_older_than(vault.db_path, 30)
+        
+        conn = sqlite3.connect(vault.db_path)
+        pages_after = conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        conn.close()
+        vault.close()
+        
+        assert stats["archived"]["memory"] == 3000, stats
+        assert freelist == 0, f"{freelist} pages left on the freelist"
+        assert stats["pages_freed"] > 0
+        assert pages_after < pages_before // 2, f"{pages_before} -> {pages_after} pages"
+        
+        print(f"✅ Archived 3000 rows and freed {stats['pages_freed']} pages")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Archive reclaim test failed: {e!r}")
+        return False
+
+def test_advice_cache():
+    """Test that near-identical situations share cached advice"""
+    print("🧠 Testing Advice Cache")
+    print("=" * 30)
+    
+    try:
+        from advice_cache import AdviceCache
+        
+        cache = AdviceCache(max_entries=2)
+        key = cache.fingerprint("Ask my boss for a raise!", "work", "")
+        assert cache.fingerprint("  ask my BOSS for a raise ", "Work", "") == key
+        assert cache.fingerprint("Ask my boss for a raise!", "family", "") != key
+        
+        cache.put(key, "professional", {"strategy": "Be direct"})
+        assert cache.get(key)["advice"]["strategy"] == "Be direct"
+        
+        # New memories or patterns drop every entry
+        cache.invalidate()
+        assert cache.get(key) is None
+        
+        print("✅ Advice cache normalizes situations and invalidates")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Advice cache test failed: {e}")
+        return False
+
+def test_cached_advice_echo():
+    """Test that a cached answer echoes the current request, not the first one"""
+    print("🪞 Testing Cached Advice Echo")
+    print("=" * 30)
+    
+    import shutil
+    import sqlite3
+    import mcp_server
+    from vault_registry import VaultRegistry
+    
+    shutil.rmtree("./test_data/vaults/erin", ignore_errors=True)
+    shared_registry = mcp_server.vault_registry
+    mcp_server.vault_registry = VaultRegistry("./test_data", mcp_server.ConversationCoachServer)
+    
+    async def advice(situation, context):
+        result = await mcp_server.handle_call_tool("get_conversation_advice", {
+            "user_id": "erin", "situation": situation, "context": context
+        })
+        return json.loads(result[0].text)
+    
+    async def scenario():
+        try:
+            requests = [("Ask my boss for a raise!", "work"), ("  ask my BOSS   for a raise", "Work")]
+            answers = [await advice(situation, context) for situation, context in requests]
+            
+            vault = mcp_server.get_vault("erin")
+            assert vault.advice_cache.hits == 1, "second request should be served from the cache"
+            for (situation, context), answer in zip(requests, answers):
+                assert answer["situation_analysis"]["situation"] == situation, answer["situation_analysis"]
+                assert answer["situation_analysis"]["context"] == context
+            
+            # The logged advice carries each request's own text too
+            assert vault.conversation_log.flush()
+            conn = sqlite3.connect(vault.db_path)
+            for (situation, context), answer in zip(requests, answers):
+                logged, advice_given = conn.execute(
+                    "SELECT situation, advice_given FROM conversations WHERE id = ?",
+                    (answer["conversation_id"],)
+                ).fetchone()
+                assert logged == situation
+                assert json.loads(advice_given)["situation_analysis"]["situation"] == situation
+            conn.close()
+        finally:
+            mcp_server.vault_registry.close_all()
+    
+    try:
+        asyncio.run(scenario())
+        print("✅ Cache hits echo their own situation and context")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Cached advice echo test failed: {e!r}")
+        return False
+    finally:
+        mcp_server.vault_registry = shared_registry
+
+def test_tool_registry():
+    """Test that tool arguments are checked against their schemas up front"""
+    print("🧰 Testing Tool Registry")
+    print("=" * 30)
+    
+    try:
+        from mcp_server import tools
+        
+        names = [tool.name for tool in tools.list_tools()]
+        assert "store_memory" in names and "rotate_encryption_keys" in names
+        
+        search = tools.get("search_memories")
+        assert search.validate({"query": "raise", "limit": 5}) is None
+        assert "query" in search.validate({"limit": 5})
+        assert search.validate({"query": "raise", "limit": "five"}).startswith("limit:")
+        assert tools.get("store_memory").requires_auth
+        assert tools.get("no_such_tool") is None
+        
+        print("✅ Tool registry lists and validates tools")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Tool registry test failed: {e}")
+        return False
+
+def test_history_rollups():
+    """Test that dashboard rollups update incrementally on write"""
+    print("📊 Testing History Rollups")
+    print("=" * 30)
+    
+    try:
+        import sqlite3
+        from datetime import datetime, timezone
+        from crypto_manager import PersonalCryptoManager
+        from history_rollups import HistoryRollups
+        
+        Path("./test_data/rollups").mkdir(parents=True, exist_ok=True)
+        crypto = PersonalCryptoManager("./test_data/rollups")
+        crypto.setup_first_time("test-password")
+        rollups = HistoryRollups(crypto)
+        cursor = sqlite3.connect(":memory:").cursor()
+        HistoryRollups.create_tables(cursor)
+        
+        today = datetime.now(timezone.utc).isoformat()
+        rollups.add_memory(cursor, today, "success")
+        rollups.add_memory(cursor, today, "success")
+        HistoryRollups.add_conversation(cursor, today, "professional")
+        HistoryRollups.set_outcome(cursor, today, "work", 2)
+        # A re-rated conversation replaces its old rating
+        HistoryRollups.set_outcome(cursor, today, "work", 4, previous=(today, "work", 2))
+        
+        stats = rollups.query(cursor, days=7)
+        assert stats["totals"] == {"memories": 2, "conversations": 1, "active_days": 1}
+        assert stats["memories"]["by_type"] == {"success": 2}
+        assert stats["outcomes"]["by_context"]["work"]["average_rating"] == 4
+        
+        print("✅ Rollups count writes and replace re-rated outcomes")
+        return True
+        
+    except Exception as e:
+        print(f"❌ History rollups test failed: {e}")
+        return False
+
+def test_bulk_import_parsing():
+    """Test that browser-mode exports are parsed record by record"""
+    print("📥 Testing Bulk Import Parsing")
+    print("=" * 30)
+    
+    try:
+        import io
+        from bulk_import import iter_export_records
+        
+        def parse(text):
+            # A tiny chunk size forces values to span reads
+            return list(iter_export_records(io.StringIO(text), chunk_size=7))
+        
+        history_export = json.dumps({
+            "memories": [{"text": "raise talk", "tags": ["work"]}],
+            "exportDate": "2025-07-15",
+            "conversations": [{"situation": "apologize", "advice": {}}]
+        }, indent=2)
+        assert [entity for entity, _ in parse(history_export)] == ["memory", "conversation"]
+        
+        local_storage = json.dumps({"whaddyasay_memories": json.dumps([{"text": "a"}, {"text": "b"}])})
+        assert len(parse(local_storage)) == 2
+        
+        ndjson = '{"type": "memory", "data": {"content": "x"}}\n{"situation": "y"}\n12345\n'
+        assert parse(ndjson) == [("memory", {"content": "x"}), ("conversation", {"situation": "y"})]
+        assert parse("[]") == [] and parse("") == []
+        
+        print("✅ History, localStorage and NDJSON exports stream correctly")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Bulk import parsing test failed: {e}")
+        return False
+
+def test_vault_export():
+    """Test that exports decrypt back in order and detect tampering"""
+    print("📤 Testing Vault Export")
+    print("=" * 30)
+    
+    try:
+        from vault_export import ExportSealer, ndjson_bytes, open_export
+        
+        records = [("memory", {"id": 1, "content": "raise talk"}), ("conversation", {"id": 2, "situation": "apologize"})]
+        sealer = ExportSealer("export-passphrase", "ndjson")
+        lines = [sealer.header()] + [sealer.seal(piece, last=index == 1)
+                                     for index, piece in enumerate(ndjson_bytes(records))]
+        
+        plaintext = b"".join(open_export(lines, "export-passphrase"))
+        assert [json.loads(line)["type"] for line in plaintext.splitlines()] == ["memory", "conversation"]
+        
+        for tampered, passphrase in ((lines[:1] + lines[2:], "export-passphrase"),
+                                     (lines[:2], "export-passphrase"),
+                                     (lines, "wrong-passphrase")):
+            try:
+                list(open_export(tampered, passphrase))
+                raise AssertionError("tampered export accepted")
+            except ValueError:
+                pass
+        
+        print("✅ Export round-trips and rejects reordered, truncated or wrong-key input")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Vault export test failed: {e}")
+        return False
+
+def test_inprocess_transport():
+    """Test that the embedded server answers over in-memory streams"""
+    print("🔌 Testing In-Process Transport")
+    print("=" * 30)
+    
+    try:
+        import anyio
+        from mcp import ClientSession
+        from mcp.shared.memory import create_client_server_memory_streams
+        from mcp_server import serve
+        
+        async def session_round_trip():
+            async with create_client_server_memory_streams() as (client_streams, server_streams):
+                async with anyio.create_task_group() as task_group:
+                    task_group.start_soon(serve, *server_streams)
+                    async with ClientSession(*client_streams) as session:
+                        initialized = await session.initialize()
+                        listed = await session.list_tools()
+                    task_group.cancel_scope.cancel()
+            return initialized, listed
+        
+        initialized, listed = asyncio.run(session_round_trip())
+        assert initialized.capabilities.resources.subscribe is True
+        assert "get_security_status" in {tool.name for tool in listed.tools}
+        
+        print(f"✅ Embedded server listed {len(listed.tools)} tools without a subprocess")
+        return True
+        
+    except Exception as e:
+        print(f"❌ In-process transport test failed: {e}")
+        return False
+
+def test_socket_daemon_drain():
+    """Test that a draining daemon finishes in-flight calls and refuses new ones"""
+    print("🔌 Testing Socket Daemon Drain")
+    print("=" * 30)
+    
+    try:
+        import tempfile
+        import anyio
+        import mcp.types as types
+        from mcp import ClientSession
+        from mcp.types import Tool
+        from mcp.server import Server
+        from mcp.shared.exceptions import McpError
+        from socket_transport import SERVER_DRAINING, SocketDaemon, unix_socket_client
+        
+        slow_server = Server("drain-test")
+        
+        @slow_server.list_tools()
+        async def list_slow_tools():
+            return [Tool(name="slow", description="Takes a while", inputSchema={"type": "object"})]
+        
+        @slow_server.call_tool()
+        async def slow_call(name, arguments):
+            await anyio.sleep(0.3)
+            return [types.TextContent(type="text", text="finished")]
+        
+        async def drain_round_trip(socket_path):
+            daemon = SocketDaemon(socket_path, lambda read, write: slow_server.run(
+                read, write, slow_server.create_initialization_options()), drain_seconds=5)
+            async with anyio.create_task_group() as task_group:
+                task_group.start_soon(daemon.serve_forever)
+                while not Path(socket_path).exists():
+                    await anyio.sleep(0.01)
+                
+                async with unix_socket_client(socket_path) as first, unix_socket_client(socket_path) as second:
+                    async with ClientSession(*first) as a, ClientSession(*second) as b:
+                        for session in (a, b):
+                            await session.initialize()
+                            await session.list_tools()  # call_tool validates against these
+                        in_flight = asyncio.create_task(a.call_tool("slow", {}))
+                        await anyio.sleep(0.05)
+                        daemon.stop()
+                        await anyio.sleep(0.05)
+                        try:
+                            await b.call_tool("slow", {})
+                            refused = None
+                        except McpError as e:
+                            refused = e.error.code
+                        finished = (await in_flight).content[0].text
+            return daemon, refused, finished
+        
+        with tempfile.TemporaryDirectory() as scratch:
+            socket_path = str(Path(scratch) / "mcp.sock")
+            daemon, refused, finished = asyncio.run(drain_round_trip(socket_path))
+            assert refused == SERVER_DRAINING, refused
+            assert finished == "finished"
+            assert daemon.sessions_served == 2 and daemon.abandoned_requests == 0
+            assert not Path(socket_path).exists()
+        
+        print("✅ In-flight call finished during drain; new calls were refused")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Socket daemon drain test failed: {e!r}")
+        return False
+
+def test_vault_access():
+    """Test that an unlocked vault only serves the caller that unlocked it"""
+    print("🔑 Testing Vault Access")
+    print("=" * 30)
+    
+    import shutil
+    import mcp_server
+    from vault_registry import VaultRegistry
+    
+    shutil.rmtree("./test_data/vaults/dana", ignore_errors=True)  # Set up fresh each run
+    shared_registry = mcp_server.vault_registry
+    mcp_server.vault_registry = VaultRegistry("./test_data", mcp_server.ConversationCoachServer)
+    
+    async def call(name, arguments):
+        result = await mcp_server.handle_call_tool(name, dict(arguments, user_id="dana"))
+        return json.loads(result[0].text)
+    
+    async def scenario():
+        try:
+            unlocked = await call("authenticate_user", {
+                "master_password": "dana-password", "setup_new": True, "bind_session": False
+            })
+            assert unlocked["authenticated"]
+            
+            # Another caller naming the same user gets neither her data nor a re-key
+            assert (await call("get_history_stats", {}))["error"] == "Access denied"
+            assert (await call("search_memories", {"query": "raise"}))["error"] == "Access denied"
+            rekey = await call("authenticate_user", {"master_password": "stolen-vault", "setup_new": True})
+            assert rekey["error"] == "Access denied"
+            
+            stats = await call("get_history_stats", {"vault_token": unlocked["vault_token"]})
+            assert "error" not in stats
+        finally:
+            mcp_server.vault_registry.close_all()
+    
+    try:
+        asyncio.run(scenario())
+        print("✅ Unlocked vault refuses callers without its session or token")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Vault access test failed: {e!r}")
+        return False
+    finally:
+        mcp_server.vault_registry = shared_registry
+
+def test_asset_fingerprints():
+    """Test that served pages load their scripts by fingerprinted URL"""
+    print("🏷️  Testing Asset Fingerprints")
+    print("=" * 30)
+    
+    try:
+        from flask import Flask
+        from asset_pipeline import AssetManifest
+        
+        assets = AssetManifest(".")
+        app = Flask(__name__)
+        app.add_url_rule("/<path:filename>", "asset", assets.serve)
+        client = app.test_client()
+        
+        page = client.get("/index.html")
+        script_url = assets.to_dict()["pwa-core.js"]
+        assert f'src="{script_url}"'.encode() in page.data
+        assert b'src="pwa-core.js"' not in page.data
+        assert page.headers["Cache-Control"] == "no-cache"  # The page itself revalidates
+        
+        script = client.get(script_url)
+        assert script.status_code == 200
+        assert "immutable" in script.headers["Cache-Control"]
+        
+        print(f"✅ index.html loads {script_url} (immutable)")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Asset fingerprint test failed: {e!r}")
+        return False
+
+def test_vault_watches():
+    """Test that the bridge cache stops listening to vaults it no longer caches"""
+    print("👂 Testing Vault Watches")
+    print("=" * 30)
+    
+    try:
+        import time
+        from resource_events import ResourceEventHub, VaultWatches
+        
+        subscribed = set()
+        hub = ResourceEventHub(subscribe=subscribed.add, unsubscribe=subscribed.discard)
+        watches = VaultWatches(hub, on_event=lambda uri: None)
+        uris = ["memory://personal-memories?user_id=alice"]
+        
+        # Repeated reads share one listener; it lasts as long as the cached result
+        watches.watch("alice", uris, ttl=0.05)
+        watches.watch("alice", uris, ttl=0.05)
+        assert hub.get_stats()["listeners"] == 1
+        assert watches.release_idle() == 0
+        time.sleep(0.06)
+        assert watches.release_idle() == 1
+        assert hub.get_stats()["listeners"] == 0 and not subscribed
+        
+        # Losing the MCP session releases them all; a push client keeps its own
+        watches.watch("alice", uris, ttl=60)
+        browser = hub.listen(uris)
+        watches.release_all()
+        assert len(watches) == 0 and subscribed == set(uris)
+        hub.unlisten(browser)
+        assert hub.get_stats()["listeners"] == 0 and not subscribed
+        
+        print("✅ Idle and disconnected vault watches are released")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Vault watch test failed: {e!r}")
+        return False
+
+def test_bridge_rotate_keys():
+    """Test key rotation through the web bridge without a new password"""
+    print("🌉 Testing Bridge Key Rotation")
+    print("=" * 30)
+    
+    import os
+    import shutil
+    import time
+    import mcp_server
+    from vault_registry import VaultRegistry
+    
+    # The bridge embeds the server, with its vaults kept out of ./data
+    vault_dir = Path("./test_data/bridge").resolve()
+    shutil.rmtree(vault_dir, ignore_errors=True)
+    shared_registry = mcp_server.vault_registry
+    mcp_server.vault_registry = VaultRegistry(str(vault_dir), mcp_server.ConversationCoachServer)
+    transport = os.environ.get("COACH_MCP_TRANSPORT")
+    os.environ["COACH_MCP_TRANSPORT"] = "inprocess"
+    
+    try:
+        import mcp_bridge
+        deadline = time.monotonic() + 10
+        while mcp_bridge.bridge.mcp_session is None and time.monotonic() < deadline:
+            time.sleep(0.1)
+        client = mcp_bridge.app.test_client()
+        
+        setup = client.post("/api/security/setup", json={"master_password": "bridge-password"})
+        assert setup.get_json()["success"]
+        
+        # auth.html leaves new_password out to keep the current one
+        rotated = client.post("/api/security/rotate", json={"current_password": "bridge-password"})
+        assert rotated.status_code == 200 and rotated.get_json()["success"], rotated.get_json()
+        
+        # Optional fields left empty are dropped; numbers typed into a form are converted
+        headers = {"X-Vault-Token": setup.get_json()["vault_token"]}
+        outcome = client.post("/api/conversation/outcome", headers=headers, json={
+            "conversation_id": "999", "outcome": "went fine", "success_rating": "4", "lessons_learned": None
+        })
+        assert outcome.get_json()["error"] != "Invalid arguments", outcome.get_json()
+        rejected = client.post("/api/conversation/outcome", headers=headers, json={
+            "conversation_id": 999, "outcome": "went fine", "success_rating": "great"
+        })
+        assert rejected.status_code == 400 and rejected.get_json()["error"] == "Invalid arguments"
+        
+        print("✅ Keys rotated through the bridge with the current password kept")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Bridge key rotation test failed: {e!r}")
+        return False
+    finally:
+        mcp_server.vault_registry.close_all()
+        mcp_server.vault_registry = shared_registry
+        if transport is None:
+            os.environ.pop("COACH_MCP_TRANSPORT", None)
+        else:
+            os.environ["COACH_MCP_TRANSPORT"] = transport
+
 def test_dependencies():
     """Test if required dependencies are installed"""
     print("📦 Testing Dependencies")
@@ -250,6 +916,86 @@ def main():
         print("\n❌ Database test failed.")
         return
     
+    # Test 2b: Multi-user vaults
+    if not test_vault_registry():
+        print("\n❌ Vault registry test failed.")
+        return
+    
+    # Test 2c: Envelope encryption
+    if not test_envelope_key_rotation():
+        print("\n❌ Envelope encryption test failed.")
+        return
+    
+    # Test 2d: Backup and restore
+    if not test_backup_roundtrip():
+        print("\n❌ Backup test failed.")
+        return
+    
+    # Test 2e: Advice cache
+    if not test_advice_cache():
+        print("\n❌ Advice cache test failed.")
+        return
+    
+    # Test 2f: Tool registry
+    if not test_tool_registry():
+        print("\n❌ Tool registry test failed.")
+        return
+    
+    # Test 2g: History rollups
+    if not test_history_rollups():
+        print("\n❌ History rollups test failed.")
+        return
+    
+    # Test 2h: Bulk import parsing
+    if not test_bulk_import_parsing():
+        print("\n❌ Bulk import parsing test failed.")
+        return
+    
+    # Test 2i: Vault export
+    if not test_vault_export():
+        print("\n❌ Vault export test failed.")
+        return
+    
+    # Test 2j: In-process transport
+    if not test_inprocess_transport():
+        print("\n❌ In-process transport test failed.")
+        return
+    
+    # Test 2k: Socket daemon drain
+    if not test_socket_daemon_drain():
+        print("\n❌ Socket daemon drain test failed.")
+        return
+    
+    # Test 2l: Vault access
+    if not test_vault_access():
+        print("\n❌ Vault access test failed.")
+        return
+    
+    # Test 2m: Asset fingerprints
+    if not test_asset_fingerprints():
+        print("\n❌ Asset fingerprint test failed.")
+        return
+    
+    # Test 2n: Bridge cache vault watches
+    if not test_vault_watches():
+        print("\n❌ Vault watch test failed.")
+        return
+    
+    # Test 2o: Key rotation through the bridge
+    if not test_bridge_rotate_keys():
+        print("\n❌ Bridge key rotation test failed.")
+        return
+    
+    # Test 2p: Archive reclaims space
+    if not test_archive_reclaims_space():
+        print("\n❌ Archive reclaim test failed.")
+        return
+    
+    # Test 2q: Cached advice echo
+    if not test_cached_advice_echo():
+        print("\n❌ Cached advice echo test failed.")
+        return
+    
     # Test 3: Sample data
     if not create_sample_data():
         print("\n❌ Sample data creation failed.")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Declarative Tool Registry
+Tools register with a decorator; each input schema is checked and
+compiled into a validator once, and calls are dispatched by name lookup
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from jsonschema import validators
+from jsonschema.exceptions import best_match
+from mcp.types import Tool
+
+ToolHandler = Callable[..., Awaitable[Any]]
+
+
+class ToolSpec:
+    """One registered tool and its compiled input validator"""
+
+    def __init__(self, name: str, description: str, input_schema: Dict[str, Any],
+                 handler: Optional[ToolHandler], requires_auth: bool, vault_data: bool = True):
+        self.name = name
+        self.description = description
+        self.input_schema = input_schema
+        self.handler = handler
+        self.requires_auth = requires_auth
+        self.vault_data = vault_data
+
+        validator_class = validators.validator_for(input_schema)
+        validator_class.check_schema(input_schema)  # Bad schemas fail at import, not per call
+        self.validator = validator_class(input_schema)
+
+    def validate(self, arguments: Dict[str, Any]) -> Optional[str]:
+        """None when the arguments match the schema, else the most relevant error"""
+        error = best_match(self.validator.iter_errors(arguments))
+        if error is None:
+            return None
+        location = ".".join(str(part) for part in error.absolute_path)
+        return f"{location}: {error.message}" if location else error.message
+
+
+class ToolRegistry:
+    """
+    Name -> ToolSpec, in registration order (which is the list_tools order)
+    - requires_auth tools are refused before the handler runs
+    - vault_data tools (the default) read or write vault contents, so an
+      unlocked vault only serves them to callers it granted access to
+    - declare() lists a tool that has no server-side handler yet
+    """
+
+    def __init__(self):
+        self._tools: Dict[str, ToolSpec] = {}
+        self._listing: Optional[List[Tool]] = None
+
+    def tool(self, name: str, description: str, input_schema: Dict[str, Any],
+             requires_auth: bool = False, vault_data: bool = True):
+        def decorator(handler: ToolHandler) -> ToolHandler:
+            self._add(name, description, input_schema, handler, requires_auth, vault_data)
+            return handler
+        return decorator
+
+    def declare(self, name: str, description: str, input_schema: Dict[str, Any]):
+        self._add(name, description, input_schema, None, False)
+
+    def _add(self, name, description, input_schema, handler, requires_auth, vault_data=True):
+        if name in self._tools:
+            raise ValueError(f"Tool registered twice: {name}")
+        self._tools[name] = ToolSpec(name, description, input_schema, handler, requires_auth, vault_data)
+        self._listing = None
+
+    def get(self, name: str) -> Optional[ToolSpec]:
+        return self._tools.get(name)
+
+    def list_tools(self) -> List[Tool]:
+        if self._listing is None:
+            self._listing = [
+                Tool(name=spec.name, description=spec.description, inputSchema=spec.input_schema)
+                for spec in self._tools.values()
+            ]
+        return self._listing
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Cold Storage Tier
+Moves old memories and advice sessions out of the hot database into a
+compressed, encrypted archive database that is attached only on demand
+"""
+
+import json
+import sqlite3
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Entity name -> hot table
+ARCHIVED_TABLES = {
+    "memory": "memories",
+    "conversation": "conversations",
+}
+
+# Rows moved per transaction (keeps write locks short)
+ARCHIVE_BATCH_SIZE = 500
+
+# SQLite auto_vacuum mode value for INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+class ArchiveTier:
+    """
+    Archive database for one vault
+    - Rows keep their original IDs (conversation_id, change log references)
+    - Each row is stored as zlib-compressed JSON, encrypted with the vault key
+    - Only created_at stays in plaintext so history queries can page by age
+    """
+
+    def __init__(self, data_dir: Path, crypto_manager):
+        self.archive_path = Path(data_dir) / "archive.db"
+        self.crypto_manager = crypto_manager
+
+    def attach(self, conn: sqlite3.Connection):
+        """Attach the archive to a hot-database connection as 'archive'"""
+        conn.execute("ATTACH DATABASE ? AS archive", (str(self.archive_path),))
+        for table in ARCHIVED_TABLES.values():
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS archive.{table} (
+                    id INTEGER PRIMARY KEY,
+                    created_at TEXT,
+                    payload TEXT NOT NULL  -- encrypted, compressed JSON row
+                )
+            ''')
+            conn.execute(f'''
+                CREATE INDEX IF NOT EXISTS archive.idx_{table}_created ON {table}(created_at)
+            ''')
+
+    def archive_older_than(self, db_path: Path, days: int) -> Dict[str, Any]:
+        """Move rows older than `days` to the archive, then reclaim space"""
+        conn = sqlite3.connect(db_path)
+        stats = {"archived": {}, "pages_freed": 0}
+
+        try:
+            ensure_incremental_vacuum(conn)
+            self.attach(conn)
+
+            for entity, table in ARCHIVED_TABLES.items():
+                moved = 0
+                while True:
+                    cursor = conn.execute(f'''
+                        SELECT * FROM main.{table}
+                        WHERE created_at < datetime('now', ?)
+                        ORDER BY id LIMIT ?
+                    ''', (f"-{int(days)} days", ARCHIVE_BATCH_SIZE))
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+
+                    columns = [desc[0] for desc in cursor.description]
+                    archived = [
+                        (row[0], row[columns.index("created_at")], self._seal(dict(zip(columns, row))))
+                        for row in rows
+                    ]
+
+                    # One transaction covers both databases (atomic commit)
+                    conn.executemany(
+                        f"INSERT OR REPLACE INTO archive.{table} (id, created_at, payload) VALUES (?, ?, ?)",
+                        archived
+                    )
+                    conn.executemany(f"DELETE FROM main.{table} WHERE id = ?", [(row[0],) for row in rows])
+                    conn.commit()
+                    moved += len(rows)
+
+                stats["archived"][entity] = moved
+
+            freelist = conn.execute("PRAGMA main.freelist_count").fetchone()[0]
+            # execute() steps the pragma once (one page) - executescript runs it to completion
+            conn.executescript("PRAGMA main.incremental_vacuum;")
+            stats["pages_freed"] = freelist - conn.execute("PRAGMA main.freelist_count").fetchone()[0]
+            return stats
+
+        finally:
+            conn.close()
+
+    def fetch(self, db_path: Path, entity: str, entity_id: int) -> Optional[Dict[str, Any]]:
+        """Read one archived row"""
+        if not self.archive_path.exists():
+            return None
+
+        conn = sqlite3.connect(db_path)
+        try:
+            self.attach(conn)
+            row = conn.execute(
+                f"SELECT payload FROM archive.{ARCHIVED_TABLES[entity]} WHERE id = ?", (entity_id,)
+            ).fetchone()
+            return self._open(row[0]) if row else None
+        finally:
+            conn.close()
+
+    def recent(self, db_path: Path, entity: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Newest archived rows first, for history views"""
+        if not self.archive_path.exists():
+            return []
+
+        conn = sqlite3.connect(db_path)
+        try:
+            self.attach(conn)
+            rows = conn.execute(
+                f"SELECT payload FROM archive.{ARCHIVED_TABLES[entity]} ORDER BY created_at DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+            return [self._open(row[0]) for row in rows]
+        finally:
+            conn.close()
+
+    def page(self, db_path: Path, entity: str, after_id: int, limit: int) -> List[Dict[str, Any]]:
+        """Archived rows in ID order after after_id (keyset paging, e.g. for exports)"""
+        if not self.archive_path.exists():
+            return []
+
+        conn = sqlite3.connect(db_path)
+        try:
+            self.attach(conn)
+            rows = conn.execute(
+                f"SELECT payload FROM archive.{ARCHIVED_TABLES[entity]} WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, limit)
+            ).fetchall()
+            return [self._open(row[0]) for row in rows]
+        finally:
+            conn.close()
+
+    def _seal(self, row: Dict[str, Any]) -> str:
+        return self.crypto_manager.encrypt_bytes(zlib.compress(json.dumps(row).encode(), 9))
+
+    def _open(self, payload: str) -> Dict[str, Any]:
+        row = json.loads(zlib.decompress(self.crypto_manager.decrypt_bytes(payload)))
+        row["archived"] = True
+        return row
+
+
+def ensure_incremental_vacuum(conn: sqlite3.Connection):
+    """Switch a database to incremental auto-vacuum (one full VACUUM if needed)"""
+    mode = conn.execute("PRAGMA main.auto_vacuum").fetchone()[0]
+    if mode != AUTO_VACUUM_INCREMENTAL:
+        conn.execute("PRAGMA main.auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Vault Backup Tool
+Consistent online snapshots of a vault, stored as compressed, encrypted,
+content-addressed chunks so unchanged pages are never stored twice
+
+Usage:
+    python vault_backup.py backup  --repo ./backups [--user alice] [--prune-key-backups 3]
+    python vault_backup.py list    --repo ./backups
+    python vault_backup.py verify  --repo ./backups [--snapshot ID]
+    python vault_backup.py restore --repo ./backups --target ./restored [--snapshot ID]
+"""
+
+import argparse
+import base64
+import getpass
+import hashlib
+import hmac
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+from vault_registry import VaultRegistry, DEFAULT_USER_ID
+
+# 16 SQLite pages per chunk - unchanged page ranges dedupe across snapshots
+CHUNK_SIZE = 64 * 1024
+# Pages copied per online backup step (writers proceed between steps)
+BACKUP_STEP_PAGES = 256
+
+# Never archived: live journals, temp files and other users' vaults
+SKIPPED_SUFFIXES = {'.db-journal', '.db-wal', '.db-shm', '.tmp'}
+SKIPPED_DIRS = {'vaults'}
+
+
+class VaultBackup:
+    """
+    Backup repository for one vault
+    - repo.json: KDF salt and chunking parameters
+    - chunks/: zlib-compressed, Fernet-encrypted chunks named by keyed hash
+    - snapshots/: encrypted manifests listing each file's chunks
+    """
+
+    def __init__(self, repo_dir: str, passphrase: str):
+        self.repo_dir = Path(repo_dir)
+        self.chunks_dir = self.repo_dir / "chunks"
+        self.snapshots_dir = self.repo_dir / "snapshots"
+        self.repo_file = self.repo_dir / "repo.json"
+
+        repo_info = self._load_or_create_repo()
+        key = self._derive_key(passphrase, base64.b64decode(repo_info["salt"]))
+        self.fernet = Fernet(base64.urlsafe_b64encode(key))
+        # Separate key for chunk names so they reveal nothing about content
+        self.chunk_id_key = hmac.new(key, b"chunk-id", hashlib.sha256).digest()
+
+        # Fail fast on a wrong passphrase rather than writing unreadable chunks
+        if "check" in repo_info:
+            try:
+                self.fernet.decrypt(repo_info["check"].encode())
+            except Exception:
+                raise ValueError("Wrong backup passphrase for this repository")
+        else:
+            repo_info["check"] = self.fernet.encrypt(b"vault-backup").decode()
+            self._write_json(self.repo_file, repo_info)
+
+    def _load_or_create_repo(self) -> Dict[str, Any]:
+        if self.repo_file.exists():
+            with open(self.repo_file, 'r') as f:
+                return json.load(f)
+
+        self.chunks_dir.mkdir(parents=True, exist_ok=True)
+        self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+        os.chmod(self.repo_dir, 0o700)
+        return {
+            "version": 1,
+            "salt": base64.b64encode(os.urandom(32)).decode(),
+            "chunk_size": CHUNK_SIZE,
+            "created_at": datetime.now().isoformat()
+        }
+
+    @staticmethod
+    def _derive_key(passphrase: str, salt: bytes) -> bytes:
+        kdf = PBKDF2HMAC(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=salt,
+            iterations=100000,
+        )
+        return kdf.derive(passphrase.encode())
+
+    @staticmethod
+    def _write_json(path: Path, data: Dict[str, Any]):
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, path)
+
+    # ------------------------------------------------------------------
+    # Backup
+    # ------------------------------------------------------------------
+
+    def backup(self, data_dir: str) -> Dict[str, Any]:
+        """Snapshot every file in a vault directory"""
+        data_dir = Path(data_dir)
+        snapshot_id = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        stats = {"files": 0, "bytes": 0, "chunks": 0, "new_chunks": 0, "new_bytes": 0}
+        files = []
+
+        for path in self._vault_files(data_dir):
+            relative = path.relative_to(data_dir).as_posix()
+            if path.suffix == ".db":
+                # Consistent copy via the online backup API, then chunk the copy
+                with tempfile.TemporaryDirectory() as tmp_dir:
+                    copy_path = Path(tmp_dir) / path.name
+                    online_copy(path, copy_path)
+                    files.append(self._store_file(copy_path, relative, stats))
+            else:
+                files.append(self._store_file(path, relative, stats))
+
+        manifest = {
+            "snapshot_id": snapshot_id,
+            "created_at": datetime.now().isoformat(),
+            "source": str(data_dir),
+            "files": files,
+            "stats": stats
+        }
+        encrypted = self.fernet.encrypt(json.dumps(manifest).encode())
+        snapshot_file = self.snapshots_dir / f"{snapshot_id}.enc"
+        with open(snapshot_file, 'wb') as f:
+            f.write(encrypted)
+        os.chmod(snapshot_file, 0o600)
+
+        return manifest
+
+    def _vault_files(self, data_dir: Path) -> Iterator[Path]:
+        for root, dirs, names in os.walk(data_dir):
+            dirs[:] = sorted(d for d in dirs if d not in SKIPPED_DIRS)
+            for name in sorted(names):
+                path = Path(root) / name
+                if not any(name.endswith(suffix) for suffix in SKIPPED_SUFFIXES):
+                    yield path
+
+    def _store_file(self, path: Path, relative: str, stats: Dict[str, int]) -> Dict[str, Any]:
+        """Chunk, dedupe, compress and encrypt one file (streaming)"""
+        file_hash = hashlib.sha256()
+        chunk_ids = []
+        size = 0
+
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                file_hash.update(chunk)
+                size += len(chunk)
+
+                chunk_id = hmac.new(self.chunk_id_key, chunk, hashlib.sha256).hexdigest()
+                chunk_ids.append(chunk_id)
+                stats["chunks"] += 1
+
+                chunk_path = self._chunk_path(chunk_id)
+                if not chunk_path.exists():
+                    chunk_path.parent.mkdir(exist_ok=True)
+                    encrypted = self.fernet.encrypt(zlib.compress(chunk, 6))
+                    tmp_path = chunk_path.with_suffix(".tmp")
+                    with open(tmp_path, 'wb') as out:
+                        out.write(encrypted)
+                    os.replace(tmp_path, chunk_path)
+                    stats["new_chunks"] += 1
+                    stats["new_bytes"] += len(encrypted)
+
+        stats["files"] += 1
+        stats["bytes"] += size
+        return {"path": relative, "size": size, "sha256": file_hash.hexdigest(), "chunks": chunk_ids}
+
+    def _chunk_path(self, chunk_id: str) -> Path:
+        return self.chunks_dir / chunk_id[:2] / chunk_id
+
+    # ------------------------------------------------------------------
+    # Snapshots, restore and verify
+    # ------------------------------------------------------------------
+
+    def list_snapshots(self) -> List[str]:
+        return sorted(path.stem for path in self.snapshots_dir.glob("*.enc"))
+
+    def load_manifest(self, snapshot_id: Optional[str] = None) -> Dict[str, Any]:
+        """Load a snapshot manifest (latest by default)"""
+        snapshots = self.list_snapshots()
+        if not snapshots:
+            raise ValueError("No snapshots in repository")
+        snapshot_id = snapshot_id or snapshots[-1]
+        if snapshot_id not in snapshots:
+            raise ValueError(f"Unknown snapshot: {snapshot_id}")
+
+        with open(self.snapshots_dir / f"{snapshot_id}.enc", 'rb') as f:
+            return json.loads(self.fernet.decrypt(f.read()))
+
+    def _read_chunk(self, chunk_id: str) -> bytes:
+        chunk_path = self._chunk_path(chunk_id)
+        if not chunk_path.exists():
+            raise ValueError(f"Chunk {chunk_id} is missing")
+        try:
+            with open(chunk_path, 'rb') as f:
+                chunk = zlib.decompress(self.fernet.decrypt(f.read()))
+        except (InvalidToken, zlib.error):
+            raise ValueError(f"Chunk {chunk_id} could not be decrypted")
+        if not hmac.compare_digest(hmac.new(self.chunk_id_key, chunk, hashlib.sha256).hexdigest(), chunk_id):
+            raise ValueError(f"Chunk {chunk_id} is corrupt")
+        return chunk
+
+    def _write_file(self, entry: Dict[str, Any], target: Path):
+        """Reassemble one file from its chunks and check its hash"""
+        target.parent.mkdir(parents=True, exist_ok=True)
+        file_hash = hashlib.sha256()
+        with open(target, 'wb') as f:
+            for chunk_id in entry["chunks"]:
+                chunk = self._read_chunk(chunk_id)
+                file_hash.update(chunk)
+                f.write(chunk)
+        if file_hash.hexdigest() != entry["sha256"]:
+            raise ValueError(f"Restored {entry['path']} does not match its snapshot hash")
+
+    def restore(self, target_dir: str, snapshot_id: Optional[str] = None, force: bool = False) -> Dict[str, Any]:
+        """Restore a snapshot into a directory"""
+        manifest = self.load_manifest(snapshot_id)
+        target_dir = Path(target_dir)
+        if target_dir.exists() and any(target_dir.iterdir()) and not force:
+            raise ValueError(f"{target_dir} is not empty (use --force to overwrite)")
+
+        for entry in manifest["files"]:
+            target = target_dir / entry["path"]
+            self._write_file(entry, target)
+            if target.parent.name == "keys":
+                os.chmod(target, 0o600)
+
+        return manifest
+
+    def verify(self, snapshot_id: Optional[str] = None) -> List[str]:
+        """Check every chunk of a snapshot and the integrity of its databases"""
+        manifest = self.load_manifest(snapshot_id)
+        problems = []
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for entry in manifest["files"]:
+                target = Path(tmp_dir) / entry["path"]
+                try:
+                    self._write_file(entry, target)
+                except Exception as e:
+                    problems.append(f"{entry['path']}: {e}")
+                    continue
+
+                if target.suffix == ".db":
+                    conn = sqlite3.connect(target)
+                    try:
+                        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+                    finally:
+                        conn.close()
+                    if result != "ok":
+                        problems.append(f"{entry['path']}: integrity check failed: {result}")
+
+        return problems
+
+
+def online_copy(source: Path, destination: Path):
+    """Copy a live SQLite database without blocking its writers"""
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(destination)
+    try:
+        src.backup(dst, pages=BACKUP_STEP_PAGES, sleep=0.005)
+    finally:
+        dst.close()
+        src.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Encrypted, deduplicated vault backups")
+    parser.add_argument("command", choices=["backup", "list", "verify", "restore"])
+    parser.add_argument("--repo", required=True, help="Backup repository directory")
+    parser.add_argument("--data-dir", default="./data", help="Server data directory")
+    parser.add_argument("--user", default=DEFAULT_USER_ID, help="Vault owner to back up")
+    parser.add_argument("--snapshot", help="Snapshot ID (default: latest)")
+    parser.add_argument("--target", help="Restore target directory")
+    parser.add_argument("--force", action="store_true", help="Restore into a non-empty directory")
+    parser.add_argument("--prune-key-backups", type=int, metavar="KEEP",
+                        help="After backup, keep only the newest KEEP rotated key backups")
+    args = parser.parse_args()
+
+    passphrase = os.environ.get("VAULT_BACKUP_PASSPHRASE") or getpass.getpass("Backup passphrase: ")
+
+    try:
+        repo = VaultBackup(args.repo, passphrase)
+
+        if args.command == "backup":
+            vault_dir = VaultRegistry(args.data_dir).vault_dir(args.user)
+            manifest = repo.backup(vault_dir)
+            stats = manifest["stats"]
+            print(f"✅ Snapshot {manifest['snapshot_id']}: {stats['files']} files, "
+                  f"{stats['bytes']} bytes, {stats['new_chunks']}/{stats['chunks']} new chunks "
+                  f"({stats['new_bytes']} bytes written)")
+
+            if args.prune_key_backups is not None:
+                from crypto_manager import PersonalCryptoManager
+                removed = PersonalCryptoManager(str(vault_dir)).prune_key_backups(args.prune_key_backups)
+                print(f"🧹 Removed {len(removed)} old key backups (now in snapshot)")
+
+        elif args.command == "list":
+            for snapshot_id in repo.list_snapshots():
+                print(snapshot_id)
+
+        elif args.command == "verify":
+            problems = repo.verify(args.snapshot)
+            for problem in problems:
+                print(f"❌ {problem}")
+            if problems:
+                sys.exit(1)
+            print("✅ Snapshot verified")
+
+        elif args.command == "restore":
+            if not args.target:
+                parser.error("restore requires --target")
+            manifest = repo.restore(args.target, args.snapshot, args.force)
+            print(f"✅ Restored snapshot {manifest['snapshot_id']} to {args.target}")
+
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+Vault Export
+Portable, passphrase-protected export of a whole vault: memories and
+conversations are decrypted page by page, written as NDJSON (or a tar
+of NDJSON parts plus media files) and re-encrypted chunk by chunk, so
+the export streams in constant memory
+
+Container format (text, one item per line):
+    {"format": "whadyasay-export", "version": 1, "content": "ndjson", "salt": ...}
+    <Fernet token>   one per chunk: seq (8 bytes) + last flag (1 byte) + zlib data
+    ...
+
+Usage:
+    python vault_export.py export  --out export.wsx [--user alice] [--format tar]
+    python vault_export.py decrypt --in export.wsx --out export.ndjson
+"""
+
+import argparse
+import base64
+import getpass
+import json
+import os
+import sqlite3
+import struct
+import sys
+import tarfile
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+# cryptography is imported inside the functions that use it, so importing
+# this module (the server does, at startup) doesn't load it
+
+from vault_archive import ARCHIVED_TABLES, ArchiveTier
+from vault_registry import VaultRegistry, DEFAULT_USER_ID
+
+EXPORT_FORMAT = "whadyasay-export"
+EXPORT_VERSION = 1
+EXPORT_CONTENTS = ("ndjson", "tar")
+
+# Plaintext bytes per encrypted chunk
+EXPORT_CHUNK_SIZE = 256 * 1024
+# Rows read per query (no read transaction is held between pages)
+EXPORT_PAGE_SIZE = 500
+# NDJSON bytes per tar member (tar headers need the size up front)
+TAR_PART_SIZE = 1024 * 1024
+KDF_ITERATIONS = 100000
+
+# Unfinished exports are dropped after this long without a pull
+EXPORT_IDLE_SECONDS = 300
+MAX_ACTIVE_EXPORTS = 4
+
+_FRAME = struct.Struct(">QB")
+_TAR_BLOCK = tarfile.BLOCKSIZE
+
+
+def derive_export_key(passphrase: str, salt: bytes) -> bytes:
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        iterations=KDF_ITERATIONS,
+    )
+    return base64.urlsafe_b64encode(kdf.derive(passphrase.encode()))
+
+
+class ExportSealer:
+    """Encrypts one export's chunks under a key derived from the passphrase"""
+
+    def __init__(self, passphrase: str, content: str):
+        from cryptography.fernet import Fernet
+
+        self.salt = os.urandom(16)
+        self.content = content
+        self.fernet = Fernet(derive_export_key(passphrase, self.salt))
+        self.seq = 0
+
+    def header(self) -> str:
+        return json.dumps({
+            "format": EXPORT_FORMAT,
+            "version": EXPORT_VERSION,
+            "content": self.content,
+            "kdf": "pbkdf2-sha256",
+            "iterations": KDF_ITERATIONS,
+            "salt": base64.b64encode(self.salt).decode(),
+            "created_at": datetime.now().isoformat()
+        })
+
+    def seal(self, data: bytes, last: bool) -> str:
+        frame = _FRAME.pack(self.seq, 1 if last else 0) + zlib.compress(data, 6)
+        self.seq += 1
+        return self.fernet.encrypt(frame).decode()
+
+
+def open_export(lines: Iterable[str], passphrase: str) -> Iterator[bytes]:
+    """
+    Decrypt an export's lines back to its plaintext, chunk by chunk
+    Raises ValueError on a wrong passphrase, reordered or missing chunks
+    """
+    from cryptography.fernet import Fernet, InvalidToken
+
+    lines = iter(lines)
+    try:
+        header = json.loads(next(lines))
+    except (StopIteration, ValueError):
+        raise ValueError("Not a vault export")
+    if header.get("format") != EXPORT_FORMAT or header.get("version") != EXPORT_VERSION:
+        raise ValueError("Not a vault export (or an unsupported version)")
+    fernet = Fernet(derive_export_key(passphrase, base64.b64decode(header["salt"])))
+
+    expected = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            frame = fernet.decrypt(line.encode())
+        except InvalidToken:
+            raise ValueError("Wrong export passphrase or corrupted export")
+        seq, last = _FRAME.unpack_from(frame)
+        if seq != expected:
+            raise ValueError(f"Export chunk {expected} is missing")
+        expected += 1
+        yield zlib.decompress(frame[_FRAME.size:])
+        if last:
+            return
+    raise ValueError("Export is truncated")
+
+
+# --- Reading the vault ---
+
+def iter_vault_records(db_path: Path, crypto_manager, archive) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    (entity, decrypted row) for every memory and conversation, hot rows
+    then archived ones, keyset-paged so writers are never blocked for long
+    """
+    for entity, table in ARCHIVED_TABLES.items():
+        last_id = 0
+        while True:
+            conn = sqlite3.connect(db_path)
+            try:
+                cursor = conn.execute(f"SELECT * FROM {table} WHERE id > ? ORDER BY id LIMIT ?",
+                                      (last_id, EXPORT_PAGE_SIZE))
+                columns = [desc[0] for desc in cursor.description]
+                rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            finally:
+                conn.close()
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+            for row in rows:
+                yield entity, _decrypted(entity, row, crypto_manager)
+
+        last_id = 0
+        while True:
+            rows = archive.page(db_path, entity, last_id, EXPORT_PAGE_SIZE)
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+            for row in rows:
+                yield entity, _decrypted(entity, row, crypto_manager)
+
+
+def _decrypted(entity: str, row: Dict[str, Any], crypto_manager) -> Dict[str, Any]:
+    if entity == "memory" and row.get("title") == "ENCRYPTED":
+        try:
+            fields = crypto_manager.decrypt_data(row["content"])
+        except Exception:
+            fields = {"undecryptable": True}  # Written under a key this vault no longer has
+        row = dict({key: row[key] for key in ("id", "created_at", "archived") if key in row}, **fields)
+    row.setdefault("archived", False)
+    return row
+
+
+# --- Plaintext encodings ---
+
+def ndjson_bytes(records: Iterable[Tuple[str, Dict[str, Any]]]) -> Iterator[bytes]:
+    """One sync-style change per line - the same shape /api/import reads"""
+    for entity, record in records:
+        yield (json.dumps({"type": entity, "data": record}, default=str) + "\n").encode()
+
+
+def _tar_header(name: str, size: int) -> bytes:
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = int(time.time())
+    info.mode = 0o600
+    return info.tobuf(format=tarfile.PAX_FORMAT)
+
+
+def _tar_member(name: str, data: bytes) -> Iterator[bytes]:
+    yield _tar_header(name, len(data))
+    yield data
+    yield b"\0" * (-len(data) % _TAR_BLOCK)
+
+
+def _tar_file(name: str, path: Path) -> Iterator[bytes]:
+    size = path.stat().st_size
+    yield _tar_header(name, size)
+    with open(path, "rb") as f:
+        remaining = size
+        while remaining > 0:
+            block = f.read(min(EXPORT_CHUNK_SIZE, remaining))
+            if not block:
+                raise ValueError(f"{path} shrank while being exported")
+            remaining -= len(block)
+            yield block
+    yield b"\0" * (-size % _TAR_BLOCK)
+
+
+def tar_bytes(records: Iterable[Tuple[str, Dict[str, Any]]], include_media: bool = True) -> Iterator[bytes]:
+    """
+    Streamed tar: NDJSON parts (memories/part-00001.ndjson, ...) plus each
+    memory's uploaded audio/photo under media/<memory id>/
+    """
+    from media_jobs import UnsupportedMedia, resolve_upload
+
+    parts: Dict[str, int] = {}
+    buffered: Dict[str, List[bytes]] = {}
+    sizes: Dict[str, int] = {}
+
+    def flush(entity: str) -> Iterator[bytes]:
+        parts[entity] = parts.get(entity, 0) + 1
+        data = b"".join(buffered.pop(entity))
+        sizes[entity] = 0
+        yield from _tar_member(f"{ARCHIVED_TABLES[entity]}/part-{parts[entity]:05d}.ndjson", data)
+
+    for entity, record in records:
+        if include_media and entity == "memory":
+            media = []
+            for field in ("audio_path", "photo_path"):
+                if not record.get(field):
+                    continue
+                try:
+                    path = resolve_upload(record[field])
+                except UnsupportedMedia:
+                    continue  # Missing or not an upload - the record still says where it was
+                name = f"media/{record['id']}/{path.name}"
+                media.append(name)
+                yield from _tar_file(name, path)
+            if media:
+                record = dict(record, media=media)
+
+        line = (json.dumps({"type": entity, "data": record}, default=str) + "\n").encode()
+        buffered.setdefault(entity, []).append(line)
+        sizes[entity] = sizes.get(entity, 0) + len(line)
+        if sizes[entity] >= TAR_PART_SIZE:
+            yield from flush(entity)
+
+    for entity in list(buffered):
+        yield from flush(entity)
+    yield b"\0" * (2 * _TAR_BLOCK)
+
+
+def _rechunk(pieces: Iterable[bytes], size: int) -> Iterator[Tuple[bytes, bool]]:
+    """(chunk, is_last) of about `size` bytes from a byte stream"""
+    pending: List[bytes] = []
+    pending_size = 0
+    ready = None
+    for piece in pieces:
+        pending.append(piece)
+        pending_size += len(piece)
+        if pending_size >= size:
+            if ready is not None:
+                yield ready, False
+            ready = b"".join(pending)
+            pending, pending_size = [], 0
+    if pending:
+        if ready is not None:
+            yield ready, False
+        ready = b"".join(pending)
+    yield ready or b"", True
+
+
+def export_lines(db_path: Path, crypto_manager, archive, passphrase: str,
+                 content: str = "ndjson", include_media: bool = True) -> Iterator[str]:
+    """The export as container lines: the header, then one sealed chunk per line"""
+    if content not in EXPORT_CONTENTS:
+        raise ValueError(f"Unknown export format: {content}")
+    sealer = ExportSealer(passphrase, content)
+    yield sealer.header()
+
+    records = iter_vault_records(db_path, crypto_manager, archive)
+    pieces = ndjson_bytes(records) if content == "ndjson" else tar_bytes(records, include_media)
+    for chunk, last in _rechunk(pieces, EXPORT_CHUNK_SIZE):
+        yield sealer.seal(chunk, last)
+
+
+class ExportSessions:
+    """
+    Exports being pulled a few chunks at a time (e.g. one HTTP download
+    across many tool calls); each keeps only its generator's state
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._exports: Dict[str, Dict[str, Any]] = {}
+        self.started = 0
+        self.completed = 0
+        self.expired = 0
+
+    def start(self, lines: Iterator[str]) -> str:
+        with self._lock:
+            self._expire()
+            if len(self._exports) >= MAX_ACTIVE_EXPORTS:
+                raise ValueError("Too many exports in progress - try again shortly")
+            export_id = uuid.uuid4().hex
+            self._exports[export_id] = {"lines": lines, "lock": threading.Lock(), "used": time.monotonic()}
+            self.started += 1
+            return export_id
+
+    def pull(self, export_id: str, max_lines: int) -> Tuple[List[str], bool]:
+        """Next lines of an export and whether it is finished (blocking; run off the loop)"""
+        with self._lock:
+            self._expire()
+            export = self._exports.get(export_id)
+        if export is None:
+            raise ValueError("Unknown or expired export")
+
+        with export["lock"]:
+            lines = []
+            done = False
+            try:
+                for line in export["lines"]:
+                    lines.append(line)
+                    if len(lines) >= max_lines:
+                        break
+                else:
+                    done = True
+            except Exception:
+                self.cancel(export_id)  # A half-written export can't be continued
+                raise
+            export["used"] = time.monotonic()
+
+        if done:
+            self.cancel(export_id)
+            self.completed += 1
+        return lines, done
+
+    def cancel(self, export_id: str):
+        with self._lock:
+            export = self._exports.pop(export_id, None)
+        if export is not None:
+            export["lines"].close()
+
+    def active(self) -> int:
+        """Exports started and not yet finished, cancelled or expired"""
+        with self._lock:
+            self._expire()
+            return len(self._exports)
+
+    def _expire(self):
+        now = time.monotonic()
+        for export_id, export in list(self._exports.items()):
+            if now - export["used"] > EXPORT_IDLE_SECONDS and not export["lock"].locked():
+                del self._exports[export_id]
+                export["lines"].close()
+                self.expired += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "active": len(self._exports),
+                "started": self.started,
+                "completed": self.completed,
+                "expired": self.expired
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Portable encrypted vault exports")
+    parser.add_argument("command", choices=["export", "decrypt"])
+    parser.add_argument("--data-dir", default="./data", help="Server data directory")
+    parser.add_argument("--user", default=DEFAULT_USER_ID, help="Vault owner to export")
+    parser.add_argument("--format", choices=EXPORT_CONTENTS, default="ndjson", help="Export content")
+    parser.add_argument("--no-media", action="store_true", help="Leave uploaded media out of tar exports")
+    parser.add_argument("--in", dest="input", help="Export to decrypt")
+    parser.add_argument("--out", required=True, help="Output file")
+    args = parser.parse_args()
+
+    passphrase = os.environ.get("VAULT_EXPORT_PASSPHRASE") or getpass.getpass("Export passphrase: ")
+
+    try:
+        if args.command == "export":
+            from crypto_manager import PersonalCryptoManager
+
+            vault_dir = VaultRegistry(args.data_dir).vault_dir(args.user)
+            crypto_manager = PersonalCryptoManager(str(vault_dir))
+            if not crypto_manager.authenticate(getpass.getpass("Vault master password: ")):
+                sys.exit(1)
+            lines = export_lines(vault_dir / "conversation_coach.db", crypto_manager,
+                                 ArchiveTier(vault_dir, crypto_manager), passphrase,
+                                 args.format, not args.no_media)
+            with open(args.out, "w") as f:
+                for count, line in enumerate(lines):
+                    f.write(line + "\n")
+            os.chmod(args.out, 0o600)
+            print(f"✅ Exported {count} chunks to {args.out}")
+
+        elif args.command == "decrypt":
+            if not args.input:
+                parser.error("decrypt requires --in")
+            with open(args.input, "r") as f, open(args.out, "wb") as out:
+                for chunk in open_export(f, passphrase):
+                    out.write(chunk)
+            os.chmod(args.out, 0o600)
+            print(f"✅ Decrypted {args.input} to {args.out}")
+
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
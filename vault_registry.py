@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Vault Registry
+Maps user IDs to per-user vaults (database + encryption keys)
+Unlocked vaults stay resident up to a memory budget, then are evicted LRU
+"""
+
+import re
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+DEFAULT_USER_ID = "default"
+USER_ID_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+# Default budget for resident vaults - roughly a few thousand idle vaults
+# (footprints are the vaults' own fixed estimates, not measured memory)
+DEFAULT_MEMORY_BUDGET_BYTES = 64 * 1024 * 1024
+
+# Users whose unlocked vault was evicted, remembered so their next call can
+# be told to re-authenticate (oldest forgotten first)
+MAX_UNLOADED_TRACKED = 1024
+
+
+class VaultRegistry:
+    """
+    Registry of per-user vaults
+    - The default user keeps the legacy ./data layout
+    - Every other user gets ./data/vaults/<user_id>/
+    - Resident vaults are tracked in LRU order and evicted (locked and
+      dropped) once their combined footprint exceeds the memory budget;
+      the footprint is an approximation reported by each vault, so the
+      budget bounds memory only roughly
+    - Vaults that are busy (calls running, exports part-way) are skipped
+      and evicted on a later pass
+    - Evicting an unlocked vault is remembered (see was_unloaded) until
+      its owner unlocks it again
+    """
+
+    def __init__(self, data_dir: str = "./data",
+                 vault_factory: Optional[Callable[[str], Any]] = None,
+                 memory_budget_bytes: int = DEFAULT_MEMORY_BUDGET_BYTES):
+        self.data_dir = Path(data_dir)
+        self.vaults_dir = self.data_dir / "vaults"
+        self.vault_factory = vault_factory
+        self.memory_budget_bytes = memory_budget_bytes
+
+        self._vaults: "OrderedDict[str, Any]" = OrderedDict()
+        self._footprints: Dict[str, int] = {}
+        self._resident_bytes = 0  # Running total of _footprints
+        self._unloaded: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.evictions = 0
+
+    def vault_dir(self, user_id: str) -> Path:
+        """Resolve the data directory for a user ID"""
+        if user_id == DEFAULT_USER_ID:
+            return self.data_dir
+
+        if not USER_ID_PATTERN.match(user_id):
+            raise ValueError(f"Invalid user ID: {user_id!r}")
+
+        return self.vaults_dir / user_id
+
+    def get(self, user_id: Optional[str] = None) -> Any:
+        """Get (or open) the vault for a user and mark it most recently used"""
+        user_id = user_id or DEFAULT_USER_ID
+
+        with self._lock:
+            vault = self._vaults.get(user_id)
+            if vault is not None:
+                self._vaults.move_to_end(user_id)
+                return vault
+
+            vault_dir = self.vault_dir(user_id)
+            vault_dir.parent.mkdir(parents=True, exist_ok=True)
+            vault = self.vault_factory(str(vault_dir))
+            self._vaults[user_id] = vault
+            self._footprints[user_id] = vault.memory_footprint()
+            self._resident_bytes += self._footprints[user_id]
+
+            self.enforce_budget()
+            return vault
+
+    def refresh(self, user_id: Optional[str] = None):
+        """Re-measure a resident vault after it was used (unlocking or indexing grows it)"""
+        user_id = user_id or DEFAULT_USER_ID
+
+        with self._lock:
+            vault = self._vaults.get(user_id)
+            if vault is None:
+                return
+            footprint = vault.memory_footprint()
+            self._resident_bytes += footprint - self._footprints[user_id]
+            self._footprints[user_id] = footprint
+            if vault.crypto_manager.authenticated:
+                self._unloaded.pop(user_id, None)  # Unlocked again
+            self.enforce_budget()
+
+    def enforce_budget(self):
+        """Evict least recently used idle vaults until we are within budget"""
+        with self._lock:
+            # The most recently used vault is never evicted - a caller is about to use it
+            for user_id in list(self._vaults)[:-1]:
+                if self._resident_bytes <= self.memory_budget_bytes:
+                    break
+                if self._vaults[user_id].busy():
+                    continue
+                vault = self._remove(user_id)
+                if vault.crypto_manager.authenticated:
+                    self._unloaded[user_id] = None
+                    while len(self._unloaded) > MAX_UNLOADED_TRACKED:
+                        self._unloaded.popitem(last=False)
+                self._close_vault(user_id, vault)
+                self.evictions += 1
+
+    def was_unloaded(self, user_id: Optional[str] = None) -> bool:
+        """Whether the user's unlocked vault was evicted and has not been unlocked since"""
+        with self._lock:
+            return (user_id or DEFAULT_USER_ID) in self._unloaded
+
+    def evict(self, user_id: str) -> bool:
+        """Explicitly lock and drop a resident vault"""
+        with self._lock:
+            vault = self._remove(user_id)
+            if vault is None:
+                return False
+            self._close_vault(user_id, vault)
+            return True
+
+    def close_all(self):
+        """Lock and drop every resident vault (server shutdown)"""
+        with self._lock:
+            for user_id in list(self._vaults):
+                self._close_vault(user_id, self._remove(user_id))
+
+    def resident_bytes(self) -> int:
+        """Estimated memory held by all resident vaults (as of their last use)"""
+        with self._lock:
+            return self._resident_bytes
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Registry statistics for status reporting"""
+        with self._lock:
+            return {
+                "resident_vaults": len(self._vaults),
+                "unlocked_vaults": sum(
+                    1 for vault in self._vaults.values()
+                    if vault.crypto_manager.authenticated
+                ),
+                "resident_bytes": self.resident_bytes(),
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "evictions": self.evictions
+            }
+
+    def _remove(self, user_id: str) -> Any:
+        vault = self._vaults.pop(user_id, None)
+        if vault is not None:
+            self._resident_bytes -= self._footprints.pop(user_id)
+        return vault
+
+    def _close_vault(self, user_id: str, vault: Any):
+        try:
+            vault.close()
+        except Exception as e:
+            # stdout is the JSON-RPC channel in stdio mode
+            print(f"Warning: Could not close vault {user_id}: {e}", file=sys.stderr)
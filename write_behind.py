@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Write-Behind Log
+Takes append-only history writes (advice sessions) off the request path:
+IDs are reserved up front and rows are group-committed in the background
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# Group commit triggers: whichever comes first
+FLUSH_INTERVAL_MS = 50
+FLUSH_MAX_ROWS = 100
+
+# IDs reserved per durable bump of sqlite_sequence
+ID_BLOCK_SIZE = 100
+
+
+class WriteBehindLog:
+    """
+    Background group-commit queue for one table of one vault
+    - reserve_id() hands out IDs from blocks claimed durably in sqlite_sequence,
+      so an ID is never reused even if queued rows are lost in a crash
+      (a crash costs at most FLUSH_INTERVAL_MS of history, leaving gaps)
+    - Blocks are claimed in a short transaction on a connection of the log's
+      own, so callers reserve before opening a write transaction of theirs
+      (one held open would make the claim wait on it)
+    - submit() queues an entry; apply_fn(cursor, entry) writes it (plus its
+      idempotency_keys and result) inside the batch transaction on the
+      writer thread
+    - Results waiting to be written stay visible through pending_result()
+      so retries are still answered idempotently before the flush
+    - on_commit() runs on the writer thread after each batch is durable
+    """
+
+    def __init__(self, db_path: Path, table: str,
+                 apply_fn: Callable[[sqlite3.Cursor, Dict[str, Any]], None],
+                 flush_interval_ms: int = FLUSH_INTERVAL_MS,
+                 flush_max_rows: int = FLUSH_MAX_ROWS,
+                 on_commit: Optional[Callable[[], None]] = None):
+        self.db_path = Path(db_path)
+        self.table = table
+        self.apply_fn = apply_fn
+        self.on_commit = on_commit
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_max_rows = flush_max_rows
+
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending_results: Dict[str, str] = {}
+        self._unwritten = 0
+        self._drained = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+
+        self._id_lock = threading.Lock()  # Held across block claims, not _lock
+        self._next_id = 0
+        self._block_end = 0
+
+        self.batches = 0
+        self.rows_written = 0
+        self.failures = 0
+
+    def reserve_id(self) -> int:
+        """Next row ID (may claim a new block - see reserve_ids)"""
+        return self.reserve_ids(1)[0]
+
+    def reserve_ids(self, count: int) -> List[int]:
+        """
+        Next `count` row IDs; claiming a new block blocks on the database,
+        so call this off the event loop when a claim may have to wait
+        """
+        with self._id_lock:
+            ids = []
+            while len(ids) < count:
+                if self._next_id >= self._block_end:
+                    self._claim_block(max(ID_BLOCK_SIZE, count - len(ids)))
+                self._next_id += 1
+                ids.append(self._next_id)
+            return ids
+
+    def _claim_block(self, size: int):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (self.table,)).fetchone()
+            start = row[0] if row else 0
+            if row:
+                conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (start + size, self.table))
+            else:
+                conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (self.table, size))
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        self._next_id = start
+        self._block_end = start + size
+
+    def submit(self, entry: Dict[str, Any], idempotency_keys: Optional[List[str]] = None,
+               result: Optional[str] = None):
+        """Queue an entry for the next group commit"""
+        with self._lock:
+            for key in idempotency_keys or []:
+                self._pending_results[key] = result
+            self._unwritten += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"write-behind-{self.table}",
+                                                daemon=True)
+                self._thread.start()
+
+        self._queue.put(dict(entry, idempotency_keys=idempotency_keys or [], result=result))
+
+    def pending_result(self, keys: List[str]) -> Optional[str]:
+        """Result of a queued (not yet committed) write for any of these keys"""
+        with self._lock:
+            for key in keys:
+                if key in self._pending_results:
+                    return self._pending_results[key]
+        return None
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Block until everything submitted so far is committed"""
+        deadline = time.monotonic() + timeout
+        with self._drained:
+            while self._unwritten:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._drained.wait(remaining)
+        return True
+
+    def close(self):
+        """Write out the queue and stop the writer thread"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            stopping = False
+            while not stopping:
+                batch = [self._queue.get()]
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.flush_max_rows:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+
+                if None in batch:
+                    # Shutdown: take whatever is still queued, then stop
+                    stopping = True
+                    while not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                    batch = [entry for entry in batch if entry is not None]
+
+                if batch:
+                    self._write_batch(conn, batch)
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List[Dict[str, Any]]):
+        try:
+            cursor = conn.cursor()
+            for entry in batch:
+                self.apply_fn(cursor, entry)
+            conn.commit()  # One fsync for the whole batch
+            self.batches += 1
+            self.rows_written += len(batch)
+        except Exception:
+            conn.rollback()
+            # Retry one by one so a single bad entry doesn't drop the batch
+            for entry in batch:
+                try:
+                    self.apply_fn(conn.cursor(), entry)
+                    conn.commit()
+                    self.rows_written += 1
+                except Exception as e:
+                    conn.rollback()
+                    self.failures += 1
+                    print(f"Warning: Could not write {self.table} row: {e}")
+        finally:
+            with self._drained:
+                for entry in batch:
+                    for key in entry["idempotency_keys"]:
+                        self._pending_results.pop(key, None)
+                self._unwritten -= len(batch)
+                self._drained.notify_all()
+            if self.on_commit is not None:
+                try:
+                    self.on_commit()
+                except Exception as e:
+                    print(f"Warning: {self.table} commit hook failed: {e}")
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._unwritten,
+            "batches": self.batches,
+            "rows_written": self.rows_written,
+            "failures": self.failures
+        }